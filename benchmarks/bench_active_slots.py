@@ -0,0 +1,125 @@
+# ======================================================
+# BENCHMARK: ساخت all_times در هر درخواست در برابر ایندکس تایم‌های فعال
+# ======================================================
+# اجرا:  python benchmarks/bench_active_slots.py [تعداد تایم فوتسال]
+import bisect
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp())  # فایل دیتابیس ربات در پوشه موقت ساخته بشه
+import bot
+
+
+def legacy_index_dates(index):
+    """رفتار قبلی _index_dates: dates، offsets و by_id از اول بعد از هر تغییر"""
+    dates, offsets = [], []
+    for position, (_, slot) in enumerate(index["slots"]):
+        if not dates or dates[-1] != slot.date_obj:
+            dates.append(slot.date_obj)
+            offsets.append(position)
+    offsets.append(len(index["slots"]))
+    index["dates"] = dates
+    index["offsets"] = offsets
+    index["by_id"] = {slot.id: (group, slot) for group, slot in index["slots"]}
+
+
+def rebuild_all_times():
+    """رفتار قبلی time_select / register: کپی همه‌ی تایم‌های فعال در هر کلیک"""
+    all_times = []
+    for g in "ABCDEFGHIJ":
+        for t in bot.RAM_TIMES["futsal"][g]:
+            if not bot.is_time_expired(t, bot.get_iran_date()):  # قبلاً هر بار ساعت خونده میشد
+                t_copy = {"id": t.id, "date": t.date, "date_obj": t.date_obj,
+                          "start": t.start, "end": t.end, "cap": t.cap}  # تایم‌ها قبلاً دیکشنری بودن
+                t_copy["group"] = g
+                all_times.append(t_copy)
+    return all_times
+
+
+def old_page(page):
+    """رفتار قبلی show_times_page: ساخت، مرتب‌سازی و گروه‌بندی در هر درخواست"""
+    all_times = rebuild_all_times()
+    dates = sorted({t["date_obj"] for t in all_times})
+    return sorted((t for t in all_times if t["date_obj"] == dates[page]), key=lambda t: t["start"])
+
+
+def new_page(page):
+    index = bot.active_slots("futsal")
+    start, end = bot.page_bounds(index, page)
+    return index["slots"][start:end]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    today = bot.get_iran_date()
+    for i in range(n):
+        day = today + timedelta(days=i // 40 - 5)  # چند روز گذشته هم هست
+        bot.RAM_TIMES["futsal"]["ABCDEFGHIJ"[i % 10]].append(
+            bot.Slot(i + 1, day, f"{8 + i % 12:02d}:00", f"{9 + i % 12:02d}:00", 10))
+    bot.rebuild_active_slots()
+
+    active = bot.active_slots("futsal")["slots"]
+    pages = len(bot.active_slots("futsal")["dates"])  # یک صفحه برای هر روز
+    assert pages, "هیچ تایم فعالی ساخته نشد؛ تعداد تایم بیشتری بدید (هر روز 40 تایم، 5 روز اول گذشته)"
+    assert len(active) == len(rebuild_all_times())
+    for page in range(pages):
+        assert sorted(t["id"] for t in old_page(page)) == sorted(s.id for _, s in new_page(page))
+
+    rounds = 200
+    page = min(3, pages - 1)
+    for name, fn in (("rebuild all_times", lambda: old_page(page)), ("active index", lambda: new_page(page))):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            fn()
+        elapsed = (time.perf_counter() - start) / rounds
+        print(f"{name:<18} page render ({n} slots): {elapsed * 1000:7.3f} ms")
+
+    # اضافه/حذف: به‌روزرسانی در جا در برابر ساخت دوباره‌ی dates/offsets/by_id بعد از هر تغییر
+    rng = random.Random(1)
+    ops = []
+    for i in range(500):
+        slot = bot.Slot(n + 1 + i, today + timedelta(days=rng.randrange(60)), f"{rng.randrange(24):02d}:00", "23:59", 10)
+        ops.append(("add", "ABCDEFGHIJ"[i % 10], slot))
+        ops.append(("remove", None, rng.choice(active)[1].id if rng.random() < 0.5 else slot.id))
+    
+    def legacy_update(index, op, group, value):
+        if op == "add":
+            bisect.insort(index["slots"], (group, value), key=bot.slot_sort_key)
+        else:
+            index["slots"] = [e for e in index["slots"] if e[1].id != value]
+        legacy_index_dates(index)
+    
+    legacy = {"slots": list(active)}
+    legacy_index_dates(legacy)
+    start = time.perf_counter()
+    for op, group, value in ops:
+        legacy_update(legacy, op, group, value)
+    rebuilt = (time.perf_counter() - start) / len(ops)
+    
+    start = time.perf_counter()
+    for op, group, value in ops:
+        if op == "add":
+            bot.add_active_slot("futsal", group, value)
+        else:
+            bot.remove_active_slot("futsal", value)
+    in_place = (time.perf_counter() - start) / len(ops)
+    
+    index = bot.active_slots("futsal")
+    assert index["slots"] == legacy["slots"] and index["dates"] == legacy["dates"]
+    assert index["by_id"] == legacy["by_id"]
+    for page in range(len(index["dates"])):
+        start, end = bot.page_bounds(index, page)
+        assert (start, end) == (legacy["offsets"][page], legacy["offsets"][page + 1])
+    print(f"add/remove slot    rebuild index: {rebuilt * 1e6:7.1f} µs   in place: {in_place * 1e6:7.1f} µs "
+          f"({len(ops)} ops, {len(index['slots'])} active slots)")
+    bot.db.close()
+
+
+if __name__ == "__main__":
+    main()
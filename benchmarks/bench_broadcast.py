@@ -0,0 +1,135 @@
+# ======================================================
+# BENCHMARK: برادکست - حلقه‌ی ترتیبی قبلی در برابر run_broadcast
+# ======================================================
+# اجرا:  python benchmarks/bench_broadcast.py [تعداد کاربر] [تأخیر هر درخواست به میلی‌ثانیه]
+#
+# به جای تلگرام یک Bot API محلی استفاده میشه که مثل تلگرام بیش از 30 پیام در هر ثانیه رو
+# با RetryAfter رد میکنه، به بعضی کاربران (بلاک کرده) Forbidden میده، بعضی درخواست‌ها قبل از ارسال
+# خطای اتصال میگیرن و بعضی بعد از رسیدن پیام timeout میشن (نباید دوباره ارسال بشن).
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp())  # فایل دیتابیس ربات در پوشه موقت ساخته بشه
+import bot
+import httpx
+from telegram.error import Forbidden, NetworkError, RetryAfter, TimedOut
+
+API_LIMIT = 30   # پیام در هر ثانیه برای کل ربات
+
+
+class FakeBotAPI:
+    def __init__(self, latency, blocked, flaky, late=()):
+        self.latency = latency
+        self.blocked = blocked
+        self.flaky = set(flaky)         # اولین درخواست این کاربران قبل از ارسال خطای اتصال میگیره
+        self.late = set(late)           # پیام این کاربران میرسه ولی جواب timeout میشه
+        self.window = deque()           # زمان پیام‌های پذیرفته شده در یک ثانیه‌ی اخیر
+        self.delivered = []
+        self.rejected = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(self.latency)
+        now = time.monotonic()
+        while self.window and now - self.window[0] >= 1:
+            self.window.popleft()
+        if len(self.window) >= API_LIMIT:
+            self.rejected += 1
+            raise RetryAfter(1)
+        self.window.append(now)
+        if chat_id in self.flaky:
+            self.flaky.discard(chat_id)
+            try:
+                raise httpx.ConnectError("connection refused")
+            except httpx.ConnectError as err:
+                raise NetworkError(f"httpx.ConnectError: {err}") from err
+        if chat_id in self.blocked:
+            raise Forbidden("Forbidden: bot was blocked by the user")
+        self.delivered.append(chat_id)
+        if chat_id in self.late:
+            try:
+                raise httpx.ReadTimeout("read timed out")
+            except httpx.ReadTimeout as err:
+                raise TimedOut() from err
+
+
+class FloodedBotAPI:
+    """API خراب که همیشه RetryAfter میده"""
+    def __init__(self):
+        self.calls = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.calls += 1
+        raise RetryAfter(0)
+
+
+async def legacy_broadcast(api, user_ids):
+    """حلقه‌ی قبلی broadcast_callback: ترتیبی، 1 ثانیه خواب بعد از هر 20 ارسال موفق"""
+    success = failed = 0
+    for user_id in user_ids:
+        try:
+            await api.send_message(chat_id=user_id, text="hi")
+            success += 1
+            if success % 20 == 0:
+                await asyncio.sleep(1)
+        except Exception:
+            failed += 1
+    return success
+
+
+def run(name, user_ids, latency, blocked, flaky, fn, late=()):
+    api = FakeBotAPI(latency, blocked, flaky, late)
+    start = time.perf_counter()
+    asyncio.run(fn(api))
+    elapsed = time.perf_counter() - start
+    lost = len(user_ids) - len(blocked) - len(set(api.delivered))
+    assert len(api.delivered) == len(set(api.delivered)), "پیام تکراری"
+    print(f"{name:<32} {elapsed:6.1f} s  {len(api.delivered) / elapsed:5.1f} msg/s  "
+          f"delivered {len(api.delivered)}, not delivered {lost}, RetryAfter {api.rejected}")
+    return lost
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = (int(sys.argv[2]) if len(sys.argv) > 2 else 40) / 1000
+    user_ids = list(range(1000, 1000 + n))
+    blocked = set(user_ids[::25])
+    flaky = user_ids[5::40]
+    bot.BROADCAST_PROGRESS_INTERVAL = 1
+    progress_calls = []
+
+    async def progress(stats):
+        progress_calls.append(len(stats["sent"]))
+
+    print(f"{n} users, {len(blocked)} blocked, {len(flaky)} fail to connect once, "
+          f"API latency {latency * 1000:.0f} ms, limit {API_LIMIT} msg/s")
+    run("legacy serial loop", user_ids, latency, blocked, flaky,
+        lambda api: legacy_broadcast(api, user_ids))
+    late = set(user_ids[7::50]) - blocked
+    results = {}
+
+    async def broadcast(api):
+        results["stats"] = await bot.run_broadcast(api, user_ids, progress=progress, text="hi")
+
+    lost = run(f"run_broadcast {bot.BROADCAST_RATE}/s", user_ids, latency, blocked, flaky, broadcast, late)
+    # timeout بعد از ارسال: پیام یک بار رسیده و ناموفق ثبت میشه، دوباره فرستاده نمیشه
+    assert lost == 0 and sorted(results["stats"]["failed"]) == sorted(late)
+    assert progress_calls[-1] == n - len(blocked) - len(late)
+    lost = run("run_broadcast 60/s (over limit)", user_ids, latency, blocked, flaky,
+               lambda api: bot.run_broadcast(api, user_ids, rate=60, text="hi"))
+    assert lost == 0
+
+    api = FloodedBotAPI()
+    stats = asyncio.run(bot.run_broadcast(api, [1], text="hi"))
+    assert stats["failed"] == [1] and api.calls == bot.BROADCAST_MAX_FLOOD_WAITS + 1
+    print(f"always-RetryAfter API: gave up after {api.calls} attempts")
+    bot.db.close()
+
+
+if __name__ == "__main__":
+    main()
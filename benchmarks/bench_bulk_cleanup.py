@@ -0,0 +1,75 @@
+# ======================================================
+# BENCHMARK: پاکسازی دسته‌ای تایم‌های منقضی
+# ======================================================
+# اجرا:  python benchmarks/bench_bulk_cleanup.py [تعداد تایم] [ثبت‌نام در هر تایم]
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from database import Database
+from models import Slot
+
+
+def populate(db, slots, per_slot):
+    """ساخت تایم‌های گذشته با ثبت‌نام (مثل چند هفته عقب‌افتادگی)"""
+    first_day = date.today() - timedelta(days=60)
+    expired = []
+    for i in range(slots):
+        day = first_day + timedelta(days=i % 50)
+        time_data = Slot(None, day, "18:00", "19:00", per_slot)
+        time_id = db.save_slot("futsal", "A", time_data)
+        for p in range(per_slot):
+            db.save_registration("futsal", "A", time_id, f"09{i:05d}{p:04d}", f"player {p}")
+        expired.append((time_id, [f"09{i:05d}{p:04d}" for p in range(per_slot)]))
+    db.flush()
+    return expired
+
+
+def legacy_cleanup(db, expired):
+    """رفتار قبلی: یک delete_registration برای هر شماره و یک delete برای هر تایم"""
+    for time_id, phones in expired:
+        for phone in phones:
+            db.delete_registration("futsal", "A", time_id, phone)
+        db.delete_slot(time_id)
+
+
+def bulk_cleanup(db, expired):
+    db.delete_times_before(date.today(), ("futsal",))
+
+
+def orphaned_registrations(db):
+    """ثبت‌نام‌هایی که تایمشون دیگه در جدول slots نیست"""
+    return db.conn.execute('''
+        SELECT COUNT(*) FROM registrations r
+        WHERE NOT EXISTS (SELECT 1 FROM slots s WHERE CAST(s.id AS TEXT) = r.time_key)
+    ''').fetchone()[0]
+
+
+def run(name, cleanup, path, slots, per_slot):
+    db = Database(path)
+    expired = populate(db, slots, per_slot)
+    start = time.perf_counter()
+    cleanup(db, expired)
+    elapsed = time.perf_counter() - start
+    orphans = orphaned_registrations(db)
+    assert orphans == 0, f"{orphans} orphaned registrations"
+    left = db.conn.execute("SELECT COUNT(*) FROM registrations").fetchone()[0]
+    left += db.conn.execute("SELECT COUNT(*) FROM slots").fetchone()[0]
+    db.close()
+    assert left == 0, left
+    print(f"{name:<8} {slots * per_slot} registrations / {slots} slots: {elapsed * 1000:9.1f} ms")
+
+
+def main():
+    slots = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    per_slot = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+    with tempfile.TemporaryDirectory() as tmp:
+        run("legacy", legacy_cleanup, os.path.join(tmp, "legacy.db"), slots, per_slot)
+        run("bulk", bulk_cleanup, os.path.join(tmp, "bulk.db"), slots, per_slot)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# ======================================================
+# BENCHMARK: توان پردازش آپدیت‌ها با 1 / 8 / 64 آپدیت همزمان
+# ======================================================
+# اجرا:  python benchmarks/bench_concurrent_updates.py [تعداد کاربر] [آپدیت برای هر کاربر]
+#
+# آپدیت‌های هر کاربر پشت سر هم میرسن (مثل time_select و بعد register).
+# هر آپدیت مثل یک هندلر واقعی: یک درخواست شبکه (get_chat_member / ارسال پیام، 5 تا 30 میلی‌ثانیه)
+# و بعد رزرو جا با reserve_seat. آپدیت‌ها مثل Application برای هر کدوم یک task میسازن و از
+# update_processor رد میشن؛ ترتیب آپدیت‌های هر کاربر و نبودن overbooking بررسی میشه.
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp())  # فایل دیتابیس ربات در پوشه موقت ساخته بشه
+import bot
+from telegram.ext import SimpleUpdateProcessor
+
+CAP = 40
+
+
+async def handle(update, slot, seen):
+    """شبیه هندلر: صبر برای API تلگرام، بعد ثبت‌نام"""
+    await asyncio.sleep(update.latency)
+    seen.setdefault(update.effective_user.id, []).append(update.update_id)
+    await bot.reserve_seat("futsal", "A", slot.id, f"09{update.effective_user.id:09d}", "player")
+
+
+async def run(processor, updates, slot):
+    bot.RAM_REGISTRATIONS["futsal"]["A"].pop(slot.id, None)
+    seen = {}
+    await processor.initialize()
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(processor.process_update(u, handle(u, slot, seen))) for u in updates]
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    await processor.shutdown()
+    in_order = all(ids == sorted(ids) for ids in seen.values())
+    booked = len(bot.RAM_REGISTRATIONS["futsal"]["A"][slot.id])
+    return elapsed, in_order, booked
+
+
+async def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    per_user = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    random.seed(1)
+    updates = [SimpleNamespace(update_id=i, effective_user=SimpleNamespace(id=i // per_user),
+                               latency=random.uniform(0.005, 0.03))
+               for i in range(users * per_user)]
+
+    today = bot.get_iran_date()
+    slot = bot.Slot(None, today, "23:59", "23:59", CAP)
+    slot.id = await bot.db.save_slot("futsal", "A", slot)
+    bot.RAM_TIMES["futsal"]["A"].append(slot)
+    bot.rebuild_active_slots()
+
+    print(f"{len(updates)} updates from {users} users")
+    for limit in (1, 8, 64):
+        for name, processor in (("per-user", bot.PerUserUpdateProcessor(limit)),
+                                ("unordered", SimpleUpdateProcessor(limit))):
+            if limit == 1 and name == "unordered":
+                continue  # با یک آپدیت همزمان هر دو یکی هستن
+            elapsed, in_order, booked = await run(processor, updates, slot)
+            assert booked == CAP, "overbooking!"
+            if name == "per-user":
+                assert in_order, "ترتیب آپدیت‌های یک کاربر به هم خورد"
+            print(f"concurrency {limit:>2} {name:<9}: {len(updates) / elapsed:7.0f} updates/s "
+                  f"({elapsed * 1000:7.0f} ms), per-user order {'kept' if in_order else 'BROKEN'}, "
+                  f"booked {booked}/{CAP}")
+    bot.db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,64 @@
+# ======================================================
+# BENCHMARK: اتصال دائمی در برابر اتصال جدید برای هر عملیات
+# ======================================================
+# اجرا:  python benchmarks/bench_db_connection.py [تعداد]
+import os
+import sys
+import sqlite3
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from database import Database
+
+
+class LegacyDatabase(Database):
+    """رفتار قبلی: یک sqlite3.connect + commit + close برای هر فراخوانی"""
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.lock = threading.Lock()
+        self.queue = None
+        with sqlite3.connect(db_file) as conn:
+            conn.execute("PRAGMA journal_mode=DELETE")
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.init_db()
+        self.conn.close()
+
+    def _execute(self, sql, params=()):
+        with self.lock:
+            with sqlite3.connect(self.db_file) as conn:
+                cursor = conn.cursor()
+                cursor.execute(sql, params)
+                conn.commit()
+                return cursor
+
+
+def run(db, n):
+    start = time.perf_counter()
+    for i in range(n):
+        phone = f"09{i:09d}"
+        db.save_registration("futsal", "A", f"time_{i % 20}", phone, f"player {i}")
+        if i % 4 == 0:
+            db.delete_registration("futsal", "A", f"time_{i % 20}", phone)
+    return n / (time.perf_counter() - start)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = LegacyDatabase(os.path.join(tmp, "legacy.db"))
+        legacy_ops = run(legacy, n)
+
+        persistent = Database(os.path.join(tmp, "persistent.db"))
+        persistent_ops = run(persistent, n)
+        persistent.close()
+
+    print(f"legacy (connect per call): {legacy_ops:10.0f} ops/s")
+    print(f"persistent WAL connection: {persistent_ops:10.0f} ops/s")
+    print(f"speedup:                   {persistent_ops / legacy_ops:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# ======================================================
+# BENCHMARK: برادکست دوم - ارسال به همه در برابر رد کردن چت‌های مرده
+# ======================================================
+# اجرا:  python benchmarks/bench_delivery_state.py [تعداد کاربر] [درصد چت مرده]
+#
+# برادکست اول به همه ارسال میشه و نتیجه‌اش با record_delivery در دیتابیس ثبت میشه؛
+# بعد کاربران از دیتابیس دوباره لود میشن و برادکست دوم یک بار به همه و یک بار فقط به
+# reachable_ids ارسال میشه. Bot API محلی است (بدون شبکه) و هر درخواست latency ثابت داره.
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp())  # فایل دیتابیس ربات در پوشه موقت ساخته بشه
+import bot
+from array import array
+from telegram.error import BadRequest, Forbidden
+
+LATENCY = 0.005
+
+
+class FakeBotAPI:
+    def __init__(self, blocked, deactivated, missing):
+        self.blocked = blocked
+        self.deactivated = deactivated
+        self.missing = missing
+        self.requests = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.requests += 1
+        await asyncio.sleep(LATENCY)
+        if chat_id in self.blocked:
+            raise Forbidden("Forbidden: bot was blocked by the user")
+        if chat_id in self.deactivated:
+            raise Forbidden("Forbidden: user is deactivated")
+        if chat_id in self.missing:
+            raise BadRequest("Chat not found")
+
+
+def timed_broadcast(api, user_ids):
+    start = time.perf_counter()
+    stats = asyncio.run(bot.run_broadcast(api, user_ids, rate=1000, concurrency=50, text="hi"))
+    return stats, time.perf_counter() - start
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    dead_percent = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    user_ids = list(range(1000, 1000 + n))
+    step = max(1, 100 // dead_percent)
+    dead = user_ids[::step]
+    blocked, deactivated, missing = set(dead[0::3]), set(dead[1::3]), set(dead[2::3])
+
+    db = bot.db.sync
+    for user_id in user_ids:
+        db.save_user(user_id, {"first_name": f"user {user_id}", "date": "2024-01-01 10:00:00", "language": "fa"})
+
+    api = FakeBotAPI(blocked, deactivated, missing)
+    stats, _ = timed_broadcast(api, user_ids)
+    assert set(stats["blocked"]) == blocked and set(stats["deactivated"]) == deactivated | missing
+    db.record_delivery(stats["sent"], stats["blocked"], stats["deactivated"], stats["failed"])
+
+    # یک ذخیره‌ی عادی کاربر (مثل دیدن راهنما) نباید وضعیت تحویل رو پاک کنه
+    resaved = next(iter(blocked))
+    db.save_user(resaved, {"first_name": "renamed", "help_seen": True})
+    users = db.load_users()
+    assert users[resaved]["blocked"] and users[resaved]["first_name"] == "renamed"
+    assert users.unreachable_count() == len(dead)
+    print(f"{n} users, {len(dead)} dead after first broadcast "
+          f"({len(blocked)} blocked, {len(deactivated)} deactivated, {len(missing)} chat not found)")
+
+    for name, ids in (("all users", array("q", users.keys())), ("reachable_ids", users.reachable_ids())):
+        api = FakeBotAPI(blocked, deactivated, missing)
+        stats, elapsed = timed_broadcast(api, ids)
+        dead_hits = len(stats["blocked"]) + len(stats["deactivated"])
+        print(f"{name:<14} {elapsed * 1000:7.1f} ms  {api.requests} requests, "
+              f"{len(stats['sent'])} delivered, {dead_hits} wasted on dead chats")
+    bot.db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# ======================================================
+# BENCHMARK: حذف تایم‌های منقضی - پیمایش همه‌ی تایم‌ها در برابر min-heap
+# ======================================================
+# اجرا:  python benchmarks/bench_expiry.py [تعداد روز] [تایم در هر روز]
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp())  # فایل دیتابیس ربات در پوشه موقت ساخته بشه
+import bot
+
+SPORTS = ("basketball", "volleyball", "shared")
+
+
+def populate(days, per_day):
+    today = bot.get_iran_date()
+    time_id = 0
+    for d in range(days):
+        day = today + timedelta(days=d)
+        for i in range(per_day):
+            time_id += 1
+            slot = bot.Slot(time_id, day, f"{8 + i % 12:02d}:00", f"{9 + i % 12:02d}:00", 10)
+            if i % 4 == 3:
+                bot.RAM_TIMES[SPORTS[i % 3]].append(slot)
+            else:
+                bot.RAM_TIMES["futsal"]["ABCDEFGHIJ"[i % 10]].append(slot)
+    bot.rebuild_active_slots()
+    bot.rebuild_expiry_heap()
+
+
+def legacy_cleanup(today):
+    """رفتار قبلی cleanup_expired_times: پیمایش همه‌ی تایم‌ها (shared نادیده گرفته میشد)"""
+    expired = []
+    buckets = [bot.RAM_TIMES["futsal"][g] for g in "ABCDEFGHIJ"] + [bot.RAM_TIMES[s] for s in ("basketball", "volleyball")]
+    for times in buckets:
+        kept = []
+        for t in times:
+            if t.date_obj < today:
+                expired.append(t.id)
+            else:
+                kept.append(t)
+        times[:] = kept
+    bot.rebuild_active_slots()
+    return expired
+
+
+def main():
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    per_day = int(sys.argv[2]) if len(sys.argv) > 2 else 400
+    populate(days, per_day)
+    today = bot.get_iran_date()
+    total = days * per_day
+    print(f"{total} slots over {days} days, {per_day} expiring per day")
+
+    # تیک job بدون تایم منقضی
+    start = time.perf_counter()
+    for _ in range(100):
+        legacy_cleanup(today)
+    legacy_idle = (time.perf_counter() - start) / 100
+    start = time.perf_counter()
+    for _ in range(100):
+        if bot.EXPIRY_HEAP and bot.EXPIRY_HEAP[0][0] < today:
+            bot.evict_expired_slots(today)
+    heap_idle = (time.perf_counter() - start) / 100
+    print(f"idle tick      full scan: {legacy_idle * 1000:8.3f} ms   heap peek: {heap_idle * 1e6:6.2f} µs")
+
+    # رد شدن یک روز: per_day تایم منقضی میشه
+    tomorrow = today + timedelta(days=1)
+    start = time.perf_counter()
+    legacy_expired = legacy_cleanup(tomorrow)
+    legacy_day = time.perf_counter() - start
+
+    bot.RAM_TIMES["futsal"] = {g: [] for g in "ABCDEFGHIJ"}
+    for sport in SPORTS:
+        bot.RAM_TIMES[sport] = []
+    populate(days, per_day)
+    start = time.perf_counter()
+    evicted = bot.evict_expired_slots(tomorrow)
+    heap_day = time.perf_counter() - start
+
+    shared_today = per_day // 12
+    assert len(evicted) == per_day and len(legacy_expired) == per_day - shared_today
+    assert all(t.date_obj >= tomorrow for t in bot.RAM_TIMES["shared"])
+    print(f"day rollover   full scan: {legacy_day * 1000:8.3f} ms   heap: {heap_day * 1000:8.3f} ms "
+          f"({len(evicted)} evicted; full scan skipped {shared_today} shared)")
+    bot.db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# ======================================================
+# BENCHMARK: ورود گروهی بازیکنان - یک دستور برای هر نفر، executemany، و فایل جریانی
+# ======================================================
+# اجرا:  python benchmarks/bench_import.py [تعداد بازیکن]
+import asyncio
+import csv
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp())  # فایل دیتابیس ربات در پوشه موقت ساخته بشه
+import bot
+from database import Database
+
+
+def roster(n):
+    return [("futsal", "ABCDEFGHIJ"[i % 10], f"09{i:09d}", f"player {i}") for i in range(n)]
+
+
+def write_csv(path, n):
+    """فایل ورودی بزرگ با چند ردیف خراب و تکراری"""
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["sport", "group", "name", "phone"])
+        for i in range(n):
+            writer.writerow(["futsal", "ABCDEFGHIJ"[i % 10], f"player {i}", f"09{i:09d}"])
+        writer.writerow(["futsal", "Z", "bad group", "09000000001"])
+        writer.writerow(["futsal", "A", "duplicate", "09000000000"])
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    players = roster(n)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "single.db"))
+        db.conn.execute("PRAGMA synchronous=FULL")  # هر commit واقعاً روی دیسک
+        start = time.perf_counter()
+        for sport, group, phone, name in players:
+            db.save_player(sport, group, phone, name)
+        single = time.perf_counter() - start
+        db.close()
+
+        db = Database(os.path.join(tmp, "bulk.db"))
+        db.conn.execute("PRAGMA synchronous=FULL")
+        start = time.perf_counter()
+        db.save_players(players)
+        bulk = time.perf_counter() - start
+        count = db.conn.execute("SELECT COUNT(*) FROM players").fetchone()[0]
+        db.close()
+
+        # فایل بزرگ از روی دیسک، batch به batch، از مسیر واقعی ربات
+        big = max(n, 50000)
+        path = os.path.join(tmp, "players.csv")
+        write_csv(path, big)
+        size = os.path.getsize(path)
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = asyncio.run(bot.import_player_file(path, "players.csv"))
+        streamed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        stored = bot.db.sync.reader.execute("SELECT COUNT(*) FROM players").fetchone()[0]
+
+    assert count == n, count
+    assert result["error"] is None, result
+    assert result["added"] == big and result["rejected_count"] == 2, result
+    assert stored == big, stored
+    assert sum(len(g) for g in bot.RAM_PLAYERS["futsal"].values()) == big
+    print(f"one commit per player:  {single * 1000:8.1f} ms ({n} transactions)")
+    print(f"import (executemany):   {bulk * 1000:8.1f} ms (1 transaction)")
+    print(f"streamed file import:   {streamed * 1000:8.1f} ms ({big} rows, {size // 1024} KB file, "
+          f"{-(-big // bot.IMPORT_BATCH_SIZE)} batches, peak {peak // 1024} KB traced)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# ======================================================
+# BENCHMARK: نمایش تاریخ شمسی در /show_times - jdatetime برای هر خط در برابر کش
+# ======================================================
+# اجرا:  python benchmarks/bench_jalali.py [تعداد تایم] [تعداد روز]
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+
+import jdatetime
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp())  # فایل دیتابیس ربات در پوشه موقت ساخته بشه
+import bot
+import models
+
+
+def legacy_show_times_text():
+    """متن قبلی /show_times: برای هر خط یک fromgregorian + strftime"""
+    text = "📋 لیست تایم‌ها:\n\n"
+    for g in "ABCDEFGHIJ":
+        if bot.RAM_TIMES["futsal"][g]:
+            text += f"⚽ فوتسال گروه {g}:\n"
+            for idx, t in enumerate(bot.RAM_TIMES["futsal"][g]):
+                j_date = jdatetime.date.fromgregorian(date=t.date_obj)
+                text += f"  [{idx}] {j_date.strftime('%Y/%m/%d')} {t.start}-{t.end} (ظرفیت: {t.cap})\n"
+            text += "\n"
+    return text
+
+
+async def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 14
+    today = bot.get_iran_date()
+    rows = [(i + 1, today + timedelta(days=i % days), f"{8 + i % 12:02d}:00", f"{9 + i % 12:02d}:00", 10)
+            for i in range(n)]
+
+    # ساخت تایم‌ها با کش سرد و گرم (لود اولیه / تایم‌های بعدی همون روزها)
+    models.jalali.cache_clear()
+    models.date_labels.cache_clear()
+    start = time.perf_counter()
+    slots = [bot.Slot(*row) for row in rows]
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    [bot.Slot(*row) for row in rows]
+    warm = time.perf_counter() - start
+    for i, slot in enumerate(slots):
+        bot.RAM_TIMES["futsal"]["ABCDEFGHIJ"[i % 10]].append(slot)
+    print(f"{n} slots over {days} days: build {cold * 1000:.2f} ms (cold cache), {warm * 1000:.2f} ms (warm)")
+
+    sent = []
+
+    async def reply_text(text, **kwargs):
+        sent.append(text)
+
+    update = SimpleNamespace(effective_user=SimpleNamespace(id=bot.SUPER_ADMINS[0]),
+                             message=SimpleNamespace(reply_text=reply_text))
+    await bot.show_times(update, SimpleNamespace(args=[]))
+    # خروجی با ReportWriter به چند پیام تقسیم میشه و خط خالیِ مرز پیام‌ها حذف میشه؛
+    # پس خط‌های همه‌ی پیام‌ها (بدون خط خالی) با متن قبلی مقایسه میشن
+    assert all(bot.message_length(chunk) <= bot.TELEGRAM_MESSAGE_LIMIT for chunk in sent)
+    legacy_lines = [line for line in legacy_show_times_text().split("\n") if line]
+    sent_lines = [line for line in "\n".join(sent).split("\n") if line]
+    assert sent_lines[:len(legacy_lines)] == legacy_lines
+    print(f"/show_times: {len(sent)} messages")
+
+    rounds = 200
+    start = time.perf_counter()
+    for _ in range(rounds):
+        legacy_show_times_text()
+    legacy = (time.perf_counter() - start) / rounds
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await bot.show_times(update, SimpleNamespace(args=[]))
+    cached = (time.perf_counter() - start) / rounds
+    print(f"/show_times  jdatetime per line: {legacy * 1000:7.3f} ms   cached labels: {cached * 1000:7.3f} ms")
+    print(f"jalali cache: {models.jalali.cache_info()}")
+    bot.db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
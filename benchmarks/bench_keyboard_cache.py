@@ -0,0 +1,50 @@
+# ======================================================
+# BENCHMARK: صفحه‌ی انتخاب تایم - ساخت در هر کلیک در برابر کش (sport, page)
+# ======================================================
+# اجرا:  python benchmarks/bench_keyboard_cache.py [تعداد تایم فوتسال]
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp())  # فایل دیتابیس ربات در پوشه موقت ساخته بشه
+import bot
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    today = bot.get_iran_date()
+    for i in range(n):
+        bot.RAM_TIMES["futsal"]["ABCDEFGHIJ"[i % 10]].append(
+            bot.Slot(i + 1, today + timedelta(days=i // 100), f"{8 + i % 12:02d}:00", f"{9 + i % 12:02d}:00", 10))
+    bot.rebuild_active_slots()
+    pages = len(bot.active_slots("futsal")["dates"])
+
+    # کش همون صفحه‌ای رو میده که ساخت مستقیم میده و با اضافه شدن تایم باطل میشه
+    assert bot.cached_times_page("futsal", 0) == bot.render_times_page("futsal", 0)
+    new_slot = bot.Slot(n + 1, today, "07:00", "08:00", 10)
+    bot.RAM_TIMES["futsal"]["A"].append(new_slot)
+    bot.add_active_slot("futsal", "A", new_slot)
+    text, markup = bot.cached_times_page("futsal", 0)
+    assert markup.inline_keyboard[0][0].callback_data == f"futsal:A:{new_slot.id}"
+    for stat in bot.KEYBOARD_CACHE_STATS:
+        bot.KEYBOARD_CACHE_STATS[stat] = 0
+
+    # هر کاربر روی یکی از صفحه‌ها میزنه (بیشتر روی امروز)
+    taps = [0 if i % 3 else i % pages for i in range(5000)]
+    for name, fn in (("render every tap", bot.render_times_page), ("(sport, page) cache", bot.cached_times_page)):
+        start = time.perf_counter()
+        for page in taps:
+            fn("futsal", page)
+        elapsed = (time.perf_counter() - start) / len(taps)
+        print(f"{name:<20} {elapsed * 1e6:8.1f} µs per tap ({n} active slots, {pages} pages)")
+    stats = bot.KEYBOARD_CACHE_STATS
+    print(f"hits {stats['hits']}, misses {stats['misses']}, invalidations {stats['invalidations']}")
+    bot.db.close()
+
+
+if __name__ == "__main__":
+    main()
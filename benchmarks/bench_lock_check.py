@@ -0,0 +1,57 @@
+# ======================================================
+# BENCHMARK: بررسی قفل تایم‌ها در یک آپدیت
+# ======================================================
+# اجرا:  python benchmarks/bench_lock_check.py [تعداد تایم]
+#
+# قبلاً برای هر تایم ساعت خونده میشد و datetime آگاه از منطقه‌ی زمانی مقایسه میشد؛
+# الان یک clock_snapshot برای کل آپدیت و مقایسه‌ی دو عدد صحیح (lock_deadline).
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp())  # فایل دیتابیس ربات در پوشه موقت ساخته بشه
+import bot
+from models import LOCK_BEFORE_START, Slot, TEHRAN_TZ
+
+
+def legacy_locked(t):
+    """رفتار قبلی is_time_locked: strptime + localize و خوندن ساعت برای هر تایم"""
+    start_datetime = TEHRAN_TZ.localize(datetime.strptime(f"{t.date} {t.start}", "%Y-%m-%d %H:%M"))
+    return (start_datetime - bot.get_iran_datetime()).total_seconds() / 60 < 30
+
+
+def aware_locked(t):
+    """مرحله‌ی قبل از این تغییر: lock_at از پیش حساب شده ولی ساعت برای هر تایم خونده میشد"""
+    return bot.get_iran_datetime() > t.start_at - LOCK_BEFORE_START
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    today = bot.get_iran_date()
+    slots = [Slot(i + 1, today + timedelta(days=i // 200), f"{i % 24:02d}:{i % 2 * 30:02d}", "23:59", 15)
+             for i in range(n)]
+
+    now_ts, _ = bot.clock_snapshot()
+    assert [legacy_locked(t) for t in slots[:2000]] == [bot.is_time_locked(t, now_ts) for t in slots[:2000]]
+
+    def snapshot_pass():
+        ts, _ = bot.clock_snapshot()
+        return [bot.is_time_locked(t, ts) for t in slots]
+
+    print(f"{n} slots per update")
+    for name, fn in (("strptime + localize", lambda: [legacy_locked(t) for t in slots]),
+                     ("aware datetime", lambda: [aware_locked(t) for t in slots]),
+                     ("snapshot + int", snapshot_pass)):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        print(f"{name:<20} {elapsed * 1000:8.2f} ms  ({elapsed / n * 1e9:7.0f} ns per slot)")
+    bot.db.close()
+
+
+if __name__ == "__main__":
+    main()
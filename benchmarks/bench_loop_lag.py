@@ -0,0 +1,75 @@
+# ======================================================
+# BENCHMARK: تاخیر event loop هنگام نوشتن در دیتابیس
+# ======================================================
+# اجرا:  python benchmarks/bench_loop_lag.py [تعداد هندلر]
+#
+# یک coroutine هر 1 میلی‌ثانیه بیدار میشه و تأخیرش رو اندازه می‌گیره،
+# همزمان چند هندلر شبیه register روی دیتابیس می‌نویسن.
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from database import Database, AsyncDatabase
+
+TICK = 0.001
+
+
+async def ticker(stop, lags):
+    while not stop.is_set():
+        before = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - before - TICK)
+
+
+async def blocking_handler(db, i):
+    await asyncio.sleep(0)
+    db.save_user(i, {"first_name": f"user {i}"})
+    db.save_registration("basketball", "", str(i % 10), f"09{i:09d}", f"user {i}")
+
+
+async def async_handler(db, i):
+    await asyncio.sleep(0)
+    await db.save_user(i, {"first_name": f"user {i}"})
+    await db.save_registration("basketball", "", str(i % 10), f"09{i:09d}", f"user {i}")
+
+
+async def measure(handler, db, n):
+    stop = asyncio.Event()
+    lags = []
+    tick_task = asyncio.create_task(ticker(stop, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*(handler(db, i) for i in range(n)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await tick_task
+    lags.sort()
+    p99 = lags[int(len(lags) * 0.99) - 1] if lags else 0.0
+    return elapsed, max(lags, default=0.0), p99, len(lags)
+
+
+def report(name, result):
+    elapsed, worst, p99, ticks = result
+    print(f"{name:<22} total {elapsed * 1000:8.1f} ms | ticks {ticks:5d} | "
+          f"max lag {worst * 1000:7.2f} ms | p99 lag {p99 * 1000:6.2f} ms")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    with tempfile.TemporaryDirectory() as tmp:
+        sync_db = Database(os.path.join(tmp, "blocking.db"))
+        sync_db.conn.execute("PRAGMA synchronous=FULL")  # شبیه‌سازی دیسک کند
+        report("blocking db calls", asyncio.run(measure(blocking_handler, sync_db, n)))
+        sync_db.close()
+
+        inner = Database(os.path.join(tmp, "async.db"))
+        inner.conn.execute("PRAGMA synchronous=FULL")
+        async_db = AsyncDatabase(inner)
+        report("AsyncDatabase", asyncio.run(measure(async_handler, async_db, n)))
+        async_db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# ======================================================
+# BENCHMARK: پیدا کردن گروه/رشته‌ی بازیکن - پیمایش گروه‌ها در برابر ایندکس
+# ======================================================
+# اجرا:  python benchmarks/bench_player_index.py [تعداد بازیکن]
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp())  # فایل دیتابیس ربات در پوشه موقت ساخته بشه
+import bot
+
+
+def scan_emoji(phone):
+    """رفتار قبلی today_list / view_time_registrations"""
+    if phone in bot.RAM_PLAYERS["basketball"]:
+        return "🏀"
+    if phone in bot.RAM_PLAYERS["volleyball"]:
+        return "🏐"
+    for g in "ABCDEFGHIJ":
+        if phone in bot.RAM_PLAYERS["futsal"][g]:
+            return "⚽"
+    return "👤"
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    for i in range(n):
+        phone = f"09{i:09d}"
+        if i % 5 == 0:
+            bot.RAM_PLAYERS["basketball"][phone] = f"player {i}"
+        else:
+            bot.RAM_PLAYERS["futsal"]["ABCDEFGHIJ"[i % 10]][phone] = f"player {i}"
+    bot.rebuild_player_index()
+
+    # لیست اشتراکی بزرگ: نیمی عضو، نیمی ناشناس
+    phones = [f"09{i:09d}" for i in range(0, 2 * n, 2)]
+    assert [scan_emoji(p) for p in phones] == [bot.player_sport_emoji(p) for p in phones]
+
+    for name, fn in (("group scan", scan_emoji), ("index", bot.player_sport_emoji)):
+        start = time.perf_counter()
+        for _ in range(10):
+            for p in phones:
+                fn(p)
+        elapsed = (time.perf_counter() - start) / 10
+        print(f"{name:<11} {len(phones)} lookups: {elapsed * 1000:7.2f} ms")
+    bot.db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+# ======================================================
+# BENCHMARK: بررسی EXPLAIN QUERY PLAN با تاریخچه‌ی بزرگ
+# ======================================================
+# اجرا:  python benchmarks/bench_query_plans.py [تعداد تایم گذشته]
+#
+# اگر یکی از کوئری‌های پرتکرار به جای ایندکس کل جدول رو SCAN کنه، assert خطا میده.
+# همین بررسی با تاریخچه‌ی کوچکتر در tests/test_query_plans.py با pytest اجرا میشه.
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from database import Database
+from tests.test_query_plans import QUERIES, populate, query_plan  # همون کوئری‌هایی که تست‌ها بررسی میکنن
+
+
+def main():
+    slots = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "plans.db"))
+        populate(db, slots)
+        print(f"history: {slots} slots, {slots * 10} registrations")
+        for sql, params, expected in QUERIES:
+            plan = query_plan(db, sql, params)
+            assert expected in plan, f"{sql}\n  plan: {plan}"
+            if sql.startswith("SELECT"):
+                start = time.perf_counter()
+                db.conn.execute(sql, params).fetchall()
+                elapsed = (time.perf_counter() - start) * 1000
+            else:
+                elapsed = float("nan")  # حذف‌ها اجرا نمیشن تا داده برای بقیه بمونه
+            print(f"ok  {elapsed:8.2f} ms  {plan}")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# ======================================================
+# BENCHMARK: لیست ثبت‌نام‌ها - ساخت دوباره در هر کلیک در برابر کش نسخه‌دار
+# ======================================================
+# اجرا:  python benchmarks/bench_render_cache.py [تعداد ثبت‌نام اشتراکی] [تعداد تایم فوتسال]
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp())  # فایل دیتابیس ربات در پوشه موقت ساخته بشه
+import bot
+
+
+def timed(fn, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds
+
+
+def main():
+    roster = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    futsal_slots = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    today = bot.get_iran_date()
+
+    for i in range(futsal_slots):
+        bot.RAM_TIMES["futsal"]["ABCDEFGHIJ"[i % 10]].append(
+            bot.Slot(i + 1, today + timedelta(days=i // 50), f"{8 + i % 12:02d}:00", f"{9 + i % 12:02d}:00", 10))
+    shared = bot.Slot(futsal_slots + 1, today, "20:00", "22:00", roster + 10)
+    bot.RAM_TIMES["shared"].append(shared)
+    bot.RAM_REGISTRATIONS["shared"][shared.id] = {f"09{i:09d}": f"player {i}" for i in range(roster)}
+    for i in range(0, roster, 2):
+        bot.RAM_PLAYERS["basketball"][f"09{i:09d}"] = f"player {i}"
+    bot.rebuild_player_index()
+    bot.rebuild_active_slots()
+
+    roster_view = lambda: bot.cached_render(("shared", shared.id), None,
+                                            lambda: bot.render_time_registrations("shared", "", shared.id))
+    list_view = lambda: bot.cached_render(("futsal", None), today, lambda: bot.render_sport_times("futsal", today))
+
+    # کش همون متنی رو میده که ساخت مستقیم میده، و بعد از ثبت‌نام جدید باطل میشه
+    assert roster_view() == bot.render_time_registrations("shared", "", shared.id)
+    assert list_view() == bot.render_sport_times("futsal", today)
+    before = roster_view()[0]
+    asyncio.run(bot.reserve_seat("shared", "", shared.id, "09999999999", "late player", today))
+    after = roster_view()[0]
+    assert after != before and "late player" in after and roster_view()[0] is after
+
+    # موج ثبت‌نام در تایم‌های فوتسال: لیست تایم‌ها و لیست ثبت‌نام تایم‌های دیگه باطل نمیشن
+    listed, shared_roster = list_view(), roster_view()
+    rush = 0
+    for i in range(200):
+        group, slot = bot.find_active_slot("futsal", i % 50 + 1, today)
+        roster_key = ("futsal", slot.id)
+        version = bot.render_version(roster_key)
+        start = time.perf_counter()
+        asyncio.run(bot.reserve_seat("futsal", group, slot.id, f"0935{i:07d}", f"rush {i}", today))
+        list_view(), roster_view()
+        rush += time.perf_counter() - start
+        assert list_view() is listed and roster_view() is shared_roster
+        assert bot.render_version(roster_key) != version  # فقط لیست همین تایم باطل شد
+    print(f"registration rush (200 seats): slot list and other rosters stayed cached, "
+          f"{rush / 200 * 1e6:.1f} µs per seat + 2 views")
+    
+    rounds = 200
+    print(f"shared roster ({roster + 1} players):")
+    print(f"  render every view: {timed(lambda: bot.render_time_registrations('shared', '', shared.id), rounds) * 1e6:9.1f} µs")
+    print(f"  versioned cache:   {timed(roster_view, rounds) * 1e6:9.1f} µs")
+    print(f"futsal slot list ({futsal_slots} slots):")
+    print(f"  render every view: {timed(lambda: bot.render_sport_times('futsal', today), rounds) * 1e6:9.1f} µs")
+    print(f"  versioned cache:   {timed(list_view, rounds) * 1e6:9.1f} µs")
+    bot.db.close()
+
+
+if __name__ == "__main__":
+    main()
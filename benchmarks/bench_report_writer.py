@@ -0,0 +1,113 @@
+# ======================================================
+# BENCHMARK: /today با 5000 ثبت‌نام - text += در برابر ReportWriter
+# ======================================================
+# اجرا:  python benchmarks/bench_report_writer.py [تعداد ثبت‌نام]
+#
+# نسخه‌ی قبلی یک پیام بزرگ میساخت که از سقف 4096 کاراکتر تلگرام رد میشد و ارسالش خطا میداد.
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp())  # فایل دیتابیس ربات در پوشه موقت ساخته بشه
+import bot
+
+PER_SLOT = 25
+
+
+class FakeMessage:
+    """فقط پیام‌ها رو جمع میکنه؛ مثل تلگرام پیام بلندتر از سقف رو رد میکنه"""
+    def __init__(self):
+        self.sent = []
+
+    async def reply_text(self, text, **kwargs):
+        if bot.message_length(text) > bot.TELEGRAM_MESSAGE_LIMIT:
+            raise ValueError("Message is too long")
+        self.sent.append(text)
+
+
+def legacy_today_text():
+    """ساخت متن /today مثل قبل (فوتسال و اشتراکی کافیه)"""
+    text = "📄 ثبت‌نام‌های امروز (RAM):\n\n"
+    for g in "ABCDEFGHIJ":
+        times_by_id = {t.id: t for t in bot.RAM_TIMES["futsal"][g]}
+        for time_id, users in bot.RAM_REGISTRATIONS["futsal"][g].items():
+            if users:
+                t = times_by_id.get(time_id)
+                text += f"⚽ فوتسال گروه {g} - {t.jdate} {t.start}-{t.end}:\n"
+                for phone, name in users.items():
+                    text += f"  👤 {name}\n"
+                text += "\n"
+    times_by_id = {t.id: t for t in bot.RAM_TIMES["shared"]}
+    for time_id, users in bot.RAM_REGISTRATIONS["shared"].items():
+        if users:
+            t = times_by_id.get(time_id)
+            text += f"🤝 اشتراکی - {t.jdate} {t.start}-{t.end}:\n"
+            for phone, name in users.items():
+                text += f"  {bot.player_sport_emoji(phone)} {name}\n"
+            text += "\n"
+    return text
+
+
+def populate(registrations):
+    today = bot.get_iran_date()
+    slots = registrations // PER_SLOT
+    for i in range(slots):
+        sport, group = ("shared", "") if i % 5 == 0 else ("futsal", "ABCDEFGHIJ"[i % 10])
+        slot = bot.Slot(i + 1, today + timedelta(days=i // 40), f"{8 + i % 12:02d}:00", f"{9 + i % 12:02d}:00", PER_SLOT)
+        times = bot.RAM_TIMES["futsal"][group] if sport == "futsal" else bot.RAM_TIMES[sport]
+        regs = bot.RAM_REGISTRATIONS["futsal"][group] if sport == "futsal" else bot.RAM_REGISTRATIONS[sport]
+        times.append(slot)
+        regs[slot.id] = {f"09{i * PER_SLOT + p:09d}": f"بازیکن شماره {i * PER_SLOT + p}" for p in range(PER_SLOT)}
+    for p in range(0, registrations, 3):
+        bot.RAM_PLAYERS["basketball"][f"09{p:09d}"] = "player"
+    bot.rebuild_player_index()
+
+
+async def run_today():
+    message = FakeMessage()
+    update = SimpleNamespace(effective_user=SimpleNamespace(id=bot.SUPER_ADMINS[0]), message=message)
+    await bot.today_list(update, None)
+    return message.sent
+
+
+def main():
+    registrations = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    populate(registrations)
+
+    legacy = legacy_today_text()
+    sent = asyncio.run(run_today())
+    try:
+        asyncio.run(FakeMessage().reply_text(legacy))
+        legacy_status = "sent"
+    except ValueError as e:
+        legacy_status = f"rejected ({e})"
+
+    # همه‌ی خط‌ها به ترتیب رسیدن و هیچ پیامی از سقف رد نشده
+    assert [line for line in legacy.split("\n") if line] == [line for chunk in sent for line in chunk.split("\n") if line]
+    assert all(bot.message_length(chunk) <= bot.TELEGRAM_MESSAGE_LIMIT for chunk in sent)
+
+    rounds = 20
+    start = time.perf_counter()
+    for _ in range(rounds):
+        legacy_today_text()
+    legacy_time = (time.perf_counter() - start) / rounds
+    start = time.perf_counter()
+    for _ in range(rounds):
+        asyncio.run(run_today())
+    writer_time = (time.perf_counter() - start) / rounds
+
+    print(f"/today with {registrations} registrations ({bot.message_length(legacy)} UTF-16 units)")
+    print(f"  text +=        {legacy_time * 1000:7.2f} ms  -> 1 message, {legacy_status}")
+    print(f"  ReportWriter   {writer_time * 1000:7.2f} ms  -> {len(sent)} messages, "
+          f"largest {max(bot.message_length(chunk) for chunk in sent)}")
+    bot.db.close()
+
+
+if __name__ == "__main__":
+    main()
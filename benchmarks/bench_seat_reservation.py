@@ -0,0 +1,101 @@
+# ======================================================
+# STRESS TEST: هزاران ثبت‌نام همزمان روی یک تایم
+# ======================================================
+# اجرا:  python benchmarks/bench_seat_reservation.py [تعداد درخواست] [ظرفیت]
+#
+# هر درخواست یک coroutine جداست (مثل پردازش همزمان آپدیت‌ها). نسخه‌ی بدون قفل
+# بین بررسی ظرفیت و ثبت یک await داره و overbook میشه؛ reserve_seat نباید بشه.
+# بررسی‌های overbook نشدن و حذف تایم وسط درخواست‌ها در tests/test_seat_reservation.py با pytest اجرا میشن.
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp())  # فایل دیتابیس ربات در پوشه موقت ساخته بشه
+import bot
+from database import AsyncDatabase, Database
+
+
+async def unguarded_reserve(sport, group, time_id, phone, name):
+    """الگوی قبلی register اگه آپدیت‌ها همزمان پردازش بشن"""
+    registrations = bot.RAM_REGISTRATIONS[sport][group].setdefault(time_id, {})
+    if phone in registrations:
+        return bot.ALREADY_REGISTERED
+    if len(registrations) >= bot.find_active_slot(sport, time_id)[1].cap:
+        return bot.SLOT_FULL
+    await asyncio.sleep(0)  # هر await (پیام، دیتابیس) اینجا جا رو برای بقیه باز میذاره
+    registrations[phone] = name
+    await bot.db.save_registration(sport, group, time_id, phone, name)
+    return bot.RESERVED
+
+
+async def storm(reserve, time_id, requests):
+    """requests درخواست با 10٪ شماره‌ی تکراری، همه همزمان"""
+    phones = [f"09{random.randrange(requests * 9 // 10):09d}" for _ in range(requests)]
+    start = time.perf_counter()
+    results = await asyncio.gather(*(reserve("futsal", "A", time_id, p, "player") for p in phones))
+    elapsed = time.perf_counter() - start
+    await bot.db.flush()
+    stored = bot.db.sync.conn.execute(
+        "SELECT COUNT(*) FROM registrations WHERE sport='futsal' AND group_name='A' AND time_key=?",
+        (str(time_id),)).fetchone()[0]
+    return results, len(bot.RAM_REGISTRATIONS["futsal"]["A"][time_id]), stored, elapsed
+
+
+async def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    cap = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    today = bot.get_iran_date()
+
+    # write-behind (مثل ربات) و commit مستقیم که داخل قفل واقعاً await می‌کنه
+    behind, direct = bot.db, AsyncDatabase(Database("direct.db"))
+    runs = [(mode, name, reserve) for mode in ("write-behind", "direct")
+            for name, reserve in (("unguarded", unguarded_reserve), ("reserve_seat", bot.reserve_seat))]
+    for mode, name, reserve in runs:
+        if mode == "direct":
+            bot.db = direct
+        bot.RAM_TIMES["futsal"]["A"].clear()  # idهای دو دیتابیس با هم تداخل نکنن
+        bot.RAM_REGISTRATIONS["futsal"]["A"].clear()
+        bot.rebuild_active_slots()
+        slot = bot.Slot(None, today, "23:59", "23:59", cap)
+        slot.id = await bot.db.save_slot("futsal", "A", slot)
+        bot.RAM_TIMES["futsal"]["A"].append(slot)
+        bot.add_active_slot("futsal", "A", slot)
+
+        results, in_ram, stored, elapsed = await storm(reserve, slot.id, requests)
+        reserved = results.count(bot.RESERVED)
+        print(f"{mode:<12} {name:<13} {requests} concurrent: reserved {reserved:5d}, RAM {in_ram:5d}, DB {stored:5d} "
+              f"(cap {cap}) in {elapsed * 1000:7.1f} ms")
+        if reserve is bot.reserve_seat:
+            assert reserved == in_ram == stored == cap, "overbooking!"
+            assert results.count(bot.SLOT_FULL) + results.count(bot.ALREADY_REGISTERED) == requests - cap
+
+    # حذف تایم وسط طوفان: هیچ ثبت‌نامی نباید روی تایم حذف شده بمونه
+    slot = bot.Slot(None, today, "23:59", "23:59", requests)
+    slot.id = await bot.db.save_slot("futsal", "A", slot)
+    bot.RAM_TIMES["futsal"]["A"].append(slot)
+    bot.add_active_slot("futsal", "A", slot)
+
+    async def delete_slot():
+        """مثل remove_group_time"""
+        bot.RAM_REGISTRATIONS["futsal"]["A"].pop(slot.id, None)
+        bot.RAM_TIMES["futsal"]["A"].remove(slot)
+        bot.remove_active_slot("futsal", slot.id)
+
+    half = requests // 2
+    reservations = [bot.reserve_seat("futsal", "A", slot.id, f"09{i:09d}", "player") for i in range(requests)]
+    results = await asyncio.gather(*reservations[:half], delete_slot(), *reservations[half:])
+    assert slot.id not in bot.RAM_REGISTRATIONS["futsal"]["A"]
+    assert results[half + 1:].count(bot.SLOT_GONE) == requests - half
+    print(f"slot deleted mid-storm: {results.count(bot.SLOT_GONE)} later requests answered 'gone', "
+          f"none written to RAM")
+    behind.close()
+    direct.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+# ======================================================
+# BENCHMARK: تایم به صورت دیکشنری در برابر Slot با __slots__
+# ======================================================
+# اجرا:  python benchmarks/bench_slot_records.py [تعداد تایم]
+#
+# حافظه با tracemalloc و CPU کاری که هر هندلر برای یک تایم انجام میده
+# (بررسی قفل + تاریخ شمسی برای پیام/دکمه) اندازه‌گیری میشه.
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+import jdatetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from models import Slot, TEHRAN_TZ
+
+
+def rows(n):
+    today = date.today()
+    return [(i + 1, today + timedelta(days=i // 200), f"{8 + i % 12:02d}:30", f"{9 + i % 12:02d}:30", 15)
+            for i in range(n)]
+
+
+def legacy_slot(time_id, date_obj, start, end, cap):
+    """شکل قبلی تایم در RAM (مثل _time_from_row قبلی؛ رشته‌ها از ردیف دیتابیس کپی جدا بودن)"""
+    return {"id": time_id, "date": date_obj.isoformat(), "start": "".join(start), "end": "".join(end),
+            "cap": cap, "date_obj": date_obj}
+
+
+def legacy_handler(t, now):
+    """کاری که هندلرها با دیکشنری انجام میدادن: strptime + localize برای قفل، jdatetime برای تاریخ"""
+    start_datetime = TEHRAN_TZ.localize(datetime.strptime(f"{t['date_obj'].isoformat()} {t['start']}", "%Y-%m-%d %H:%M"))
+    locked = (start_datetime - now).total_seconds() / 60 < 30
+    label = jdatetime.date.fromgregorian(date=t["date_obj"]).strftime('%Y/%m/%d')
+    return locked, f"{label} {t['start']}-{t['end']}"
+
+
+def slot_handler(t, now_ts):
+    return now_ts > t.lock_deadline, f"{t.jdate} {t.start}-{t.end}"
+
+
+def measure_memory(build, data):
+    gc.collect()
+    tracemalloc.start()
+    slots = [build(*row) for row in data]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    start = time.perf_counter()
+    [build(*row) for row in data]  # زمان ساخت بدون سربار tracemalloc
+    return slots, size, time.perf_counter() - start
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    data = rows(n)
+    now = datetime.now(TEHRAN_TZ)
+    now_ts = int(now.timestamp())
+
+    legacy, legacy_size, legacy_build = measure_memory(legacy_slot, data)
+    slots, slot_size, slot_build = measure_memory(Slot, data)
+    assert [legacy_handler(t, now) for t in legacy[:500]] == [slot_handler(t, now_ts) for t in slots[:500]]
+
+    print(f"{n} slots")
+    print(f"memory   dict: {legacy_size / 1024:8.0f} KB   Slot: {slot_size / 1024:8.0f} KB")
+    print(f"build    dict: {legacy_build * 1000:8.1f} ms   Slot: {slot_build * 1000:8.1f} ms")
+    for name, fn, items, clock in (("dict", legacy_handler, legacy, now), ("Slot", slot_handler, slots, now_ts)):
+        start = time.perf_counter()
+        for t in items:
+            fn(t, clock)
+        elapsed = (time.perf_counter() - start) / n
+        print(f"lock check + label ({name}): {elapsed * 1e6:6.2f} µs per slot")
+
+
+if __name__ == "__main__":
+    main()
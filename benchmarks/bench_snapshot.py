@@ -0,0 +1,70 @@
+# ======================================================
+# BENCHMARK: راه‌اندازی مجدد از snapshot در برابر لود از دیتابیس
+# ======================================================
+# اجرا:  python benchmarks/bench_snapshot.py [تعداد تایم فعال] [تعداد تغییر بعد از snapshot]
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from database import Database, encode_snapshot, write_snapshot
+from models import Slot
+
+PLAYERS = 10000
+PER_SLOT = 10
+
+
+def populate(db, slots):
+    today = date.today()
+    for p in range(PLAYERS):
+        db.save_player("futsal", "ABCDEFGHIJ"[p % 10], f"09{p:09d}", f"player {p}")
+    for i in range(slots):
+        day = today + timedelta(days=i // 50)
+        time_data = Slot(None, day, "18:00", "19:00", PER_SLOT)
+        time_id = db.save_slot("futsal", "ABCDEFGHIJ"[i % 10], time_data)
+        for p in range(PER_SLOT):
+            db.save_registration("futsal", "ABCDEFGHIJ"[i % 10], time_id, f"09{i * PER_SLOT + p:09d}", "player")
+
+
+def main():
+    slots = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    changes = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "snap.db"), write_behind=True)
+        snapshot_file = os.path.join(tmp, "snap.snapshot")
+        populate(db, slots)
+        db.flush()
+        today = date.today()
+
+        # snapshot مثل موقع خاموش شدن ربات
+        data = db.load_all_to_ram(active_from=today, load_users=False)
+        seq = db.change_seq()
+        size = write_snapshot(snapshot_file, encode_snapshot(data), seq, db.schema_version())
+        db.prune_change_log(seq)
+
+        # تغییرات بعد از snapshot (ثبت‌نام‌های جدید و لغو)
+        for i in range(changes):
+            db.save_registration("futsal", "A", 1 + (i % slots) // 10 * 10, f"0935{i:07d}", "late")
+        db.flush()
+
+        start = time.perf_counter()
+        full = db.load_all_to_ram(active_from=today, load_users=False)
+        db_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        restored, _, source = db.load_ram(snapshot_file, today)
+        snap_ms = (time.perf_counter() - start) * 1000
+
+        full.pop("USERS")
+        restored.pop("USERS", None)
+        assert restored == full, "snapshot + replay با لود کامل برابر نیست"
+        print(f"{slots} active slots, {slots * PER_SLOT} registrations, {PLAYERS} players, snapshot {size // 1024} KB")
+        print(f"database load:        {db_ms:8.1f} ms")
+        print(f"snapshot + replay:    {snap_ms:8.1f} ms  ({source})")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
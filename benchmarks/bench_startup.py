@@ -0,0 +1,110 @@
+# ======================================================
+# BENCHMARK: زمان و حافظه‌ی لود اولیه (کامل در برابر پنجره‌ای)
+# ======================================================
+# اجرا:  python benchmarks/bench_startup.py [تعداد کاربر] [تعداد بازیکن] [تعداد تایم گذشته]
+#
+# هر حالت در یک پروسه‌ی جدا اجرا میشه تا ru_maxrss هر کدوم جدا اندازه‌گیری بشه.
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from database import Database
+
+ACTIVE_SLOTS = 200   # تایم‌های امروز به بعد
+PER_SLOT = 10        # ثبت‌نام در هر تایم
+
+
+def populate(path, users, players, expired_slots):
+    db = Database(path)
+    today = date.today()
+    with db.conn:
+        db.conn.executemany(
+            "INSERT INTO users (user_id, first_name, last_name, username, full_name, date, language, help_seen) "
+            "VALUES (?, ?, '', ?, ?, '2024-01-01 10:00:00', 'fa', 1)",
+            ((i, f"user {i}", f"user{i}", f"user number {i}") for i in range(users)))
+        db.conn.executemany(
+            "INSERT INTO players (sport, group_name, phone, name) VALUES ('futsal', ?, ?, ?)",
+            (("ABCDEFGHIJ"[p % 10], f"09{p:09d}", f"player {p}") for p in range(players // 2)))
+        db.conn.executemany(
+            "INSERT INTO players (sport, group_name, phone, name) VALUES ('basketball', '', ?, ?)",
+            ((f"09{p:09d}", f"player {p}") for p in range(players // 2, players)))
+
+        slots = []
+        for i in range(expired_slots + ACTIVE_SLOTS):
+            if i < expired_slots:
+                day = today - timedelta(days=1 + i // 20)
+            else:
+                day = today + timedelta(days=(i - expired_slots) // 20)
+            slots.append(("ABCDEFGHIJ"[i % 10], day.isoformat(), "18:00", "19:00", PER_SLOT, day.isoformat()))
+        db.conn.executemany(
+            "INSERT INTO slots (sport, group_name, date, start, end, cap, date_obj) VALUES ('futsal', ?, ?, ?, ?, ?, ?)",
+            slots)
+        db.conn.executemany(
+            "INSERT INTO registrations (sport, group_name, time_key, phone, name) VALUES ('futsal', ?, ?, ?, ?)",
+            ((slots[i][0], str(i + 1), f"09{p:09d}", f"player {p}")
+             for i in range(len(slots)) for p in range(PER_SLOT)))
+    db.conn.execute("ANALYZE")
+    db.close()
+
+
+def store_sample_id(db):
+    return db.conn.execute("SELECT MAX(user_id) FROM users").fetchone()[0]
+
+
+def measure(mode, path):
+    """اجرا در پروسه‌ی فرزند: یک بار لود و چاپ نتیجه"""
+    db = Database(path)
+    start = time.perf_counter()
+    if mode == "full":
+        data = db.load_all_to_ram()
+        users = len(data["USERS"])
+    else:
+        data = db.load_all_to_ram(active_from=date.today(), load_users=False)
+        store = db.user_store()  # مثل main: کاربران موقع نیاز
+        users = 0
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    slots = sum(len(t) for t in data["RAM_TIMES"]["futsal"].values())
+    regs = sum(len(r) for g in data["RAM_REGISTRATIONS"]["futsal"].values() for r in g.values())
+    print(f"{mode:<9} {elapsed * 1000:8.1f} ms  peak RSS {peak:7.1f} MB  "
+          f"({users} users, {slots} slots, {regs} registrations in RAM)")
+    if mode != "full":
+        user_id = store_sample_id(db)
+        # اولین آپدیت یک کاربر: load_user همین رو روی executor دیتابیس میخونه
+        start = time.perf_counter()
+        store[user_id] = db.get_user(user_id)
+        lookup = time.perf_counter() - start
+        assert store.get(user_id) is not None
+        # اولین آمار/برادکست: ensure_users_loaded همین کار رو روی executor دیتابیس میکنه
+        start = time.perf_counter()
+        store.track_writes()
+        store.adopt(db.load_users())
+        users = len(store)
+        complete = time.perf_counter() - start
+        print(f"{'':<9} first lookup of a user {lookup * 1e6:.0f} µs, "
+              f"first full load (/user_stats, /broadcast; off the event loop) {complete * 1000:.1f} ms for {users} users")
+    db.close()
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    players = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    expired = int(sys.argv[3]) if len(sys.argv) > 3 else 20000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "startup.db")
+        populate(path, users, players, expired)
+        print(f"database: {users} users, {players} players, {expired} expired + {ACTIVE_SLOTS} active slots")
+        for mode in ("full", "windowed"):
+            subprocess.run([sys.executable, __file__, "--measure", mode, path], check=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--measure":
+        measure(sys.argv[2], sys.argv[3])
+    else:
+        main()
@@ -0,0 +1,65 @@
+# ======================================================
+# BENCHMARK: ساخت کیبورد تایم‌ها - all_times.index در برابر id پایدار
+# ======================================================
+# اجرا:  python benchmarks/bench_times_keyboard.py [تعداد تایم فوتسال]
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp())  # فایل دیتابیس ربات در پوشه موقت ساخته بشه
+import bot
+
+
+def old_keyboard(page):
+    """رفتار قبلی show_times_page: برای هر دکمه all_times.index(t) (جستجوی خطی با مقایسه‌ی دیکشنری)"""
+    all_times = []
+    for g in "ABCDEFGHIJ":
+        for t in bot.RAM_TIMES["futsal"][g]:
+            if not bot.is_time_expired(t, bot.get_iran_date()):  # قبلاً هر بار ساعت خونده میشد
+                t_copy = {"id": t.id, "date": t.date, "date_obj": t.date_obj,
+                          "start": t.start, "end": t.end, "cap": t.cap}  # تایم‌ها قبلاً دیکشنری بودن
+                t_copy["group"] = g
+                all_times.append(t_copy)
+    grouped = {}
+    for t in all_times:
+        grouped.setdefault(t["date_obj"].isoformat(), []).append(t)
+    sorted_dates = sorted(grouped)
+    keyboard = []
+    for t in sorted(grouped[sorted_dates[page]], key=lambda x: x["start"]):
+        label = f"{t['group']} | {t['start']}-{t['end']} ({t['cap']})"
+        keyboard.append([bot.InlineKeyboardButton(label, callback_data=f"futsal:{t['group']}:{all_times.index(t)}")])
+    return keyboard
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    today = bot.get_iran_date()
+    for i in range(n):
+        day = today + timedelta(days=i // 100)
+        bot.RAM_TIMES["futsal"]["ABCDEFGHIJ"[i % 10]].append(
+            bot.Slot(i + 1, day, f"{8 + i % 12:02d}:00", f"{9 + i % 12:02d}:00", 10))
+    bot.rebuild_active_slots()
+
+    # هر callback باید به همون تایمی برسه که دکمه‌اش نشون میده
+    for page in range(len(bot.active_slots("futsal")["dates"])):
+        for row in bot.build_times_keyboard("futsal", page):
+            _, group, time_id = row[0].callback_data.split(":")
+            assert bot.find_active_slot("futsal", int(time_id))[0] == group
+
+    rounds = 50
+    for page in (0, n // 100 - 1):
+        for name, fn in (("all_times.index", old_keyboard), ("stable id", lambda p: bot.build_times_keyboard("futsal", p))):
+            start = time.perf_counter()
+            for _ in range(rounds):
+                fn(page)
+            elapsed = (time.perf_counter() - start) / rounds
+            print(f"{name:<16} page {page:>2} ({n} active slots): {elapsed * 1000:8.3f} ms")
+    bot.db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# ======================================================
+# BENCHMARK: حافظه‌ی USERS - دیکشنری برای هر کاربر در برابر UserStore ستونی
+# ======================================================
+# اجرا:  python benchmarks/bench_users.py [تعداد کاربر ...]
+#
+# حافظه با tracemalloc اندازه‌گیری میشه؛ هر کاربر مثل start ساخته میشه
+# (رشته‌ها از ردیف دیتابیس میان، پس بین کاربران share نمیشن).
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from models import UserStore
+
+FIRST_NAMES = ["Ali", "Reza", "Sara", "Mina", "Mohammad", "Zahra", "Amir", "Fatemeh", "علی", "محمدرضا"]
+LAST_NAMES = ["Ahmadi", "Karimi", "Hosseini", "رضایی", None, None]
+LANGUAGES = ["fa", "fa", "fa", "en", "ru", None]
+
+
+def synthetic_rows(n):
+    """(user_id, دیکشنری کاربر) مثل ردیف‌هایی که از جدول users خونده میشن"""
+    rng = random.Random(42)
+    first_seen = datetime(2024, 1, 1)
+    for i in range(n):
+        first = rng.choice(FIRST_NAMES) + str(i % 1000)
+        last = rng.choice(LAST_NAMES)
+        username = f"user_{i}" if rng.random() < 0.7 else None
+        seen = first_seen + timedelta(seconds=rng.randrange(60 * 86400))
+        yield 100000000 + i * 7, {
+            "first_name": "".join(first),
+            "last_name": last and "".join(last),
+            "username": username,
+            "full_name": f"{first} {last}" if last else "".join(first),
+            "date": seen.strftime("%Y-%m-%d %H:%M:%S"),
+            "language": LANGUAGES[i % len(LANGUAGES)] and "".join(LANGUAGES[i % len(LANGUAGES)]),
+            "help_seen": i % 3 == 0,
+            "blocked": i % 50 == 0,
+            "deactivated": i % 200 == 1
+        }
+
+
+def build_dict(rows):
+    users = {}
+    for user_id, user_data in rows:
+        users[user_id] = user_data
+    return users
+
+
+def build_store(rows):
+    users = UserStore()
+    for user_id, user_data in rows:
+        users.append_sorted(user_id, user_data)
+    return users
+
+
+def measure(build, n):
+    gc.collect()
+    tracemalloc.start()
+    users = build(synthetic_rows(n))
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return users, size
+
+
+def build_time(build, rows):
+    """زمان ساخت بدون tracemalloc و بدون ساختن ردیف‌ها"""
+    start = time.perf_counter()
+    build(rows)
+    return (time.perf_counter() - start) / len(rows)
+
+
+def lookup_time(users, ids):
+    start = time.perf_counter()
+    for user_id in ids:
+        users.get(user_id)
+    return (time.perf_counter() - start) / len(ids)
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100000, 1000000]
+    for n in sizes:
+        legacy, legacy_size = measure(build_dict, n)
+        store, store_size = measure(build_store, n)
+
+        sample = random.Random(1).sample(list(legacy), 1000)
+        assert all(store[user_id] == legacy[user_id] for user_id in sample)
+        assert len(store) == len(legacy) and 1 not in store
+
+        print(f"{n} users")
+        print(f"  memory  dict: {legacy_size / 2**20:8.1f} MB   UserStore: {store_size / 2**20:8.1f} MB "
+              f"({legacy_size / n:.0f} -> {store_size / n:.0f} bytes per user)")
+        rows = list(synthetic_rows(min(n, 100000)))
+        print(f"  build   dict: {build_time(build_dict, rows) * 1e6:8.2f} µs   "
+              f"UserStore: {build_time(build_store, rows) * 1e6:8.2f} µs per user")
+        print(f"  get     dict: {lookup_time(legacy, sample) * 1e6:8.2f} µs   "
+              f"UserStore: {lookup_time(store, sample) * 1e6:8.2f} µs")
+        del legacy, store
+
+
+if __name__ == "__main__":
+    main()
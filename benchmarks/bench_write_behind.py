@@ -0,0 +1,52 @@
+# ======================================================
+# BENCHMARK: صف write-behind در هجوم ثبت‌نام ساعت 00:00
+# ======================================================
+# اجرا:  python benchmarks/bench_write_behind.py [تعداد ثبت‌نام]
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from database import Database, AsyncDatabase
+
+
+async def burst(db, n):
+    async def one(i):
+        await asyncio.sleep((i % 50) / 1000)  # پخش شدن درخواست‌ها در حدود 50 میلی‌ثانیه
+        phone = f"09{i:09d}"
+        await db.save_user(i, {"first_name": f"user {i}"})
+        await db.save_registration("futsal", "A", "1", phone, f"user {i}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    return time.perf_counter() - start
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    with tempfile.TemporaryDirectory() as tmp:
+        inner = Database(os.path.join(tmp, "direct.db"))
+        direct = AsyncDatabase(inner)
+        elapsed = asyncio.run(burst(direct, n))
+        direct.close()
+        print(f"direct commits:  {2 * n:5d} transactions, handlers done in {elapsed * 1000:8.1f} ms")
+
+        inner = Database(os.path.join(tmp, "queued.db"), write_behind=True)
+        queued = AsyncDatabase(inner)
+        elapsed = asyncio.run(burst(queued, n))
+        queued.close()  # flush نهایی موقع خاموش شدن
+        queue = inner.queue
+        print(f"write-behind:    {queue.flushes:5d} transactions, handlers done in {elapsed * 1000:8.1f} ms "
+              f"({queue.operations} operations)")
+
+        check = Database(os.path.join(tmp, "queued.db"))
+        rows = check.conn.execute("SELECT COUNT(*) FROM registrations").fetchone()[0]
+        check.close()
+        assert rows == n, rows
+        print(f"rows persisted after shutdown flush: {rows}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,35 +2,56 @@
 # IMPORTS
 # ======================================================
 import os
-from database import Database
+from database import (Database, AsyncDatabase, encode_snapshot, write_snapshot,
+                      SPORTS, GROUPED_SPORTS, empty_ram_tree, ram_bucket, ram_groups)
+from models import Slot, TEHRAN_TZ, UserStore, jalali
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackQueryHandler
 import logging
 from datetime import datetime, time
 from datetime import date, datetime, time, timedelta
 import jdatetime 
-import pytz
 from datetime import datetime, time, date, timedelta
 import asyncio  
+import bisect
+import heapq
+from array import array
+from collections import deque
+import csv
+import itertools
+import tempfile
+import resource
+from time import perf_counter
 from telegram import (
     Update,
     KeyboardButton,
     ReplyKeyboardMarkup
 )
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+import httpx
 from telegram.ext import (
     ApplicationBuilder,
+    BaseUpdateProcessor,
     CommandHandler,
     MessageHandler,
+    TypeHandler,
     ContextTypes,
     filters
 )
 
+try:
+    import openpyxl  # در requirements.txt؛ فقط برای ورود فایل xlsx لازمه (بدون اون فقط CSV)
+except ImportError:
+    openpyxl = None
+
 
 # ======================================================
 # DATABASE 
 # ======================================================
 # ایجاد نمونه دیتابیس
-db = Database()
+# همه نوشتن‌ها روی ترد جداگانه اجرا میشن تا event loop بلاک نشه
+# ثبت‌نام‌ها و کاربران با صف write-behind دسته‌ای ثبت میشن (RAM منبع اصلیه)
+db = AsyncDatabase(Database(write_behind=True))
 
 # ======================================================
 # CONFIG
@@ -43,81 +64,104 @@ VIEWER_ADMINS = [6807376124]
 
 REPORT_TIME = time(23, 59)
 
+SNAPSHOT_FILE = "sport_bot.snapshot"
+SNAPSHOT_INTERVAL = 600  # هر 10 دقیقه یک snapshot از RAM
+EXPIRY_CHECK_INTERVAL = 60  # هر دقیقه بررسی تایم‌های منقضی (فقط نگاه به سر heap)
+
+# حداکثر آپدیت‌هایی که همزمان پردازش میشن (1 = ترتیبی مثل قبل)
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "64"))
+
+# برادکست: سقف تلگرام حدود 30 پیام در ثانیه برای کل رباته
+BROADCAST_RATE = 25                 # پیام در ثانیه (سطل توکن سراسری)
+BROADCAST_CONCURRENCY = 20          # حداکثر درخواست‌های در جریان
+BROADCAST_MAX_RETRIES = 3           # تلاش دوباره بعد از خطای اتصال (درخواست ارسال نشده)
+BROADCAST_MAX_FLOOD_WAITS = 10      # حداکثر RetryAfter برای یک کاربر قبل از ثبت به عنوان ناموفق
+BROADCAST_BACKOFF = 1.0             # ثانیه؛ هر تلاش دو برابر
+BROADCAST_PROGRESS_INTERVAL = 5     # هر چند ثانیه پیام ادمین با پیشرفت ارسال ویرایش بشه
+DEAD_CHAT_ERRORS = ("deactivated", "chat not found")  # متن خطاهایی که یعنی چت دیگه وجود نداره
+
 # ======================================================
 # IN-MEMORY GROUP LISTS
 # ======================================================
-FUTSAL_GROUPS = {chr(i): set() for i in range(ord("A"), ord("K"))}  # A تا J
+FUTSAL_GROUPS = {g: set() for g in GROUPED_SPORTS["futsal"]}  # A تا J
 
 
 # ======================================================
 # RAM PLAYERS (بازیکن‌ها فقط در حافظه)
 # ======================================================
-RAM_PLAYERS = {
-    "futsal": {g: {} for g in "ABCDEFGHIJ"},   # group -> {phone: name}
-    "basketball": {},                         # phone -> name
-    "volleyball": {},                          # phone -> name
-    "shared": {}                             
-
-}
+# ساختار همه‌ی RAM_* از database.SPORTS / GROUPED_SPORTS ساخته میشه:
+# رشته‌ی گروه‌دار: group -> ...، بقیه مستقیم
+RAM_PLAYERS = empty_ram_tree(dict)  # phone -> name
 
 def initialize_ram():
     """مقداردهی اولیه ساختارهای RAM"""
     global RAM_PLAYERS, RAM_TIMES, RAM_REGISTRATIONS
     
-    # بازیکنان
-    RAM_PLAYERS = {
-        "futsal": {g: {} for g in "ABCDEFGHIJ"},
-        "basketball": {},
-        "volleyball": {},
-        "shared": {}                 
-    }
-    
-    # تایم‌ها
-    RAM_TIMES = {
-        "futsal": {g: [] for g in "ABCDEFGHIJ"},
-        "basketball": [],
-        "volleyball": [],
-        "shared": []     
-    }
+    RAM_PLAYERS = empty_ram_tree(dict)
+    RAM_TIMES = empty_ram_tree(list)
+    RAM_REGISTRATIONS = empty_ram_tree(dict)
     
-    # ثبت‌نام‌ها
-    RAM_REGISTRATIONS = {
-        "futsal": {g: {} for g in "ABCDEFGHIJ"},
-        "basketball": {},
-        "volleyball": {},
-        "shared": {}                             
-    }
+    PLAYER_INDEX.clear()
+    RENDER_CACHE.clear()
+    ROSTER_VERSIONS.clear()
 
 # ======================================================
 # RAM REGISTRATIONS (ثبت نام فقط در حافظه)
 # ======================================================
-RAM_REGISTRATIONS = {
-    "futsal": {g: {} for g in "ABCDEFGHIJ"},  # group -> {time_id: {phone: name}}
-    "basketball": {},  # time_id -> {phone: name}
-    "volleyball": {},   # time_id -> {phone: name}
-    "shared": {}                             
-
-}
+RAM_REGISTRATIONS = empty_ram_tree(dict)  # time_id -> {phone: name}
 
 # ======================================================
 # RAM TIMES (تایم‌ها فقط در حافظه)
 # ======================================================
-RAM_TIMES = {
-    "futsal": {g: [] for g in "ABCDEFGHIJ"},  # group -> list of times with date
-    "basketball": [],
-    "volleyball": [],
-    "shared": []                                  
+RAM_TIMES = empty_ram_tree(list)  # list of times with date (مرتب بر اساس تاریخ)
 
-}
+# ======================================================
+# PLAYER INDEX (شماره -> رشته‌ها و گروه)
+# ======================================================
+PLAYER_INDEX = {}  # phone -> {sport: group}  (group برای رشته‌های بدون گروه "" است)
+
+def index_player(sport, group, phone):
+    """ثبت عضویت یک شماره در ایندکس (همراه هر افزودن به RAM_PLAYERS)"""
+    PLAYER_INDEX.setdefault(phone, {})[sport] = group
+    bump_all_rosters("shared")  # اموجی لیست اشتراکی
 
-# هر تایم به این شکل ذخیره میشه:
-# {
-#     "date": "2026-02-11",
-#     "start": "18:00",
-#     "end": "19:00", 
-#     "cap": 15,
-#     "date_obj": date(2026, 2, 11)  # برای مقایسه راحت‌تر
-# }
+def unindex_player(sport, phone):
+    """حذف عضویت یک شماره از ایندکس (همراه هر حذف از RAM_PLAYERS)"""
+    memberships = PLAYER_INDEX.get(phone)
+    if memberships is None:
+        return
+    bump_all_rosters("shared")  # اموجی لیست اشتراکی
+    memberships.pop(sport, None)
+    if not memberships:
+        del PLAYER_INDEX[phone]
+
+def rebuild_player_index():
+    """ساخت دوباره‌ی ایندکس از RAM_PLAYERS (بعد از لود دیتا)"""
+    PLAYER_INDEX.clear()
+    bump_all_rosters("shared")
+    for sport in SPORTS:
+        for g, players in ram_groups(RAM_PLAYERS, sport):
+            for phone in players:
+                index_player(sport, g, phone)
+
+def futsal_group_of(phone):
+    """گروه فوتسال یک شماره یا None"""
+    return PLAYER_INDEX.get(phone, {}).get("futsal")
+
+def player_sport_emoji(phone):
+    """اموجی رشته اصلی بازیکن (اولویت: بسکتبال، والیبال، فوتسال)"""
+    memberships = PLAYER_INDEX.get(phone, {})
+    if "basketball" in memberships:
+        return "🏀"
+    if "volleyball" in memberships:
+        return "🏐"
+    if "futsal" in memberships:
+        return "⚽"
+    return "👤"
+
+# هر تایم یک models.Slot است:
+# Slot(id=12, date_obj=date(2026, 2, 11), start="18:00", end="19:00", cap=15)
+# تاریخ شمسی (jdate, jdate_short)، start_at و lock_deadline (epoch) موقع ساخت حساب میشن
 
 
 # ======================================================
@@ -137,7 +181,38 @@ REQUIRED_CHANNELS = []
 # ======================================================
 # USERS LIST - GLOBAL VARIABLE
 # ======================================================
-USERS = {}  # key: user_id, value: {"first_name": name, "username": username, "date": datetime}
+USERS = UserStore()  # key: user_id, value: {"first_name": name, "username": username, "date": datetime} (ذخیره‌ی ستونی)
+USERS_LOAD_LOCK = asyncio.Lock()  # فقط یک لود کامل همزمان
+
+async def ensure_users_loaded():
+    """
+    قبل از پیمایش یا آمار USERS (لیست کاربران، آمار، برادکست): لود کامل یک بار
+    روی executor دیتابیس، تا event loop چند صد میلی‌ثانیه بلاک نشه
+    """
+    if USERS.complete:
+        return
+    async with USERS_LOAD_LOCK:
+        if USERS.complete:
+            return
+        started = perf_counter()
+        USERS.track_writes()
+        loaded = await db.load_users()
+        USERS.adopt(loaded)
+        print(f"👥 همه‌ی کاربران لود شدن ({len(USERS)} نفر، {(perf_counter() - started) * 1000:.0f} ms)")
+
+async def load_user(user_id):
+    """اگه کاربر هنوز در USERS نیست، از دیتابیس (روی executor، نه event loop) خونده و اضافه میشه"""
+    if USERS.complete or user_id in USERS:
+        return
+    user_data = await db.get_user(user_id)
+    # ممکنه وسط await اضافه شده باشه (مثلاً با ensure_users_loaded) که نسخه‌ی RAM تازه‌تره
+    if user_data is not None and user_id not in USERS:
+        USERS[user_id] = user_data
+
+async def preload_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """قبل از همه‌ی هندلرها (گروه -1): کاربر آپدیت در USERS باشه تا هندلرها فقط از RAM بخونن"""
+    if update.effective_user is not None:
+        await load_user(update.effective_user.id)
 
 
 
@@ -159,8 +234,6 @@ ADMIN_PASSWORD = "admin5686"
 # IRAN TIME UTILS
 # ======================================================
 
-TEHRAN_TZ = pytz.timezone('Asia/Tehran')
-
 def get_iran_now():
     """دریافت زمان فعلی به وقت ایران"""
     return datetime.now(TEHRAN_TZ)
@@ -169,6 +242,14 @@ def get_iran_date():
     """دریافت تاریخ امروز به وقت ایران"""
     return get_iran_now().date()
 
+def clock_snapshot():
+    """
+    ساعت یک آپدیت: یک بار در ابتدای هندلر گرفته میشه و به همه‌ی بررسی‌های قفل و انقضا پاس داده میشه
+    برمیگردونه: (ثانیه‌ی epoch، تاریخ امروز به وقت ایران)
+    """
+    now = get_iran_now()
+    return int(now.timestamp()), now.date()
+
 def get_iran_datetime():
     """دریافت datetime امروز به وقت ایران"""
     return get_iran_now()
@@ -214,8 +295,8 @@ def get_today_date():
     return date.today().isoformat()
 
 def get_today_jalali():
-    """تاریخ امروز به شمسی برای نمایش"""
-    return jdatetime.date.today().strftime("%Y/%m/%d")
+    """تاریخ امروز (به وقت ایران) به شمسی برای نمایش"""
+    return jalali(get_iran_date())
 
 def parse_date(date_str):
     """تبدیل رشته تاریخ به آبجکت date"""
@@ -230,14 +311,255 @@ def parse_date(date_str):
         except:
             return None
 
-def is_time_expired(time_dict):
-    """بررسی اینکه تایم منقضی شده یا نه"""
-    time_date = time_dict.get("date_obj")
-    if not time_date:
-        return True
-    
+def is_time_expired(slot, today):
+    """بررسی اینکه تایم منقضی شده یا نه (today از clock_snapshot همون آپدیت)"""
+    return slot.date_obj < today  # اگر تاریخش گذشته باشه
+
+def find_time(times, time_id):
+    """پیدا کردن تایم با id پایدار دیتابیس"""
+    for t in times:
+        if t.id == time_id:
+            return t
+    return None
+
+# ======================================================
+# ACTIVE SLOT INDEX (تایم‌های فعال هر رشته، مرتب بر اساس تاریخ و ساعت شروع)
+# ======================================================
+# sport -> {"slots": [(group, slot)], "dates": [date], "by_id": {time_id: (group, slot)}}
+# slot همون Slot داخل RAM_TIMES است (کپی نمیشه)، group برای رشته‌های بدون گروه "" است
+# اضافه/حذف تایم هر سه رو در جا به‌روز میکنه (insort / del در جای bisect)، بدون ساخت دوباره؛
+# محدوده‌ی هر صفحه (یک تاریخ) موقع نیاز با bisect روی تاریخ پیدا میشه
+ACTIVE_SLOTS = {}
+ACTIVE_SLOTS_DAY = None  # روزی که ایندکس براش ساخته شده
+
+def slot_sort_key(entry):
+    group, slot = entry
+    return (slot.date_obj, slot.start, slot.id)
+
+def slot_date(entry):
+    return entry[1].date_obj
+
+def _index_dates(index):
+    """محاسبه‌ی تاریخ‌ها و by_id از لیست مرتب (فقط موقع ساخت دوباره‌ی کامل)"""
+    dates = []
+    for _, slot in index["slots"]:
+        if not dates or dates[-1] != slot.date_obj:
+            dates.append(slot.date_obj)
+    index["dates"] = dates
+    index["by_id"] = {slot.id: (group, slot) for group, slot in index["slots"]}
+
+def page_bounds(index, page):
+    """(شروع، پایان) تایم‌های صفحه‌ی page (یک تاریخ) در لیست مرتب؛ دو bisect"""
+    slots, day = index["slots"], index["dates"][page]
+    return bisect.bisect_left(slots, day, key=slot_date), bisect.bisect_right(slots, day, key=slot_date)
+
+def rebuild_active_slots():
+    """ساخت دوباره‌ی ایندکس از RAM_TIMES (بعد از لود، پاکسازی و نیمه‌شب)"""
+    global ACTIVE_SLOTS_DAY
     today = get_iran_date()
-    return time_date < today  # اگر تاریخش گذشته باشه
+    for sport in SPORTS:
+        entries = [(g, t) for g, times in ram_groups(RAM_TIMES, sport) for t in times if t.date_obj >= today]
+        entries.sort(key=slot_sort_key)
+        ACTIVE_SLOTS[sport] = {"slots": entries}
+        _index_dates(ACTIVE_SLOTS[sport])
+        bump_render_version(sport)
+        invalidate_keyboards(sport)
+    ACTIVE_SLOTS_DAY = today
+    
+    # قفل‌ها و متن‌های آماده‌ی تایم‌هایی که دیگه فعال نیستن دور ریخته میشن
+    for key in [k for k in SLOT_LOCKS if k[1] not in ACTIVE_SLOTS[k[0]]["by_id"]]:
+        del SLOT_LOCKS[key]
+    for key in [k for k in RENDER_CACHE if k[1] is not None and k[1] not in ACTIVE_SLOTS[k[0]]["by_id"]]:
+        del RENDER_CACHE[key]
+    for key in [k for k in ROSTER_VERSIONS if k[1] not in ACTIVE_SLOTS[k[0]]["by_id"]]:
+        del ROSTER_VERSIONS[key]
+
+def trim_active_slots(today):
+    """خارج کردن تایم‌های روزهای گذشته از ابتدای ایندکس (کار فقط به اندازه‌ی تایم‌های منقضی)"""
+    global ACTIVE_SLOTS_DAY
+    for sport, index in ACTIVE_SLOTS.items():
+        days = bisect.bisect_left(index["dates"], today)
+        if days == 0:
+            continue
+        cut = bisect.bisect_left(index["slots"], today, key=slot_date)
+        for _, slot in index["slots"][:cut]:
+            del index["by_id"][slot.id]
+            SLOT_LOCKS.pop((sport, slot.id), None)
+            forget_rendered(sport, slot.id)
+        bump_render_version(sport)
+        invalidate_keyboards(sport)
+        del index["slots"][:cut]
+        del index["dates"][:days]
+    ACTIVE_SLOTS_DAY = today
+
+def active_slots(sport, today=None):
+    """ایندکس تایم‌های فعال یک رشته (اگه روز عوض شده و job انقضا هنوز اجرا نشده، همین‌جا کوتاه میشه)"""
+    if today is None:
+        today = get_iran_date()
+    if ACTIVE_SLOTS_DAY is None:
+        rebuild_active_slots()
+    elif ACTIVE_SLOTS_DAY != today:
+        trim_active_slots(today)
+    return ACTIVE_SLOTS[sport]
+
+def add_active_slot(sport, group, slot):
+    """اضافه کردن تایم جدید به ایندکس در جای مرتبش"""
+    bump_render_version(sport)
+    invalidate_keyboards(sport)
+    if ACTIVE_SLOTS_DAY is None or slot.date_obj < ACTIVE_SLOTS_DAY:
+        return  # ایندکس هنوز ساخته نشده یا تایم گذشته است
+    index = ACTIVE_SLOTS[sport]
+    entry = (group, slot)
+    bisect.insort(index["slots"], entry, key=slot_sort_key)
+    index["by_id"][slot.id] = entry
+    dates = index["dates"]
+    day = bisect.bisect_left(dates, slot.date_obj)
+    if day == len(dates) or dates[day] != slot.date_obj:
+        dates.insert(day, slot.date_obj)  # اولین تایم این تاریخ: صفحه‌ی جدید
+
+def remove_active_slot(sport, time_id):
+    """حذف تایم از ایندکس"""
+    bump_render_version(sport)
+    invalidate_keyboards(sport)
+    forget_rendered(sport, time_id)
+    if ACTIVE_SLOTS_DAY is None:
+        return
+    SLOT_LOCKS.pop((sport, time_id), None)
+    index = ACTIVE_SLOTS[sport]
+    entry = index["by_id"].pop(time_id, None)
+    if entry is None:
+        return  # تایم گذشته یا قبلاً حذف شده
+    slots = index["slots"]
+    position = bisect.bisect_left(slots, slot_sort_key(entry), key=slot_sort_key)
+    del slots[position]
+    slot_day = entry[1].date_obj
+    if not ((position < len(slots) and slot_date(slots[position]) == slot_day) or
+            (position > 0 and slot_date(slots[position - 1]) == slot_day)):
+        # آخرین تایم این تاریخ بود: صفحه‌اش هم حذف میشه
+        del index["dates"][bisect.bisect_left(index["dates"], slot_day)]
+
+def find_active_slot(sport, time_id, today=None):
+    """پیدا کردن (group, slot) یک تایم فعال با id پایدارش؛ اگه حذف یا منقضی شده None"""
+    return active_slots(sport, today)["by_id"].get(time_id)
+
+def build_times_keyboard(sport, page):
+    """ساخت دکمه‌های تایم‌های یک صفحه؛ callback هر دکمه id پایدار تایم است نه جایش در لیست"""
+    index = active_slots(sport)
+    keyboard = []
+    start, end = page_bounds(index, page)
+    for group, t in index["slots"][start:end]:
+        if sport in GROUPED_SPORTS:
+            label = f"{group} | {t.jdate_short} {t.start}-{t.end} ({t.cap})"
+            callback = f"{sport}:{group}:{t.id}"
+        else:
+            label = f"{t.jdate_short} {t.start}-{t.end} ({t.cap})"
+            if sport == "shared":
+                label += " 🤝"
+            callback = f"{sport}:{t.id}"
+        
+        keyboard.append([InlineKeyboardButton(label, callback_data=callback)])
+    return keyboard
+
+# ======================================================
+# TIMES KEYBOARD CACHE (صفحه‌های آماده‌ی انتخاب تایم)
+# ======================================================
+# کیبورد هر صفحه فقط به تایم‌ها بستگی داره (نه به کاربر یا ثبت‌نام‌ها)، پس برای همه مشترکه
+# و فقط با اضافه/حذف/انقضای تایم باطل میشه
+KEYBOARD_CACHE = {sport: {} for sport in SPORTS}  # sport -> {page: (متن, کیبورد)}
+KEYBOARD_CACHE_STATS = {"hits": 0, "misses": 0, "invalidations": 0}
+
+def invalidate_keyboards(sport):
+    """دور ریختن صفحه‌های آماده‌ی یک رشته (همراه هر تغییر ایندکس تایم‌های فعال)"""
+    if KEYBOARD_CACHE[sport]:
+        KEYBOARD_CACHE[sport].clear()
+        KEYBOARD_CACHE_STATS["invalidations"] += 1
+
+def render_times_page(sport, page):
+    """متن و کیبورد یک صفحه‌ی انتخاب تایم (page باید در محدوده باشه)"""
+    index = active_slots(sport)
+    dates = index["dates"]
+    first_slot = index["slots"][page_bounds(index, page)[0]][1]  # تاریخ شمسی هر صفحه از اولین تایمش
+    
+    # ساخت کیبورد برای تایم‌های این تاریخ (از قبل بر اساس ساعت شروع مرتب هستن)
+    keyboard = build_times_keyboard(sport, page)
+    
+    # دکمه‌های ناوبری
+    nav_buttons = []
+    if page > 0:
+        prev_date = index["slots"][page_bounds(index, page - 1)[0]][1].jdate_short
+        nav_buttons.append(InlineKeyboardButton(f"◀️ {prev_date}", callback_data=f"page_{sport}_{page-1}"))
+    
+    if page < len(dates) - 1:
+        next_date = index["slots"][page_bounds(index, page + 1)[0]][1].jdate_short
+        nav_buttons.append(InlineKeyboardButton(f"{next_date} ▶️", callback_data=f"page_{sport}_{page+1}"))
+    
+    if nav_buttons:
+        keyboard.append(nav_buttons)
+    
+    # دکمه بازگشت
+    keyboard.append([InlineKeyboardButton("❌ بستن", callback_data="close_times")])
+    
+    text = (
+        f"{SPORT_TITLES.get(sport, sport)} - 📅 {first_slot.jdate}\n"
+        f"⏰ تایم‌های این روز:"
+    )
+    return text, InlineKeyboardMarkup(keyboard)
+
+def cached_times_page(sport, page):
+    """صفحه‌ی انتخاب تایم از کش (در صورت نبودن ساخته و ذخیره میشه)"""
+    pages = KEYBOARD_CACHE[sport]
+    rendered = pages.get(page)
+    if rendered is None:
+        KEYBOARD_CACHE_STATS["misses"] += 1
+        rendered = pages[page] = render_times_page(sport, page)
+    else:
+        KEYBOARD_CACHE_STATS["hits"] += 1
+    return rendered
+
+# ======================================================
+# SEAT RESERVATION (رزرو اتمیک جا در هر تایم)
+# ======================================================
+# بررسی تکراری بودن، ظرفیت و ثبت نهایی زیر قفل همون تایم انجام میشه
+# تا با پردازش همزمان آپدیت‌ها هیچ تایمی بیشتر از ظرفیتش پر نشه
+SLOT_LOCKS = {}  # (sport, time_id) -> asyncio.Lock
+
+RESERVED = "reserved"
+ALREADY_REGISTERED = "duplicate"
+SLOT_FULL = "full"
+SLOT_GONE = "gone"
+
+def slot_lock(sport, time_id):
+    """قفل اختصاصی یک تایم (اولین بار ساخته میشه)"""
+    lock = SLOT_LOCKS.get((sport, time_id))
+    if lock is None:
+        lock = SLOT_LOCKS[(sport, time_id)] = asyncio.Lock()
+    return lock
+
+async def reserve_seat(sport, group, time_id, phone, name, today=None):
+    """رزرو جا برای یک شماره؛ یکی از RESERVED / ALREADY_REGISTERED / SLOT_FULL / SLOT_GONE رو برمیگردونه"""
+    async with slot_lock(sport, time_id):
+        # تایم ممکنه تا گرفتن قفل حذف یا منقضی شده باشه
+        found = find_active_slot(sport, time_id, today)
+        if found is None:
+            return SLOT_GONE
+        slot = found[1]
+        
+        by_time = ram_bucket(RAM_REGISTRATIONS, sport, group)
+        registrations = by_time.get(time_id, {})
+        if phone in registrations:
+            return ALREADY_REGISTERED
+        if len(registrations) >= slot.cap:
+            return SLOT_FULL
+        
+        # دیکشنری ثبت‌نام‌های تایم فقط با اولین رزرو موفق ساخته میشه (نه با درخواست رد شده)
+        by_time.setdefault(time_id, {})[phone] = name
+        bump_roster_version(sport, time_id)  # فقط لیست همین تایم؛ لیست تایم‌ها عوض نشده
+        await db.save_registration(sport, group, time_id, phone, name)
+        return RESERVED
+
+def peak_rss_mb():
+    """حداکثر حافظه‌ی مصرفی پروسه تا این لحظه (ru_maxrss در لینوکس به کیلوبایته)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
 
 # ======================================================
 # START
@@ -267,9 +589,16 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "help_seen": False
         }
         USERS[user_id] = user_data
-        db.save_user(user_id, user_data)  # ✅ این خط اضافه بشه
+        await db.save_user(user_id, user_data)  # ✅ این خط اضافه بشه
         is_new = True
         print(f"✅ کاربر جدید: {user.full_name} ({user_id})")
+    else:
+        known = USERS[user_id]
+        if known["blocked"] or known["deactivated"]:
+            # دوباره استارت زده، یعنی ربات رو آنبلاک کرده: برادکست بعدی دوباره بهش میرسه
+            await db.record_delivery(sent=[user_id])
+            USERS.set_delivery_state(user_id)
+            print(f"🔓 کاربر {user_id} دوباره در دسترس است")
 
     # اگه کاربر جدید باشه یا راهنما رو ندیده باشه
     if is_new or not USERS[user_id].get("help_seen", False):
@@ -320,14 +649,15 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # ======================================================
 async def register(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # ─────────── sanity check ───────────
-    if "sport" not in context.user_data or "time_index" not in context.user_data:
+    if "sport" not in context.user_data or "time_id" not in context.user_data:
         await update.message.reply_text("❌ لطفاً دوباره از ابتدا ثبت‌نام کنید")
         context.user_data.clear()
         return
 
     sport = context.user_data["sport"]
-    idx = context.user_data["time_index"]
+    time_id = context.user_data["time_id"]
     group = context.user_data.get("group")
+    now_ts, today = clock_snapshot()  # ← یک ساعت برای کل این آپدیت
 
     # ─────────── phone normalize ───────────
     raw_phone = update.message.text.strip()
@@ -345,113 +675,67 @@ async def register(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # ─────────── time validation ───────────
     if sport == "futsal":
-        # ساخت all_times مثل time_select برای پیدا کردن تایم درست
-        all_times = []
-        for g in "ABCDEFGHIJ":
-            for t in RAM_TIMES["futsal"][g]:
-                if not is_time_expired(t):
-                    t_copy = t.copy()
-                    t_copy["group"] = g
-                    all_times.append(t_copy)
-        
-        if idx >= len(all_times):
+        found = find_active_slot("futsal", time_id, today)
+        
+        if found is None:
             await update.message.reply_text("❌ تایم فوتسال نامعتبر است")
             context.user_data.clear()
             return
 
-        # پیدا کردن تایم درست از all_times
-        selected_time = all_times[idx]
-        real_group = selected_time.get("group")
-        
-        # پیدا کردن ایندکس واقعی در گروه
-        real_idx = None
-        for i, t in enumerate(RAM_TIMES["futsal"][real_group]):
-            if (t["date_obj"] == selected_time["date_obj"] and 
-                t["start"] == selected_time["start"] and 
-                t["end"] == selected_time["end"]):
-                real_idx = i
-                break
-        
-        if real_idx is None:
-            await update.message.reply_text("❌ خطا در یافتن تایم")
-            context.user_data.clear()
-            return
+        real_group, slot = found
 
-        slot = RAM_TIMES["futsal"][real_group][real_idx]
-        time_date = slot.get("date_obj")
-        
         # بررسی قفل تایم
-        if is_time_locked(time_date, slot.get("start")):
-            j_date = jdatetime.date.fromgregorian(date=time_date)
+        if is_time_locked(slot, now_ts):
             await update.message.reply_text(
                 f"🔒 **ثبت‌نام برای این تایم بسته شد**\n\n"
-                f"📅 تاریخ: {j_date.strftime('%Y/%m/%d')}\n"
-                f"⏰ ساعت: {slot['start']}\n\n"
+                f"📅 تاریخ: {slot.jdate}\n"
+                f"⏰ ساعت: {slot.start}\n\n"
                 f"❌ کمتر از 30 دقیقه به شروع تایم مونده!"
             )
             context.user_data.clear()
             return
-        
-        time_key = f"time_{real_idx}"
-        registrations = RAM_REGISTRATIONS["futsal"][real_group].setdefault(time_key, {})
 
     elif sport == "shared":
-        # ساخت all_times مثل time_select
-        all_times = [t for t in RAM_TIMES["shared"] if not is_time_expired(t)]
+        found = find_active_slot("shared", time_id, today)
         
-        if idx >= len(all_times):
+        if found is None:
             await update.message.reply_text("❌ تایم اشتراکی نامعتبر است")
             context.user_data.clear()
             return
 
-        slot = all_times[idx]
-        time_date = slot.get("date_obj")
-        
-        if is_time_locked(time_date, slot.get("start")):
-            j_date = jdatetime.date.fromgregorian(date=time_date)
+        slot = found[1]
+        if is_time_locked(slot, now_ts):
             await update.message.reply_text(
                 f"🔒 **ثبت‌نام برای این تایم اشتراکی بسته شد**\n\n"
-                f"📅 تاریخ: {j_date.strftime('%Y/%m/%d')}\n"
-                f"⏰ ساعت: {slot['start']}\n\n"
+                f"📅 تاریخ: {slot.jdate}\n"
+                f"⏰ ساعت: {slot.start}\n\n"
                 f"❌ کمتر از 30 دقیقه به شروع تایم مونده!"
             )
             context.user_data.clear()
             return
-        
-        time_key = f"time_{idx}"
-        registrations = RAM_REGISTRATIONS["shared"].setdefault(time_key, {})
 
     else:  # بسکتبال و والیبال
-        # ساخت all_times مثل time_select
-        all_times = [t for t in RAM_TIMES[sport] if not is_time_expired(t)]
+        found = find_active_slot(sport, time_id, today)
         
-        if idx >= len(all_times):
+        if found is None:
             await update.message.reply_text("❌ تایم نامعتبر است")
             context.user_data.clear()
             return
 
-        slot = all_times[idx]
-        time_date = slot.get("date_obj")
-        
-        if is_time_locked(time_date, slot.get("start")):
-            j_date = jdatetime.date.fromgregorian(date=time_date)
+        slot = found[1]
+        if is_time_locked(slot, now_ts):
             sport_name = {
                 "basketball": "بسکتبال",
                 "volleyball": "والیبال"
             }.get(sport, sport)
             await update.message.reply_text(
                 f"🔒 **ثبت‌نام برای این تایم {sport_name} بسته شد**\n\n"
-                f"📅 تاریخ: {j_date.strftime('%Y/%m/%d')}\n"
-                f"⏰ ساعت: {slot['start']}\n\n"
+                f"📅 تاریخ: {slot.jdate}\n"
+                f"⏰ ساعت: {slot.start}\n\n"
                 f"❌ کمتر از 30 دقیقه به شروع تایم مونده!"
             )
             context.user_data.clear()
             return
-        
-        time_key = f"time_{idx}"
-        registrations = RAM_REGISTRATIONS[sport].setdefault(time_key, {})
-
-    capacity = slot.get("cap", 0)
 
     # ─────────── بررسی بازیکن ───────────
     if sport == "futsal":
@@ -461,26 +745,16 @@ async def register(update: Update, context: ContextTypes.DEFAULT_TYPE):
         found_group = None
         
         print(f"   بررسی فوتسال - گروه هدف: {group}")
-        for g in "ABCDEFGHIJ":
-            if RAM_PLAYERS["futsal"][g]:
-                print(f"     گروه {g}: {list(RAM_PLAYERS['futsal'][g].keys())}")
         
-        # اول در همان گروه جستجو کن
-        if phone in RAM_PLAYERS["futsal"][group]:
+        # گروه بازیکن از ایندکس شماره‌ها
+        found_group = futsal_group_of(phone)
+        if found_group is not None:
             found_player = True
-            found_name = RAM_PLAYERS["futsal"][group][phone]
-            found_group = group
-            print(f"   ✅ بازیکن در گروه {group} پیدا شد: {found_name}")
-        
-        # اگر در همان گروه نبود، بقیه گروه‌ها رو چک کن
-        else:
-            for g in "ABCDEFGHIJ":
-                if phone in RAM_PLAYERS["futsal"][g]:
-                    found_player = True
-                    found_name = RAM_PLAYERS["futsal"][g][phone]
-                    found_group = g
-                    print(f"   ⚠️ بازیکن در گروه {g} پیدا شد (نه گروه هدف)")
-                    break
+            found_name = RAM_PLAYERS["futsal"][found_group][phone]
+            if found_group == group:
+                print(f"   ✅ بازیکن در گروه {group} پیدا شد: {found_name}")
+            else:
+                print(f"   ⚠️ بازیکن در گروه {found_group} پیدا شد (نه گروه هدف)")
         
         # اگر اصلاً پیدا نشد
         if not found_player:
@@ -503,27 +777,26 @@ async def register(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         found_in_any = False
         player_name = None
+        memberships = PLAYER_INDEX.get(phone, {})
         
         # چک کردن بسکتبال
-        if phone in RAM_PLAYERS["basketball"]:
+        if "basketball" in memberships:
             found_in_any = True
             player_name = RAM_PLAYERS["basketball"][phone]
             print(f"   ✅ بازیکن در بسکتبال پیدا شد: {player_name}")
         
         # چک کردن والیبال
-        elif phone in RAM_PLAYERS["volleyball"]:
+        elif "volleyball" in memberships:
             found_in_any = True
             player_name = RAM_PLAYERS["volleyball"][phone]
             print(f"   ✅ بازیکن در والیبال پیدا شد: {player_name}")
         
-        # چک کردن فوتسال (همه گروه‌ها)
-        else:
-            for g in "ABCDEFGHIJ":
-                if phone in RAM_PLAYERS["futsal"][g]:
-                    found_in_any = True
-                    player_name = RAM_PLAYERS["futsal"][g][phone]
-                    print(f"   ✅ بازیکن در فوتسال گروه {g} پیدا شد: {player_name}")
-                    break
+        # چک کردن فوتسال
+        elif "futsal" in memberships:
+            g = memberships["futsal"]
+            found_in_any = True
+            player_name = RAM_PLAYERS["futsal"][g][phone]
+            print(f"   ✅ بازیکن در فوتسال گروه {g} پیدا شد: {player_name}")
         
         if not found_in_any:
             print(f"   ❌ بازیکن با شماره {phone} در هیچ رشته‌ای پیدا نشد")
@@ -538,10 +811,11 @@ async def register(update: Update, context: ContextTypes.DEFAULT_TYPE):
             RAM_PLAYERS["shared"] = {}
         if phone not in RAM_PLAYERS["shared"]:
             RAM_PLAYERS["shared"][phone] = player_name
-            db.save_shared_player(phone, player_name)
+            index_player("shared", "", phone)
+            await db.save_player("shared", "", phone, player_name)
 
     else:  # بسکتبال و والیبال
-        print(f"   بررسی {sport} - محتوای RAM_PLAYERS[{sport}]: {RAM_PLAYERS.get(sport, {})}")
+        print(f"   بررسی {sport} - {len(RAM_PLAYERS.get(sport, {}))} بازیکن")
         print(f"   جستجوی شماره: {phone}")
         
         if RAM_PLAYERS.get(sport) is None:
@@ -556,32 +830,27 @@ async def register(update: Update, context: ContextTypes.DEFAULT_TYPE):
             }.get(sport, sport)
             
             print(f"   ❌ بازیکن با شماره {phone} در لیست {sport_name} پیدا نشد")
-            print(f"   شماره‌های موجود: {list(RAM_PLAYERS[sport].keys())}")
             
             await update.message.reply_text(f"❌ شما در لیست {sport_name} نیستید")
             return
         
         print(f"   ✅ بازیکن پیدا شد: {player_name}")
 
-    # ─────────── بررسی تکراری بودن ───────────
-    if phone in registrations:
+    # ─────────── رزرو اتمیک (تکراری بودن + ظرفیت + ذخیره نهایی) ───────────
+    status = await reserve_seat(sport, real_group if sport == "futsal" else "", time_id, phone, player_name, today)
+    
+    if status == ALREADY_REGISTERED:
         await update.message.reply_text("❌ قبلاً در این تایم ثبت‌نام کرده‌اید")
         return
 
-    # ─────────── بررسی ظرفیت ───────────
-    if len(registrations) >= capacity:
+    if status == SLOT_FULL:
         await update.message.reply_text("❌ ظرفیت این تایم تکمیل شده")
         return
 
-    # ─────────── ذخیره نهایی ───────────
-    registrations[phone] = player_name
-
-    if sport == "futsal":
-        db.save_registration(sport, real_group, time_key, phone, player_name)
-    elif sport == "shared":
-        db.save_registration(sport, "", time_key, phone, player_name)
-    else:
-        db.save_registration(sport, "", time_key, phone, player_name)
+    if status == SLOT_GONE:
+        await update.message.reply_text("❌ این تایم حذف شده یا منقضی شده است")
+        context.user_data.clear()
+        return
     
     print(f"✅ ثبت‌نام موفق: {player_name} - {phone} در {sport}")
 
@@ -599,12 +868,106 @@ async def register(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"✅ ثبت‌نام موفق\n"
         f"👤 {player_name}\n"
         f"🏅 {sport_name}{group_text}\n"
-        f"⏰ {slot['start']} - {slot['end']}"
+        f"⏰ {slot.start} - {slot.end}"
     )
 
     context.user_data.clear()
 
 
+# ======================================================
+# REPORT WRITER (گزارش‌های طولانی ادمین در چند پیام)
+# ======================================================
+TELEGRAM_MESSAGE_LIMIT = 4096   # حداکثر طول یک پیام تلگرام (واحد UTF-16)
+REPORT_SEND_CONCURRENCY = 4     # حداکثر گیرنده‌هایی که همزمان گزارش براشون ارسال میشه
+
+def message_length(text):
+    """طول متن از نظر تلگرام (واحد UTF-16؛ اموجی‌ها دو واحد حساب میشن)"""
+    return len(text.encode("utf-16-le")) // 2
+
+class ReportWriter:
+    """
+    ساخت گزارش خط به خط؛ خط‌ها در لیست جمع میشن و هر پیام با یک join ساخته میشه
+    اگه خط بعدی پیام رو از limit رد کنه پیام بسته میشه (تقسیم فقط روی مرز خط‌ها)
+    """
+    __slots__ = ("limit", "chunks", "_lines", "_size")
+    
+    def __init__(self, limit=TELEGRAM_MESSAGE_LIMIT):
+        self.limit = limit
+        self.chunks = []
+        self._lines = []
+        self._size = 0   # طول پیام در حال ساخت + 1 (هر خط با \n بعدش حساب میشه)
+    
+    def line(self, text=""):
+        """اضافه کردن یک خط (بدون \n)"""
+        size = message_length(text) + 1
+        if size - 1 > self.limit:
+            # خط تنها هم در یک پیام جا نمیشه: تکه‌تکه به عنوان خط‌های جدا
+            for piece in self._split_long(text):
+                self.line(piece)
+            return
+        if self._size + size - 1 > self.limit:
+            self._flush()
+        self._lines.append(text)
+        self._size += size
+    
+    def lines(self, texts):
+        """اضافه کردن چند خط (همون line، با مسیر سریع برای خط‌هایی که در پیام فعلی جا میشن)"""
+        limit = self.limit
+        append = self._lines.append
+        for text in texts:
+            size = len(text.encode("utf-16-le")) // 2 + 1
+            if self._size + size - 1 > limit:
+                self.line(text)  # بستن پیام یا تکه‌تکه کردن خط
+                append = self._lines.append
+                continue
+            append(text)
+            self._size += size
+    
+    def _split_long(self, text):
+        while text:
+            piece = text[:self.limit]
+            excess = message_length(piece) - self.limit
+            while excess > 0:
+                # هر کاراکتر حداکثر دو واحد UTF-16 است
+                piece = piece[:-excess]
+                excess = message_length(piece) - self.limit
+            yield piece
+            text = text[len(piece):]
+    
+    def _flush(self):
+        chunk = "\n".join(self._lines).strip("\n")
+        if chunk:
+            self.chunks.append(chunk)
+        self._lines = []
+        self._size = 0
+    
+    def messages(self):
+        """پیام‌های گزارش (هر کدوم حداکثر limit)"""
+        if self._lines:
+            self._flush()
+        return self.chunks
+
+async def reply_report(message, report, **kwargs):
+    """ارسال پیام‌های گزارش در همون چت به ترتیب (پیام‌های یک چت نباید جابجا برسن)"""
+    for chunk in report.messages():
+        await message.reply_text(chunk, **kwargs)
+
+async def send_report(bot, chat_ids, report, concurrency=REPORT_SEND_CONCURRENCY, **kwargs):
+    """ارسال گزارش به چند گیرنده؛ گیرنده‌ها همزمان (حداکثر concurrency)، پیام‌های هر گیرنده به ترتیب"""
+    chunks = report.messages()
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def deliver(chat_id):
+        async with semaphore:
+            for chunk in chunks:
+                await bot.send_message(chat_id, chunk, **kwargs)
+    
+    results = await asyncio.gather(*(deliver(chat_id) for chat_id in chat_ids), return_exceptions=True)
+    for chat_id, result in zip(chat_ids, results):
+        if isinstance(result, Exception):
+            print(f"❌ خطا در ارسال گزارش به {chat_id}: {result}")
+
+
 # ======================================================
 # ADMIN COMMANDS
 # ======================================================
@@ -612,112 +975,77 @@ async def today_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update.effective_user.id):
         return
 
-    text = "📄 ثبت‌نام‌های امروز (RAM):\n\n"
+    report = ReportWriter()
+    report.line("📄 ثبت‌نام‌های امروز (RAM):")
+    report.line()
     has_users = False
 
     # فوتسال گروهی
-    for g in "ABCDEFGHIJ":
-        for time_key, users in RAM_REGISTRATIONS["futsal"][g].items():
+    for g in GROUPED_SPORTS["futsal"]:
+        times_by_id = {t.id: t for t in RAM_TIMES["futsal"][g]}
+        for time_id, users in RAM_REGISTRATIONS["futsal"][g].items():
             if users:
                 has_users = True
                 
-                # ✅ پشتیبانی از هر دو فرمت (time_0 و 0)
-                if isinstance(time_key, int) or time_key.isdigit():
-                    time_idx = int(time_key)
-                    time_key_display = f"time_{time_idx}"
-                else:
-                    time_idx = int(time_key.split("_")[1]) if "_" in time_key else 0
-                
-                if time_idx < len(RAM_TIMES["futsal"][g]):
-                    t = RAM_TIMES["futsal"][g][time_idx]
-                    j_date = jdatetime.date.fromgregorian(date=t["date_obj"])
-                    text += f"⚽ فوتسال گروه {g} - {j_date.strftime('%Y/%m/%d')} {t['start']}-{t['end']}:\n"
+                t = times_by_id.get(time_id)
+                if t:
+                    report.line(f"⚽ فوتسال گروه {g} - {t.jdate} {t.start}-{t.end}:")
                 else:
-                    text += f"⚽ فوتسال گروه {g} تایم {time_key}:\n"
+                    report.line(f"⚽ فوتسال گروه {g} تایم {time_id}:")
                 
-                for phone, name in users.items():
-                    text += f"  👤 {name}\n"
-                text += "\n"
+                report.lines(f"  👤 {name}" for name in users.values())
+                report.line()
 
     # بسکتبال
-    for time_key, users in RAM_REGISTRATIONS["basketball"].items():
+    times_by_id = {t.id: t for t in RAM_TIMES["basketball"]}
+    for time_id, users in RAM_REGISTRATIONS["basketball"].items():
         if users:
             has_users = True
             
-            # ✅ پشتیبانی از هر دو فرمت
-            if isinstance(time_key, int) or time_key.isdigit():
-                time_idx = int(time_key)
+            t = times_by_id.get(time_id)
+            if t:
+                report.line(f"🏀 بسکتبال - {t.jdate} {t.start}-{t.end}:")
             else:
-                time_idx = int(time_key.split("_")[1]) if "_" in time_key else 0
-                
-            if time_idx < len(RAM_TIMES["basketball"]):
-                t = RAM_TIMES["basketball"][time_idx]
-                j_date = jdatetime.date.fromgregorian(date=t["date_obj"])
-                text += f"🏀 بسکتبال - {j_date.strftime('%Y/%m/%d')} {t['start']}-{t['end']}:\n"
-            else:
-                text += f"🏀 بسکتبال تایم {time_key}:\n"
+                report.line(f"🏀 بسکتبال تایم {time_id}:")
             
-            for phone, name in users.items():
-                text += f"  👤 {name}\n"
-            text += "\n"
+            report.lines(f"  👤 {name}" for name in users.values())
+            report.line()
 
     # والیبال
-    for time_key, users in RAM_REGISTRATIONS["volleyball"].items():
+    times_by_id = {t.id: t for t in RAM_TIMES["volleyball"]}
+    for time_id, users in RAM_REGISTRATIONS["volleyball"].items():
         if users:
             has_users = True
             
-            # ✅ پشتیبانی از هر دو فرمت
-            if isinstance(time_key, int) or time_key.isdigit():
-                time_idx = int(time_key)
-            else:
-                time_idx = int(time_key.split("_")[1]) if "_" in time_key else 0
-                
-            if time_idx < len(RAM_TIMES["volleyball"]):
-                t = RAM_TIMES["volleyball"][time_idx]
-                j_date = jdatetime.date.fromgregorian(date=t["date_obj"])
-                text += f"🏐 والیبال - {j_date.strftime('%Y/%m/%d')} {t['start']}-{t['end']}:\n"
+            t = times_by_id.get(time_id)
+            if t:
+                report.line(f"🏐 والیبال - {t.jdate} {t.start}-{t.end}:")
             else:
-                text += f"🏐 والیبال تایم {time_key}:\n"
+                report.line(f"🏐 والیبال تایم {time_id}:")
             
-            for phone, name in users.items():
-                text += f"  👤 {name}\n"
-            text += "\n"
+            report.lines(f"  👤 {name}" for name in users.values())
+            report.line()
 
     # بخش اشتراکی
-    for time_key, users in RAM_REGISTRATIONS.get("shared", {}).items():
+    times_by_id = {t.id: t for t in RAM_TIMES.get("shared", [])}
+    for time_id, users in RAM_REGISTRATIONS.get("shared", {}).items():
         if users:
             has_users = True
             
-            # ✅ پشتیبانی از هر دو فرمت
-            if isinstance(time_key, int) or time_key.isdigit():
-                time_idx = int(time_key)
+            t = times_by_id.get(time_id)
+            if t:
+                report.line(f"🤝 اشتراکی - {t.jdate} {t.start}-{t.end}:")
             else:
-                time_idx = int(time_key.split("_")[1]) if "_" in time_key else 0
-                
-            if time_idx < len(RAM_TIMES.get("shared", [])):
-                t = RAM_TIMES["shared"][time_idx]
-                j_date = jdatetime.date.fromgregorian(date=t["date_obj"])
-                text += f"🤝 اشتراکی - {j_date.strftime('%Y/%m/%d')} {t['start']}-{t['end']}:\n"
-            else:
-                text += f"🤝 اشتراکی تایم {time_key}:\n"
+                report.line(f"🤝 اشتراکی تایم {time_id}:")
             
-            for phone, name in users.items():
-                # پیدا کردن رشته اصلی بازیکن
-                sport_emoji = "👤"
-                if phone in RAM_PLAYERS.get("basketball", {}):
-                    sport_emoji = "🏀"
-                elif phone in RAM_PLAYERS.get("volleyball", {}):
-                    sport_emoji = "🏐"
-                else:
-                    for g in "ABCDEFGHIJ":
-                        if phone in RAM_PLAYERS.get("futsal", {}).get(g, {}):
-                            sport_emoji = "⚽"
-                            break
-                
-                text += f"  {sport_emoji} {name}\n"
-            text += "\n"
+            # اموجی رشته اصلی هر بازیکن
+            report.lines(f"  {player_sport_emoji(phone)} {name}" for phone, name in users.items())
+            report.line()
 
-    await update.message.reply_text(text if has_users else "📭 هیچ ثبت‌نامی وجود ندارد")
+    if not has_users:
+        await update.message.reply_text("📭 هیچ ثبت‌نامی وجود ندارد")
+        return
+    await reply_report(update.message, report)
 
 
 # ======================================================
@@ -728,32 +1056,38 @@ async def daily_report(context: ContextTypes.DEFAULT_TYPE):
     await cleanup_expired_times()
     
     # بعد گزارش بده
-    text = "📊 گزارش شبانه ثبت‌نام‌ها (RAM)\n"
-    text += f"📅 تاریخ: {get_today_jalali()}\n\n"
+    report = ReportWriter()
+    report.line("📊 گزارش شبانه ثبت‌نام‌ها (RAM)")
+    report.line(f"📅 تاریخ: {get_today_jalali()}")
+    report.line()
+    has_users = False
 
     # فوتسال
-    for g in "ABCDEFGHIJ":
+    for g in GROUPED_SPORTS["futsal"]:
         total = 0
         for users in RAM_REGISTRATIONS["futsal"][g].values():
             total += len(users)
         if total > 0:
-            text += f"⚽ فوتسال گروه {g}: {total} نفر\n"
+            has_users = True
+            report.line(f"⚽ فوتسال گروه {g}: {total} نفر")
 
     # بسکتبال
     total_basketball = sum(len(users) for users in RAM_REGISTRATIONS["basketball"].values())
     if total_basketball > 0:
-        text += f"🏀 بسکتبال: {total_basketball} نفر\n"
+        has_users = True
+        report.line(f"🏀 بسکتبال: {total_basketball} نفر")
 
     # والیبال
     total_volleyball = sum(len(users) for users in RAM_REGISTRATIONS["volleyball"].values())
     if total_volleyball > 0:
-        text += f"🏐 والیبال: {total_volleyball} نفر\n"
+        has_users = True
+        report.line(f"🏐 والیبال: {total_volleyball} نفر")
 
-    if text == f"📊 گزارش شبانه ثبت‌نام‌ها (RAM)\n📅 تاریخ: {get_today_jalali()}\n\n":
-        text += "📭 هیچ ثبت‌نامی وجود ندارد"
+    if not has_users:
+        report.line("📭 هیچ ثبت‌نامی وجود ندارد")
 
-    for admin in SUPER_ADMINS + VIEWER_ADMINS:
-        await context.bot.send_message(admin, text)
+    # ادمین‌ها همزمان؛ خطای یک ادمین جلوی ارسال به بقیه رو نمیگیره
+    await send_report(context.bot, SUPER_ADMINS + VIEWER_ADMINS, report)
 
 
 # ======================================================
@@ -788,86 +1122,26 @@ async def sport_text_select(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # show times page
 # ======================================================
 async def show_times_page(update: Update, context: ContextTypes.DEFAULT_TYPE, sport: str, page: int):
-    """نمایش تایم‌های یک صفحه خاص"""
+    """نمایش تایم‌های یک صفحه خاص (هر صفحه = یک تاریخ)"""
     
-    # گرفتن همه تایم‌های فعال
-    if sport == "futsal":
-        all_times = []
-        for g in "ABCDEFGHIJ":
-            for t in RAM_TIMES["futsal"][g]:
-                if not is_time_expired(t):
-                    # اضافه کردن گروه به تایم
-                    t_copy = t.copy()
-                    t_copy["group"] = g
-                    all_times.append(t_copy)
-    else:
-        all_times = [t for t in RAM_TIMES[sport] if not is_time_expired(t)]
+    # تایم‌های فعال از ایندکس مرتب؛ فقط تایم‌های همین صفحه پیمایش میشن
+    index = active_slots(sport)
+    dates = index["dates"]
     
-    if not all_times:
+    if not dates:
         await update.message.reply_text("❌ تایمی وجود ندارد")
         return
     
-    # گروه‌بندی بر اساس تاریخ
-    grouped_times, sorted_dates = group_times_by_date(all_times)
-    
-    if page >= len(sorted_dates):
-        page = len(sorted_dates) - 1
+    if page >= len(dates):
+        page = len(dates) - 1
     elif page < 0:
         page = 0
     
     context.user_data["page"] = page
-    current_date = sorted_dates[page]
-    current_date_obj = datetime.fromisoformat(current_date).date()
-    j_date = jdatetime.date.fromgregorian(date=current_date_obj)
-    
-    # ساخت کیبورد برای تایم‌های این تاریخ
-    keyboard = []
-    times_for_date = grouped_times[current_date]
-    
-    # مرتب‌سازی تایم‌ها بر اساس ساعت شروع
-    times_for_date.sort(key=lambda x: x["start"])
-    
-    for t in times_for_date:
-        if sport == "futsal":
-            group = t.get("group", "A")
-            label = f"{group} | {j_date.strftime('%m/%d')} {t['start']}-{t['end']} ({t['cap']})"
-            callback = f"futsal:{group}:{all_times.index(t)}"  # ایندکس اصلی
-        else:
-            label = f"{j_date.strftime('%m/%d')} {t['start']}-{t['end']} ({t['cap']})"
-            if sport == "shared":
-                label += " 🤝"
-            callback = f"{sport}:{all_times.index(t)}"
-        
-        keyboard.append([InlineKeyboardButton(label, callback_data=callback)])
-    
-    # دکمه‌های ناوبری
-    nav_buttons = []
-    if page > 0:
-        prev_date = jdatetime.date.fromgregorian(date=datetime.fromisoformat(sorted_dates[page-1]).date())
-        nav_buttons.append(InlineKeyboardButton(f"◀️ {prev_date.strftime('%m/%d')}", callback_data=f"page_{sport}_{page-1}"))
-    
-    if page < len(sorted_dates) - 1:
-        next_date = jdatetime.date.fromgregorian(date=datetime.fromisoformat(sorted_dates[page+1]).date())
-        nav_buttons.append(InlineKeyboardButton(f"{next_date.strftime('%m/%d')} ▶️", callback_data=f"page_{sport}_{page+1}"))
-    
-    if nav_buttons:
-        keyboard.append(nav_buttons)
     
-    # دکمه بازگشت
-    keyboard.append([InlineKeyboardButton("❌ بستن", callback_data="close_times")])
-    
-    sport_name = {
-        "futsal": "⚽ فوتسال",
-        "basketball": "🏀 بسکتبال",
-        "volleyball": "🏐 والیبال",
-        "shared": "🤝 اشتراکی"
-    }.get(sport, sport)
-    
-    await update.message.reply_text(
-        f"{sport_name} - 📅 {j_date.strftime('%Y/%m/%d')}\n"
-        f"⏰ تایم‌های این روز:",
-        reply_markup=InlineKeyboardMarkup(keyboard)
-    )
+    # متن و کیبورد صفحه برای همه‌ی کاربران یکسانه و تا تغییر بعدی تایم‌ها از کش میاد
+    text, reply_markup = cached_times_page(sport, page)
+    await update.message.reply_text(text, reply_markup=reply_markup)
 
 # ======================================================
 #  time select
@@ -878,7 +1152,7 @@ async def time_select(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     data = query.data.split(":")
     sport = data[0]
-    today = get_iran_date()  # ← تاریخ امروز به وقت ایران
+    now_ts, today = clock_snapshot()  # ← یک ساعت برای کل این آپدیت
 
 
     # فوتسال گروهی
@@ -886,41 +1160,33 @@ async def time_select(update: Update, context: ContextTypes.DEFAULT_TYPE):
         group = data[1]
 
         try:
-            idx = int(data[2])
+            time_id = int(data[2])
         except:
             await query.edit_message_text("❌ خطا در انتخاب تایم")
             return
 
-        # پیدا کردن تایم با ایندکس اصلی
-        all_times = []
-        for g in "ABCDEFGHIJ":
-            for t in RAM_TIMES["futsal"][g]:
-                if not is_time_expired(t):
-                    t_copy = t.copy()
-                    t_copy["group"] = g
-                    all_times.append(t_copy)
-        
-        if idx < len(all_times):
-            time_info = all_times[idx]
-            time_date = time_info.get("date_obj")
+        # پیدا کردن تایم با id پایدارش (حتی اگه بعد از ساخت کیبورد تایمی اضافه/حذف شده باشه)
+        found = find_active_slot("futsal", time_id, today)
+        
+        if found:
+            time_info = found[1]
+            time_date = time_info.date_obj
             
             # بررسی تاریخ (فقط روز برگزاری)
-            if time_date and time_date > today:
-                j_date = jdatetime.date.fromgregorian(date=time_date)
+            if time_date > today:
                 await query.edit_message_text(
                     f"⏰ مهلت ثبت‌نام برای این تایم هنوز شروع نشده!\n"
-                    f"📅 تاریخ تایم: {j_date.strftime('%Y/%m/%d')}\n"
+                    f"📅 تاریخ تایم: {time_info.jdate}\n"
                     f"❌ فقط در روز برگزاری می‌توانید ثبت‌نام کنید"
                 )
                 return
             
             # بررسی قفل تایم
-            if is_time_locked(time_date, time_info.get("start")):
-                j_date = jdatetime.date.fromgregorian(date=time_date)
+            if is_time_locked(time_info, now_ts):
                 await query.edit_message_text(
                     f"🔒 **ثبت‌نام برای این تایم بسته شد**\n\n"
-                    f"📅 تاریخ: {j_date.strftime('%Y/%m/%d')}\n"
-                    f"⏰ ساعت: {time_info['start']}\n\n"
+                    f"📅 تاریخ: {time_info.jdate}\n"
+                    f"⏰ ساعت: {time_info.start}\n\n"
                     f"❌ کمتر از 30 دقیقه به شروع تایم مونده!\n"
                     f"برای ثبت‌نام زودتر اقدام کنید."
                 )
@@ -928,25 +1194,24 @@ async def time_select(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         context.user_data["sport"] = "futsal"
         context.user_data["group"] = group
-        context.user_data["time_index"] = idx
+        context.user_data["time_id"] = time_id
 
     else:  # بسکتبال، والیبال، اشتراکی
         try:
-            idx = int(data[1])
+            time_id = int(data[1])
         except:
             await query.edit_message_text("❌ خطا در انتخاب تایم")
             return
 
-        # ✅ ساخت all_times مثل show_times_page
-        all_times = [t for t in RAM_TIMES[sport] if not is_time_expired(t)]
+        # ✅ پیدا کردن تایم با id پایدارش
+        found = find_active_slot(sport, time_id, today)
 
-        if idx < len(all_times):
-            time_info = all_times[idx]  # ✅ استفاده از all_times بجای RAM_TIMES
-            time_date = time_info.get("date_obj")
+        if found:
+            time_info = found[1]
+            time_date = time_info.date_obj
             
             # بررسی تاریخ (فقط روز برگزاری)
-            if time_date and time_date > today:
-                j_date = jdatetime.date.fromgregorian(date=time_date)
+            if time_date > today:
                 sport_name = {
                     "basketball": "بسکتبال",
                     "volleyball": "والیبال",
@@ -955,14 +1220,13 @@ async def time_select(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 
                 await query.edit_message_text(
                     f"⏰ مهلت ثبت‌نام برای این تایم {sport_name} هنوز شروع نشده!\n"
-                    f"📅 تاریخ تایم: {j_date.strftime('%Y/%m/%d')}\n"
+                    f"📅 تاریخ تایم: {time_info.jdate}\n"
                     f"❌ فقط در روز برگزاری می‌توانید ثبت‌نام کنید"
                 )
                 return
             
             # بررسی قفل تایم
-            if is_time_locked(time_date, time_info.get("start")):
-                j_date = jdatetime.date.fromgregorian(date=time_date)
+            if is_time_locked(time_info, now_ts):
                 sport_name = {
                     "basketball": "بسکتبال",
                     "volleyball": "والیبال",
@@ -971,15 +1235,15 @@ async def time_select(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 
                 await query.edit_message_text(
                     f"🔒 **ثبت‌نام برای این تایم {sport_name} بسته شد**\n\n"
-                    f"📅 تاریخ: {j_date.strftime('%Y/%m/%d')}\n"
-                    f"⏰ ساعت: {time_info['start']}\n\n"
+                    f"📅 تاریخ: {time_info.jdate}\n"
+                    f"⏰ ساعت: {time_info.start}\n\n"
                     f"❌ کمتر از 30 دقیقه به شروع تایم مونده!\n"
                     f"برای ثبت‌نام زودتر اقدام کنید."
                 )
                 return
 
         context.user_data["sport"] = sport
-        context.user_data["time_index"] = idx
+        context.user_data["time_id"] = time_id
         
         sport_name = {
             "basketball": "بسکتبال",
@@ -1023,7 +1287,8 @@ async def add_basketball(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
 
         RAM_PLAYERS["basketball"][phone] = full_name
-        db.save_basketball_player(phone, full_name)  
+        index_player("basketball", "", phone)
+        await db.save_player("basketball", "", phone, full_name)  
         
         print(f"✅ بازیکن بسکتبال اضافه شد: {phone} -> {full_name}")
         await update.message.reply_text(
@@ -1070,7 +1335,8 @@ async def add_volleyball(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
 
         RAM_PLAYERS["volleyball"][phone] = full_name
-        db.save_volleyball_player(phone, full_name)  
+        index_player("volleyball", "", phone)
+        await db.save_player("volleyball", "", phone, full_name)  
         
         print(f"✅ بازیکن والیبال اضافه شد: {phone} -> {full_name}")
         await update.message.reply_text(
@@ -1119,24 +1385,19 @@ async def add_basketball_time(update: Update, context: ContextTypes.DEFAULT_TYPE
             await update.message.reply_text("❌ این تاریخ گذشته است!")
             return
 
-        time_data = {
-            "date": date_obj.isoformat(),
-            "date_obj": date_obj,
-            "start": start,
-            "end": end,
-            "cap": int(cap)
-        }
+        time_data = Slot(None, date_obj, start, end, int(cap))
         
+        # ✅ اول ذخیره در دیتابیس تا تایم از همون اول id پایدار داشته باشه
+        time_data.id = await db.save_slot("basketball", "", time_data)
         RAM_TIMES["basketball"].append(time_data)
-        RAM_TIMES["basketball"].sort(key=lambda x: x["date_obj"])
-        time_id = db.save_basketball_time(time_data)  # ✅ ذخیره و گرفتن id
-        RAM_TIMES["basketball"][-1]["id"] = time_id  # ✅ این خط جدید
+        add_active_slot("basketball", "", time_data)
+        schedule_expiry("basketball", "", time_data)
+        RAM_TIMES["basketball"].sort(key=lambda x: x.date_obj)
         
         # نمایش تاریخ شمسی
-        j_date = jdatetime.date.fromgregorian(date=date_obj)
         await update.message.reply_text(
             f"✅ تایم بسکتبال اضافه شد:\n"
-            f"📅 {j_date.strftime('%Y/%m/%d')}\n"
+            f"📅 {time_data.jdate}\n"
             f"⏰ {start} تا {end}\n"
             f"👥 ظرفیت: {cap} نفر"
         )
@@ -1174,23 +1435,18 @@ async def add_volleyball_time(update: Update, context: ContextTypes.DEFAULT_TYPE
             await update.message.reply_text("❌ این تاریخ گذشته است!")
             return
 
-        time_data = {
-            "date": date_obj.isoformat(),
-            "date_obj": date_obj,
-            "start": start,
-            "end": end,
-            "cap": int(cap)
-        }
+        time_data = Slot(None, date_obj, start, end, int(cap))
         
+        # ✅ اول ذخیره در دیتابیس تا تایم از همون اول id پایدار داشته باشه
+        time_data.id = await db.save_slot("volleyball", "", time_data)
         RAM_TIMES["volleyball"].append(time_data)
-        RAM_TIMES["volleyball"].sort(key=lambda x: x["date_obj"])
-        time_id = db.save_volleyball_time(time_data)  # ✅ ذخیره و گرفتن id
-        RAM_TIMES["volleyball"][-1]["id"] = time_id  # ✅ این خط جدید 
+        add_active_slot("volleyball", "", time_data)
+        schedule_expiry("volleyball", "", time_data)
+        RAM_TIMES["volleyball"].sort(key=lambda x: x.date_obj)
         
-        j_date = jdatetime.date.fromgregorian(date=date_obj)
         await update.message.reply_text(
             f"✅ تایم والیبال اضافه شد:\n"
-            f"📅 {j_date.strftime('%Y/%m/%d')}\n"
+            f"📅 {time_data.jdate}\n"
             f"⏰ {start} تا {end}\n"
             f"👥 ظرفیت: {cap} نفر"
         )
@@ -1237,16 +1493,17 @@ async def add_group_player(update: Update, context: ContextTypes.DEFAULT_TYPE, g
             return
 
         # اگر در گروه دیگری بود
-        for g in "ABCDEFGHIJ":
-            if g != group and phone in RAM_PLAYERS["futsal"][g]:
-                await update.message.reply_text(
-                    f"❌ این شماره قبلاً در گروه {g} ثبت شده"
-                )
-                return
+        other_group = futsal_group_of(phone)
+        if other_group is not None and other_group != group:
+            await update.message.reply_text(
+                f"❌ این شماره قبلاً در گروه {other_group} ثبت شده"
+            )
+            return
 
         # ذخیره با نام کامل
         RAM_PLAYERS["futsal"][group][phone] = full_name
-        db.save_futsal_player(group, phone, full_name)  
+        index_player("futsal", group, phone)
+        await db.save_player("futsal", group, phone, full_name)  
         
         print(f"✅ بازیکن فوتسال اضافه شد: گروه {group}, {phone} -> {full_name}")
 
@@ -1264,6 +1521,226 @@ async def add_group_player(update: Update, context: ContextTypes.DEFAULT_TYPE, g
         )
 
 
+# ======================================================
+#  import players (CSV / XLSX)
+# ======================================================
+IMPORT_MAX_BYTES = 5 * 1024 * 1024  # حداکثر حجم فایل ورودی
+IMPORT_MAX_REJECTED_SHOWN = 20      # تعداد خطاهایی که در پیام نمایش داده میشه
+IMPORT_BATCH_SIZE = 500             # ردیف‌هایی که با هم بررسی و در یک تراکنش ثبت میشن
+
+IMPORT_SPORT_ALIASES = {
+    "futsal": "futsal", "فوتسال": "futsal",
+    "basketball": "basketball", "بسکتبال": "basketball",
+    "volleyball": "volleyball", "والیبال": "volleyball",
+}
+
+def iter_import_rows(path, file_name):
+    """خواندن ردیف‌های فایل (CSV یا XLSX) از روی دیسک به صورت جریانی - هر ردیف لیستی از متن‌ها"""
+    if file_name.lower().endswith(".xlsx"):
+        if openpyxl is None:
+            raise ValueError("برای فایل xlsx باید پکیج openpyxl نصب باشد؛ فایل را CSV بفرستید")
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            for row in workbook.active.iter_rows(values_only=True):
+                yield ["" if cell is None else str(cell) for cell in row]
+        finally:
+            workbook.close()
+    else:
+        with open(path, encoding="utf-8-sig", newline="") as text:
+            yield from csv.reader(text)
+
+def plan_player_import(rows, seen):
+    """
+    بررسی ردیف‌های (شماره ردیف، [sport, group, name, phone]) در برابر RAM_PLAYERS بدون تغییر چیزی
+    seen: مجموعه (sport, phone) های ردیف‌های قبلی همین فایل، برای پیدا کردن تکراری‌ها بین batch ها
+    خروجی: (added, updated, unchanged, rejected) - rejected لیست (شماره ردیف، دلیل)
+    """
+    added, updated, unchanged, rejected = [], [], 0, []
+    
+    for line, row in rows:
+        cells = [c.strip() for c in row]
+        if not any(cells):
+            continue
+        if line == 1 and cells[0].lower() in ("sport", "رشته"):
+            continue  # سطر عنوان
+        if len(cells) < 4:
+            rejected.append((line, "ستون‌ها کامل نیست (رشته، گروه، نام، شماره)"))
+            continue
+        
+        sport = IMPORT_SPORT_ALIASES.get(cells[0].lower())
+        group = cells[1].upper()
+        name = cells[2]
+        phone = normalize_phone(cells[3])
+        
+        if sport is None:
+            rejected.append((line, f"رشته نامعتبر: {cells[0]}"))
+            continue
+        if sport in GROUPED_SPORTS and group not in GROUPED_SPORTS[sport]:
+            rejected.append((line, f"گروه نامعتبر: {cells[1]}"))
+            continue
+        if sport not in GROUPED_SPORTS:
+            group = ""
+        if not name:
+            rejected.append((line, "نام خالی است"))
+            continue
+        if len(phone) != 11 or not phone.startswith("09"):
+            rejected.append((line, f"شماره نامعتبر: {cells[3]}"))
+            continue
+        
+        key = (sport, phone)
+        if key in seen:
+            rejected.append((line, f"شماره {phone} در همین فایل تکرار شده"))
+            continue
+        
+        if sport == "futsal":
+            # هر شماره فقط در یک گروه فوتسال
+            other = futsal_group_of(phone)
+            if other is not None and other != group:
+                rejected.append((line, f"شماره {phone} قبلاً در گروه {other} ثبت شده"))
+                continue
+        players = ram_bucket(RAM_PLAYERS, sport, group)
+        seen.add(key)
+        
+        current = players.get(phone)
+        if current is None:
+            added.append((sport, group, phone, name))
+        elif current != name:
+            updated.append((sport, group, phone, name))
+        else:
+            unchanged += 1
+    
+    return added, updated, unchanged, rejected
+
+async def import_player_file(path, file_name):
+    """
+    ورود بازیکنان از فایل روی دیسک، IMPORT_BATCH_SIZE ردیف در هر مرحله:
+    هر batch بررسی، در RAM اعمال و در یک تراکنش (executemany) ثبت میشه
+    تا کل فایل هیچ‌وقت همزمان در حافظه نباشه.
+    خروجی: دیکشنری شمارش‌ها، IMPORT_MAX_REJECTED_SHOWN ردیف رد شده‌ی اول و خطای احتمالی
+    (با خطا، batch های قبلی ثبت شده میمونن و batch جاری کامل برگردونده میشه)
+    """
+    result = {"added": 0, "updated": 0, "unchanged": 0, "rejected": [], "rejected_count": 0, "error": None}
+    seen = set()
+    rows = iter_import_rows(path, file_name)
+    numbered = enumerate(rows, 1)
+    
+    try:
+        while True:
+            try:
+                batch = list(itertools.islice(numbered, IMPORT_BATCH_SIZE))
+            except Exception as e:
+                result["error"] = f"خطا در خواندن فایل: {e}"
+                break
+            if not batch:
+                break
+            
+            added, updated, unchanged, rejected = plan_player_import(batch, seen)
+            changes = added + updated
+            if changes:
+                # RAM بلافاصله بعد از بررسی (بدون await بین این دو) به‌روز میشه تا هندلرهای همزمان
+                # (مثلاً /addBplayer) بین بررسی و اعمال چیزی عوض نکنن؛ اگه ثبت در دیتابیس خطا داد برگردونده میشه
+                previous = []
+                for sport, group, phone, name in changes:
+                    players = ram_bucket(RAM_PLAYERS, sport, group)
+                    previous.append((players, phone, players.get(phone)))
+                    players[phone] = name
+                    index_player(sport, group, phone)
+                
+                try:
+                    await db.save_players(changes)  # این batch در یک تراکنش
+                except Exception as e:
+                    for (players, phone, old_name), (sport, group, _, _) in zip(previous, changes):
+                        if old_name is None:
+                            del players[phone]
+                            unindex_player(sport, phone)
+                        else:
+                            players[phone] = old_name
+                    print(f"❌ خطا در ثبت بازیکنان: {e}")
+                    result["error"] = f"خطا در ذخیره بازیکنان از ردیف {batch[0][0]} به بعد"
+                    break
+            
+            result["added"] += len(added)
+            result["updated"] += len(updated)
+            result["unchanged"] += unchanged
+            result["rejected_count"] += len(rejected)
+            room = IMPORT_MAX_REJECTED_SHOWN - len(result["rejected"])
+            result["rejected"].extend(rejected[:max(room, 0)])
+    finally:
+        rows.close()
+    
+    return result
+
+async def import_players(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """شروع ورود گروهی بازیکنان: ادمین بعد از این دستور فایل CSV یا XLSX میفرسته"""
+    if not is_super(update.effective_user.id):
+        return
+    
+    context.user_data["waiting_for_import"] = True
+    await update.message.reply_text(
+        "📥 فایل بازیکنان را به صورت CSV یا XLSX بفرستید.\n\n"
+        "ستون‌ها به ترتیب: رشته، گروه، نام، شماره\n"
+        "رشته: futsal / basketball / volleyball (یا فارسی)\n"
+        "گروه فقط برای فوتسال (A تا J)، برای بقیه خالی بماند\n\n"
+        "مثال:\n"
+        "futsal,A,علی محمدی,09123456789\n"
+        "basketball,,رضا کریمی,09351234567\n\n"
+        "برای لغو: /cancel"
+    )
+
+async def import_players_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """دریافت فایل و ورود بازیکنان به صورت جریانی (batch به batch)"""
+    if not is_super(update.effective_user.id) or not context.user_data.get("waiting_for_import"):
+        return
+    context.user_data.pop("waiting_for_import", None)
+    
+    document = update.message.document
+    file_name = document.file_name or ""
+    if not file_name.lower().endswith((".csv", ".xlsx")):
+        await update.message.reply_text("❌ فقط فایل CSV یا XLSX قابل قبول است")
+        return
+    if document.file_size and document.file_size > IMPORT_MAX_BYTES:
+        await update.message.reply_text("❌ حجم فایل بیش از حد مجاز است (حداکثر 5 مگابایت)")
+        return
+    
+    # فایل روی دیسک دانلود و ردیف به ردیف خونده میشه، نه کامل در حافظه
+    fd, path = tempfile.mkstemp(suffix=os.path.splitext(file_name)[1].lower())
+    os.close(fd)
+    try:
+        telegram_file = await document.get_file()
+        await telegram_file.download_to_drive(path)
+        result = await import_player_file(path, file_name)
+    except Exception as e:
+        print(f"❌ خطا در دریافت فایل بازیکنان: {e}")
+        await update.message.reply_text(f"❌ خطا در دریافت فایل: {e}")
+        return
+    finally:
+        os.remove(path)
+    
+    print(
+        f"✅ ورود گروهی بازیکنان: {result['added']} جدید، {result['updated']} به‌روز، "
+        f"{result['rejected_count']} رد شده"
+    )
+    
+    text = (
+        f"📥 نتیجه ورود بازیکنان از {file_name}\n\n"
+        f"➕ اضافه شده: {result['added']}\n"
+        f"✏️ به‌روزرسانی نام: {result['updated']}\n"
+        f"➖ بدون تغییر: {result['unchanged']}\n"
+        f"❌ رد شده: {result['rejected_count']}\n"
+    )
+    if result["error"]:
+        text += f"\n⚠️ {result['error']}؛ ورود متوقف شد و فقط ردیف‌های قبل از آن ثبت شدند\n"
+    if result["rejected"]:
+        text += "\nردیف‌های رد شده:\n"
+        for line, reason in result["rejected"]:
+            text += f"• ردیف {line}: {reason}\n"
+        if result["rejected_count"] > len(result["rejected"]):
+            text += f"... و {result['rejected_count'] - len(result['rejected'])} ردیف دیگر\n"
+    
+    # بدون Markdown چون نام فایل و مقادیر ردیف‌ها از ورودی کاربره
+    await update.message.reply_text(text)
+
+
 # ======================================================
 #  add group time
 # ======================================================
@@ -1292,23 +1769,18 @@ async def add_group_time(update: Update, context: ContextTypes.DEFAULT_TYPE, gro
             await update.message.reply_text("❌ این تاریخ گذشته است!")
             return
 
-        time_data = {
-            "date": date_obj.isoformat(),
-            "date_obj": date_obj,
-            "start": start,
-            "end": end,
-            "cap": int(cap)
-        }
+        time_data = Slot(None, date_obj, start, end, int(cap))
         
+        # ✅ اول ذخیره در دیتابیس تا تایم از همون اول id پایدار داشته باشه
+        time_data.id = await db.save_slot("futsal", group, time_data)
         RAM_TIMES["futsal"][group].append(time_data)
-        RAM_TIMES["futsal"][group].sort(key=lambda x: x["date_obj"])
-        time_id = db.save_futsal_time(group, time_data)  # ✅ ذخیره و گرفتن id
-        RAM_TIMES["futsal"][group][-1]["id"] = time_id  # ✅ این خط جدید 
+        add_active_slot("futsal", group, time_data)
+        schedule_expiry("futsal", group, time_data)
+        RAM_TIMES["futsal"][group].sort(key=lambda x: x.date_obj)
         
-        j_date = jdatetime.date.fromgregorian(date=date_obj)
         await update.message.reply_text(
             f"✅ تایم گروه {group} اضافه شد:\n"
-            f"📅 {j_date.strftime('%Y/%m/%d')}\n"
+            f"📅 {time_data.jdate}\n"
             f"⏰ {start} تا {end}\n"
             f"👥 ظرفیت: {cap} نفر"
         )
@@ -1321,73 +1793,65 @@ async def add_group_time(update: Update, context: ContextTypes.DEFAULT_TYPE, gro
 
 
 # ======================================================
-#  cleanup expired times
+#  cleanup expired times (min-heap تاریخ انقضا)
 # ======================================================
-async def cleanup_expired_times():
-    """پاک کردن تایم‌های منقضی شده و ثبت‌نام‌های مربوطه"""
-    today = get_iran_date()  # ← تاریخ امروز به وقت ایران
-    
-    
-    # فوتسال
-    for g in "ABCDEFGHIJ":
-        expired_indices = []
-        for i, t in enumerate(RAM_TIMES["futsal"][g]):
-            if is_time_expired(t):
-                expired_indices.append(i)
-        
-        for i in reversed(expired_indices):
-            time_key = f"time_{i}"
-            time_id = RAM_TIMES["futsal"][g][i].get("id")  # ✅ گرفتن id
-            
-            if time_key in RAM_REGISTRATIONS["futsal"][g]:
-                for phone in list(RAM_REGISTRATIONS["futsal"][g][time_key].keys()):
-                    db.delete_registration("futsal", g, time_key, phone)
-                del RAM_REGISTRATIONS["futsal"][g][time_key]
-            
-            if time_id:  # ✅ پاک کردن تایم از دیتابیس
-                db.delete_futsal_time(time_id)
-            
-            del RAM_TIMES["futsal"][g][i]
-    
-    # بسکتبال
-    expired_indices = []
-    for i, t in enumerate(RAM_TIMES["basketball"]):
-        if is_time_expired(t):
-            expired_indices.append(i)
+# برای هر تایم یک ورودی (date_obj, time_id, sport, group)؛ تایم بعد از تموم شدن روزش منقضیه
+# ورودی تایم‌هایی که ادمین زودتر حذف کرده در heap می‌مونه و موقع pop نادیده گرفته میشه
+EXPIRY_HEAP = []
+
+def rebuild_expiry_heap():
+    """ساخت heap از همه‌ی تایم‌های RAM (بعد از لود)"""
+    EXPIRY_HEAP[:] = [(t.date_obj, t.id, sport, g)
+                      for sport in SPORTS for g, times in ram_groups(RAM_TIMES, sport) for t in times]
+    heapq.heapify(EXPIRY_HEAP)
+
+def schedule_expiry(sport, group, slot):
+    """اضافه کردن تایم جدید به heap"""
+    heapq.heappush(EXPIRY_HEAP, (slot.date_obj, slot.id, sport, group))
+
+def evict_expired_slots(today):
+    """
+    pop تایم‌هایی که روزشون گذشته و حذفشون (و ثبت‌نام‌هاشون) از RAM؛
+    هزینه فقط به تعداد تایم‌های منقضی بستگی داره، نه کل تایم‌ها
+    """
+    expired = {}  # (sport, group) -> {time_id}
+    while EXPIRY_HEAP and EXPIRY_HEAP[0][0] < today:
+        _, time_id, sport, group = heapq.heappop(EXPIRY_HEAP)
+        expired.setdefault((sport, group), set()).add(time_id)
     
-    for i in reversed(expired_indices):
-        time_key = f"time_{i}"
-        time_id = RAM_TIMES["basketball"][i].get("id")  # ✅ گرفتن id
-        
-        if time_key in RAM_REGISTRATIONS["basketball"]:
-            for phone in list(RAM_REGISTRATIONS["basketball"][time_key].keys()):
-                db.delete_registration("basketball", "", time_key, phone)
-            del RAM_REGISTRATIONS["basketball"][time_key]
-        
-        if time_id:  # ✅ پاک کردن تایم از دیتابیس
-            db.delete_basketball_time(time_id)
+    evicted = []  # (sport, group, time_id)
+    for (sport, group), ids in expired.items():
+        times = ram_bucket(RAM_TIMES, sport, group)
+        registrations = ram_bucket(RAM_REGISTRATIONS, sport, group)
         
-        del RAM_TIMES["basketball"][i]
+        # لیست تایم‌ها بر اساس تاریخ مرتبه، پس تایم‌های منقضی اول لیست هستن
+        cut = 0
+        while cut < len(times) and times[cut].id in ids:
+            registrations.pop(times[cut].id, None)
+            evicted.append((sport, group, times[cut].id))
+            cut += 1
+        del times[:cut]
     
-    # والیبال
-    expired_indices = []
-    for i, t in enumerate(RAM_TIMES["volleyball"]):
-        if is_time_expired(t):
-            expired_indices.append(i)
+    trim_active_slots(today)
+    return evicted
+
+
+async def cleanup_expired_times():
+    """پاک کردن تایم‌های منقضی شده و ثبت‌نام‌های مربوطه (RAM و دیتابیس)"""
+    today = get_iran_date()  # ← تاریخ امروز به وقت ایران
+    expired_slots = evict_expired_slots(today)
     
-    for i in reversed(expired_indices):  # ✅ اینجا for رو اضافه کن
-        time_key = f"time_{i}"
-        time_id = RAM_TIMES["volleyball"][i].get("id")  # ✅ گرفتن id
-        
-        if time_key in RAM_REGISTRATIONS["volleyball"]:
-            for phone in list(RAM_REGISTRATIONS["volleyball"][time_key].keys()):
-                db.delete_registration("volleyball", "", time_key, phone)
-            del RAM_REGISTRATIONS["volleyball"][time_key]
-        
-        if time_id:  # ✅ پاک کردن تایم از دیتابیس
-            db.delete_volleyball_time(time_id)
-        
-        del RAM_TIMES["volleyball"][i]
+    # ✅ حذف دسته‌ای از دیتابیس در یک تراکنش: تایم‌های منقضی و ثبت‌نام‌هاشون
+    # (شامل تایم‌های قدیمی‌ای که در RAM نبودن)
+    await db.delete_times_before(today)
+    return expired_slots
+
+
+async def expire_slots_job(context: ContextTypes.DEFAULT_TYPE):
+    """job دوره‌ای: اگه سر heap منقضی شده باشه، تایم‌های منقضی حذف میشن"""
+    if EXPIRY_HEAP and EXPIRY_HEAP[0][0] < get_iran_date():
+        expired_slots = await cleanup_expired_times()
+        print(f"🧹 {len(expired_slots)} تایم منقضی حذف شد")
 
 
 # ======================================================
@@ -1397,36 +1861,38 @@ async def show_players(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_super(update.effective_user.id):
         return
     
-    text = "📋 لیست بازیکنان:\n\n"
+    report = ReportWriter()
+    report.line("📋 لیست بازیکنان:")
+    report.line()
     
     # فوتسال
-    for g in "ABCDEFGHIJ":
+    for g in GROUPED_SPORTS["futsal"]:
         if RAM_PLAYERS["futsal"][g]:
-            text += f"⚽ فوتسال گروه {g}: {len(RAM_PLAYERS['futsal'][g])} نفر\n"
+            report.line(f"⚽ فوتسال گروه {g}: {len(RAM_PLAYERS['futsal'][g])} نفر")
             for phone, name in list(RAM_PLAYERS["futsal"][g].items())[:10]:  # فقط 10 تا
-                text += f"  - {name} : {phone}\n"
+                report.line(f"  - {name} : {phone}")
             if len(RAM_PLAYERS["futsal"][g]) > 10:
-                text += f"  ... و {len(RAM_PLAYERS['futsal'][g]) - 10} نفر دیگر\n"
-            text += "\n"
+                report.line(f"  ... و {len(RAM_PLAYERS['futsal'][g]) - 10} نفر دیگر")
+            report.line()
     
     # بسکتبال
     if RAM_PLAYERS["basketball"]:
-        text += f"🏀 بسکتبال: {len(RAM_PLAYERS['basketball'])} نفر\n"
+        report.line(f"🏀 بسکتبال: {len(RAM_PLAYERS['basketball'])} نفر")
         for phone, name in list(RAM_PLAYERS["basketball"].items())[:10]:
-            text += f"  - {name} : {phone}\n"
+            report.line(f"  - {name} : {phone}")
         if len(RAM_PLAYERS["basketball"]) > 10:
-            text += f"  ... و {len(RAM_PLAYERS['basketball']) - 10} نفر دیگر\n"
-        text += "\n"
+            report.line(f"  ... و {len(RAM_PLAYERS['basketball']) - 10} نفر دیگر")
+        report.line()
     
     # والیبال
     if RAM_PLAYERS["volleyball"]:
-        text += f"🏐 والیبال: {len(RAM_PLAYERS['volleyball'])} نفر\n"
+        report.line(f"🏐 والیبال: {len(RAM_PLAYERS['volleyball'])} نفر")
         for phone, name in list(RAM_PLAYERS["volleyball"].items())[:10]:
-            text += f"  - {name} : {phone}\n"
+            report.line(f"  - {name} : {phone}")
         if len(RAM_PLAYERS["volleyball"]) > 10:
-            text += f"  ... و {len(RAM_PLAYERS['volleyball']) - 10} نفر دیگر\n"
+            report.line(f"  ... و {len(RAM_PLAYERS['volleyball']) - 10} نفر دیگر")
     
-    await update.message.reply_text(text or "هیچ بازیکنی ثبت نشده")
+    await reply_report(update.message, report)
 
 
 # ======================================================
@@ -1461,7 +1927,8 @@ async def remove_group_player(update: Update, context: ContextTypes.DEFAULT_TYPE
         
         # حذف بازیکن
         del RAM_PLAYERS["futsal"][group][phone]
-        db.delete_futsal_player(group, phone)  
+        unindex_player("futsal", phone)
+        await db.delete_player("futsal", group, phone)  
         
         await update.message.reply_text(
             f"✅ بازیکن از گروه {group} حذف شد:\n"
@@ -1509,7 +1976,8 @@ async def remove_basketball(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         # حذف بازیکن
         del RAM_PLAYERS["basketball"][phone]
-        db.delete_basketball_player(phone)  
+        unindex_player("basketball", phone)
+        await db.delete_player("basketball", "", phone)  
         
         
         await update.message.reply_text(
@@ -1558,7 +2026,8 @@ async def remove_volleyball(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         # حذف بازیکن
         del RAM_PLAYERS["volleyball"][phone]
-        db.delete_volleyball_player(phone)  
+        unindex_player("volleyball", phone)
+        await db.delete_player("volleyball", "", phone)  
         
         await update.message.reply_text(
             f"✅ بازیکن والیبال حذف شد:\n"
@@ -1607,24 +2076,22 @@ async def remove_group_time(update: Update, context: ContextTypes.DEFAULT_TYPE,
 
         # ذخیره اطلاعات تایم قبل از حذف
         time_info = RAM_TIMES["futsal"][group][idx]
-        j_date = jdatetime.date.fromgregorian(date=time_info["date_obj"])
         
-        # حذف ثبت‌نام‌های مربوط به این تایم
-        time_key = f"time_{idx}"
-        if time_key in RAM_REGISTRATIONS["futsal"][group]:
-            del RAM_REGISTRATIONS["futsal"][group][time_key]
+        # حذف ثبت‌نام‌های مربوط به این تایم (کلید = id تایم، نیازی به reindex نیست)
+        time_id = time_info.id
+        RAM_REGISTRATIONS["futsal"][group].pop(time_id, None)
         
         # حذف تایم
         del RAM_TIMES["futsal"][group][idx]
-        
-        # به‌روزرسانی کلیدهای ثبت‌نام‌ها (بعد از حذف، ایندکس‌ها تغییر می‌کنند)
-        await reindex_futsal_times(group)
+        remove_active_slot("futsal", time_id)
+        await db.delete_registrations_for_slots([("futsal", group, time_id)])
+        await db.delete_slot(time_id)
         
         await update.message.reply_text(
             f"✅ تایم از گروه {group} حذف شد:\n"
-            f"📅 {j_date.strftime('%Y/%m/%d')}\n"
-            f"⏰ {time_info['start']} - {time_info['end']}\n"
-            f"👥 ظرفیت: {time_info['cap']} نفر"
+            f"📅 {time_info.jdate}\n"
+            f"⏰ {time_info.start} - {time_info.end}\n"
+            f"👥 ظرفیت: {time_info.cap} نفر"
         )
 
     except Exception as e:
@@ -1635,23 +2102,6 @@ async def remove_group_time(update: Update, context: ContextTypes.DEFAULT_TYPE,
         )
 
 
-# ======================================================
-#  reindex futsal times
-# ======================================================
-async def reindex_futsal_times(group: str):
-    """به‌روزرسانی ایندکس ثبت‌نام‌ها بعد از حذف تایم"""
-    new_registrations = {}
-    for i, time in enumerate(RAM_TIMES["futsal"][group]):
-        old_key = f"time_{i}"  # کلید جدید
-        # اگه ثبت‌نامی برای این تایم جدید وجود داشت
-        for old_key_existing in list(RAM_REGISTRATIONS["futsal"][group].keys()):
-            if old_key_existing == f"time_{i}" or old_key_existing == i:
-                new_registrations[old_key] = RAM_REGISTRATIONS["futsal"][group][old_key_existing]
-                break
-    
-    RAM_REGISTRATIONS["futsal"][group] = new_registrations
-
-
 # ======================================================
 #  remove basketball time
 # ======================================================
@@ -1685,24 +2135,22 @@ async def remove_basketball_time(update: Update, context: ContextTypes.DEFAULT_T
 
         # ذخیره اطلاعات تایم قبل از حذف
         time_info = RAM_TIMES["basketball"][idx]
-        j_date = jdatetime.date.fromgregorian(date=time_info["date_obj"])
         
         # حذف ثبت‌نام‌های مربوط به این تایم
-        time_key = f"time_{idx}"
-        if time_key in RAM_REGISTRATIONS["basketball"]:
-            del RAM_REGISTRATIONS["basketball"][time_key]
+        time_id = time_info.id
+        RAM_REGISTRATIONS["basketball"].pop(time_id, None)
         
         # حذف تایم
         del RAM_TIMES["basketball"][idx]
-        
-        # به‌روزرسانی کلیدهای ثبت‌نام‌ها
-        await reindex_sport_times("basketball")
+        remove_active_slot("basketball", time_id)
+        await db.delete_registrations_for_slots([("basketball", "", time_id)])
+        await db.delete_slot(time_id)
         
         await update.message.reply_text(
             f"✅ تایم بسکتبال حذف شد:\n"
-            f"📅 {j_date.strftime('%Y/%m/%d')}\n"
-            f"⏰ {time_info['start']} - {time_info['end']}\n"
-            f"👥 ظرفیت: {time_info['cap']} نفر"
+            f"📅 {time_info.jdate}\n"
+            f"⏰ {time_info.start} - {time_info.end}\n"
+            f"👥 ظرفیت: {time_info.cap} نفر"
         )
 
     except Exception as e:
@@ -1746,24 +2194,22 @@ async def remove_volleyball_time(update: Update, context: ContextTypes.DEFAULT_T
 
         # ذخیره اطلاعات تایم قبل از حذف
         time_info = RAM_TIMES["volleyball"][idx]
-        j_date = jdatetime.date.fromgregorian(date=time_info["date_obj"])
         
         # حذف ثبت‌نام‌های مربوط به این تایم
-        time_key = f"time_{idx}"
-        if time_key in RAM_REGISTRATIONS["volleyball"]:
-            del RAM_REGISTRATIONS["volleyball"][time_key]
+        time_id = time_info.id
+        RAM_REGISTRATIONS["volleyball"].pop(time_id, None)
         
         # حذف تایم
         del RAM_TIMES["volleyball"][idx]
-        
-        # به‌روزرسانی کلیدهای ثبت‌نام‌ها
-        await reindex_sport_times("volleyball")
+        remove_active_slot("volleyball", time_id)
+        await db.delete_registrations_for_slots([("volleyball", "", time_id)])
+        await db.delete_slot(time_id)
         
         await update.message.reply_text(
             f"✅ تایم والیبال حذف شد:\n"
-            f"📅 {j_date.strftime('%Y/%m/%d')}\n"
-            f"⏰ {time_info['start']} - {time_info['end']}\n"
-            f"👥 ظرفیت: {time_info['cap']} نفر"
+            f"📅 {time_info.jdate}\n"
+            f"⏰ {time_info.start} - {time_info.end}\n"
+            f"👥 ظرفیت: {time_info.cap} نفر"
         )
 
     except Exception as e:
@@ -1803,23 +2249,18 @@ async def add_shared_time(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("❌ این تاریخ گذشته است!")
             return
 
-        time_data = {
-            "date": date_obj.isoformat(),
-            "date_obj": date_obj,
-            "start": start,
-            "end": end,
-            "cap": int(cap)
-        }
+        time_data = Slot(None, date_obj, start, end, int(cap))
         
+        # ✅ اول ذخیره در دیتابیس تا تایم از همون اول id پایدار داشته باشه
+        time_data.id = await db.save_slot("shared", "", time_data)
         RAM_TIMES["shared"].append(time_data)
-        RAM_TIMES["shared"].sort(key=lambda x: x["date_obj"])
-        time_id = db.save_shared_time(time_data)  # ✅ ذخیره و گرفتن id
-        RAM_TIMES["shared"][-1]["id"] = time_id  # ✅ این خط جدید 
+        add_active_slot("shared", "", time_data)
+        schedule_expiry("shared", "", time_data)
+        RAM_TIMES["shared"].sort(key=lambda x: x.date_obj)
         
-        j_date = jdatetime.date.fromgregorian(date=date_obj)
         await update.message.reply_text(
             f"✅ تایم اشتراکی اضافه شد:\n"
-            f"📅 {j_date.strftime('%Y/%m/%d')}\n"
+            f"📅 {time_data.jdate}\n"
             f"⏰ {start} تا {end}\n"
             f"👥 ظرفیت: {cap} نفر\n"
             f"🤝 همه رشته‌ها می‌توانند ثبت‌نام کنند"
@@ -1858,21 +2299,20 @@ async def remove_shared_time(update: Update, context: ContextTypes.DEFAULT_TYPE)
             return
 
         time_info = RAM_TIMES["shared"][idx]
-        j_date = jdatetime.date.fromgregorian(date=time_info["date_obj"])
         
-        time_key = f"time_{idx}"
-        if time_key in RAM_REGISTRATIONS["shared"]:
-            del RAM_REGISTRATIONS["shared"][time_key]
+        time_id = time_info.id
+        RAM_REGISTRATIONS["shared"].pop(time_id, None)
         
         del RAM_TIMES["shared"][idx]
-        
-        await reindex_sport_times("shared")
+        remove_active_slot("shared", time_id)
+        await db.delete_registrations_for_slots([("shared", "", time_id)])
+        await db.delete_slot(time_id)
         
         await update.message.reply_text(
             f"✅ تایم اشتراکی حذف شد:\n"
-            f"📅 {j_date.strftime('%Y/%m/%d')}\n"
-            f"⏰ {time_info['start']} - {time_info['end']}\n"
-            f"👥 ظرفیت: {time_info['cap']} نفر"
+            f"📅 {time_info.jdate}\n"
+            f"⏰ {time_info.start} - {time_info.end}\n"
+            f"👥 ظرفیت: {time_info.cap} نفر"
         )
 
     except Exception as e:
@@ -1884,62 +2324,153 @@ async def remove_shared_time(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 
 
-async def reindex_sport_times(sport: str):
-    """به‌روزرسانی ایندکس ثبت‌نام‌ها بعد از حذف تایم در بسکتبال/والیبال"""
-    new_registrations = {}
-    for i, time in enumerate(RAM_TIMES[sport]):
-        new_key = f"time_{i}"
-        # اگه ثبت‌نامی برای این تایم جدید وجود داشت
-        for old_key in list(RAM_REGISTRATIONS[sport].keys()):
-            if old_key == f"time_{i}" or old_key == i:
-                new_registrations[new_key] = RAM_REGISTRATIONS[sport][old_key]
-                break
-    
-    RAM_REGISTRATIONS[sport] = new_registrations
-
-
-
 async def show_times(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """نمایش تمام تایم‌ها به همراه ایندکس برای حذف"""
     if not is_super(update.effective_user.id):
         return
 
-    text = "📋 لیست تایم‌ها:\n\n"
+    report = ReportWriter()
+    report.line("📋 لیست تایم‌ها:")
+    report.line()
 
     # فوتسال
-    for g in "ABCDEFGHIJ":
+    for g in GROUPED_SPORTS["futsal"]:
         if RAM_TIMES["futsal"][g]:
-            text += f"⚽ فوتسال گروه {g}:\n"
+            report.line(f"⚽ فوتسال گروه {g}:")
             for idx, t in enumerate(RAM_TIMES["futsal"][g]):
-                j_date = jdatetime.date.fromgregorian(date=t["date_obj"])
-                text += f"  [{idx}] {j_date.strftime('%Y/%m/%d')} {t['start']}-{t['end']} (ظرفیت: {t['cap']})\n"
-            text += "\n"
+                report.line(f"  [{idx}] {t.jdate} {t.start}-{t.end} (ظرفیت: {t.cap})")
+            report.line()
 
     # بسکتبال
     if RAM_TIMES["basketball"]:
-        text += f"🏀 بسکتبال:\n"
+        report.line(f"🏀 بسکتبال:")
         for idx, t in enumerate(RAM_TIMES["basketball"]):
-            j_date = jdatetime.date.fromgregorian(date=t["date_obj"])
-            text += f"  [{idx}] {j_date.strftime('%Y/%m/%d')} {t['start']}-{t['end']} (ظرفیت: {t['cap']})\n"
-        text += "\n"
+            report.line(f"  [{idx}] {t.jdate} {t.start}-{t.end} (ظرفیت: {t.cap})")
+        report.line()
 
     # والیبال
     if RAM_TIMES["volleyball"]:
-        text += f"🏐 والیبال:\n"
+        report.line(f"🏐 والیبال:")
         for idx, t in enumerate(RAM_TIMES["volleyball"]):
-            j_date = jdatetime.date.fromgregorian(date=t["date_obj"])
-            text += f"  [{idx}] {j_date.strftime('%Y/%m/%d')} {t['start']}-{t['end']} (ظرفیت: {t['cap']})\n"
-        text += "\n"
+            report.line(f"  [{idx}] {t.jdate} {t.start}-{t.end} (ظرفیت: {t.cap})")
+        report.line()
 
     #share
     if RAM_TIMES["shared"]:
-        text += f"🤝 اشتراکی:\n"
+        report.line(f"🤝 اشتراکی:")
         for idx, t in enumerate(RAM_TIMES["shared"]):
-            j_date = jdatetime.date.fromgregorian(date=t["date_obj"])
-            text += f"  [{idx}] {j_date.strftime('%Y/%m/%d')} {t['start']}-{t['end']} (ظرفیت: {t['cap']})\n"
+            report.line(f"  [{idx}] {t.jdate} {t.start}-{t.end} (ظرفیت: {t.cap})")
     
 
-    await update.message.reply_text(text or "هیچ تایمی وجود ندارد")
+    await reply_report(update.message, report)
+
+
+
+# ======================================================
+# RENDER CACHE (متن و کیبورد آماده‌ی لیست ثبت‌نام‌ها)
+# ======================================================
+# نسخه‌ها جدا نگه داشته میشن تا هر تغییر فقط متن‌های وابسته به خودش رو باطل کنه:
+# - لیست تایم‌های رشته: فقط با اضافه/حذف/انقضای تایم
+# - لیست ثبت‌نام‌های یک تایم: با ثبت‌نام در همون تایم
+# - همه‌ی لیست‌های ثبت‌نام یک رشته: با تغییر بازیکنان (اموجی لیست اشتراکی)
+# نمایش دوباره با همون نسخه فقط یک lookup دیکشنریه
+RENDER_VERSIONS = {sport: 0 for sport in SPORTS}  # لیست تایم‌ها
+ROSTER_GENERATIONS = {sport: 0 for sport in SPORTS}
+ROSTER_VERSIONS = {}  # (sport, time_id) -> نسخه‌ی لیست ثبت‌نام‌های اون تایم
+RENDER_CACHE = {}  # (sport, time_id) یا (sport, None) برای لیست تایم‌ها -> (نسخه, روز, (متن, کیبورد))
+
+SPORT_TITLES = {
+    "futsal": "⚽ فوتسال",
+    "basketball": "🏀 بسکتبال",
+    "volleyball": "🏐 والیبال",
+    "shared": "🤝 اشتراکی"
+}
+
+def bump_render_version(sport):
+    """باطل کردن لیست تایم‌های یک رشته (همراه هر اضافه/حذف/انقضای تایم)"""
+    RENDER_VERSIONS[sport] += 1
+
+def bump_roster_version(sport, time_id):
+    """باطل کردن لیست ثبت‌نام‌های یک تایم (همراه هر ثبت‌نام در اون تایم)"""
+    key = (sport, time_id)
+    ROSTER_VERSIONS[key] = ROSTER_VERSIONS.get(key, 0) + 1
+
+def bump_all_rosters(sport):
+    """باطل کردن لیست ثبت‌نام‌های همه‌ی تایم‌های یک رشته"""
+    ROSTER_GENERATIONS[sport] += 1
+
+def render_version(key):
+    """نسخه‌ی فعلی متن آماده‌ی key"""
+    sport, time_id = key
+    if time_id is None:
+        return RENDER_VERSIONS[sport]
+    return ROSTER_GENERATIONS[sport], ROSTER_VERSIONS.get(key, 0)
+
+def cached_render(key, today, render):
+    """متن و کیبورد از کش اگه نسخه‌ی key (و روز) عوض نشده؛ وگرنه render() و ذخیره (None ذخیره نمیشه)"""
+    version = render_version(key)
+    entry = RENDER_CACHE.get(key)
+    if entry is not None and entry[0] == version and entry[1] == today:
+        return entry[2]
+    rendered = render()
+    if rendered is not None:
+        RENDER_CACHE[key] = (version, today, rendered)
+    return rendered
+
+def forget_rendered(sport, time_id):
+    """حذف متن آماده و نسخه‌ی تایمی که حذف یا منقضی شده"""
+    RENDER_CACHE.pop((sport, time_id), None)
+    ROSTER_VERSIONS.pop((sport, time_id), None)
+
+def render_sport_times(sport, today):
+    """متن و کیبورد تایم‌های فعال یک رشته در مرور ثبت‌نام‌ها"""
+    keyboard = []
+    for g, times in ram_groups(RAM_TIMES, sport):
+        for t in times:
+            if is_time_expired(t, today):
+                continue
+            if sport in GROUPED_SPORTS:
+                label = f"گروه {g} - {t.jdate} {t.start}-{t.end}"
+                callback = f"view_{sport}:{g}:{t.id}"
+            else:
+                label = f"{t.jdate} {t.start}-{t.end}"
+                if sport == "shared":
+                    label += f" (ظرفیت: {t.cap})"
+                callback = f"view_{sport}:{t.id}"
+            keyboard.append([InlineKeyboardButton(label, callback_data=callback)])
+    
+    keyboard.append([InlineKeyboardButton("🔙 بازگشت به رشته‌ها", callback_data="back_to_sports")])
+    return f"{SPORT_TITLES[sport]}\n⏰ تایم‌های موجود:", InlineKeyboardMarkup(keyboard)
+
+def render_time_registrations(sport, group, time_id):
+    """متن و کیبورد لیست ثبت‌نام‌کنندگان یک تایم؛ اگه تایم وجود نداشته باشه None"""
+    times = ram_bucket(RAM_TIMES, sport, group)
+    time_info = find_time(times, time_id)
+    if time_info is None:
+        return None
+    
+    by_time = ram_bucket(RAM_REGISTRATIONS, sport, group)
+    registrations = by_time.get(time_id, {})
+    
+    lines = [f"{SPORT_TITLES[sport]} گروه {group}" if sport in GROUPED_SPORTS else SPORT_TITLES[sport],
+             f"📅 {time_info.jdate}",
+             f"⏰ {time_info.start} - {time_info.end}",
+             f"👥 ظرفیت: {time_info.cap}",
+             f"📊 ثبت‌نام‌ها: {len(registrations)}/{time_info.cap}",
+             "─" * 30,
+             ""]
+    if registrations:
+        for i, (phone, name) in enumerate(registrations.items(), 1):
+            if sport == "shared":
+                # اموجی رشته اصلی بازیکن
+                lines.append(f"{i}. {player_sport_emoji(phone)} {name}")
+            else:
+                lines.append(f"{i}. {name}")  # ✅ فقط اسم
+    else:
+        lines.append("❌ هیچ ثبت‌نامی وجود ندارد")
+    
+    keyboard = [[InlineKeyboardButton("🔙 بازگشت به تایم‌ها", callback_data=f"view_{sport}")]]
+    return "\n".join(lines) + "\n", InlineKeyboardMarkup(keyboard)
 
 
 
@@ -1975,106 +2506,14 @@ async def view_sport_times(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     data = query.data
-    today = date.today()
+    _, today = clock_snapshot()
     print(f"📞 view_sport_times دریافت: {data}")  # برای دیباگ
 
     
-    if data == "view_futsal":
-        sport = "futsal"
-        sport_name = "⚽ فوتسال"
-        keyboard = []
-        
-        for g in "ABCDEFGHIJ":
-            for idx, t in enumerate(RAM_TIMES["futsal"][g]):
-                if not is_time_expired(t):
-                    j_date = jdatetime.date.fromgregorian(date=t["date_obj"])
-                    label = f"گروه {g} - {j_date.strftime('%Y/%m/%d')} {t['start']}-{t['end']}"
-                    keyboard.append([
-                        InlineKeyboardButton(label, callback_data=f"view_futsal:{g}:{idx}")
-                    ])
-        
-        keyboard.append([InlineKeyboardButton("🔙 بازگشت به رشته‌ها", callback_data="back_to_sports")])
-        
-        if not keyboard:
-            await query.edit_message_text("❌ تایمی برای فوتسال وجود ندارد")
-            return
-            
-        await query.edit_message_text(
-            f"{sport_name}\n⏰ تایم‌های موجود:",
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
-    
-    elif data == "view_basketball":
-        sport = "basketball"
-        sport_name = "🏀 بسکتبال"
-        keyboard = []
-        
-        for idx, t in enumerate(RAM_TIMES["basketball"]):
-            if not is_time_expired(t):
-                j_date = jdatetime.date.fromgregorian(date=t["date_obj"])
-                label = f"{j_date.strftime('%Y/%m/%d')} {t['start']}-{t['end']}"
-                keyboard.append([
-                    InlineKeyboardButton(label, callback_data=f"view_basketball:{idx}")
-                ])
-        
-        keyboard.append([InlineKeyboardButton("🔙 بازگشت به رشته‌ها", callback_data="back_to_sports")])
-        
-        if not keyboard:
-            await query.edit_message_text("❌ تایمی برای بسکتبال وجود ندارد")
-            return
-            
-        await query.edit_message_text(
-            f"{sport_name}\n⏰ تایم‌های موجود:",
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
-    
-    elif data == "view_volleyball":
-        sport = "volleyball"
-        sport_name = "🏐 والیبال"
-        keyboard = []
-        
-        for idx, t in enumerate(RAM_TIMES["volleyball"]):
-            if not is_time_expired(t):
-                j_date = jdatetime.date.fromgregorian(date=t["date_obj"])
-                label = f"{j_date.strftime('%Y/%m/%d')} {t['start']}-{t['end']}"
-                keyboard.append([
-                    InlineKeyboardButton(label, callback_data=f"view_volleyball:{idx}")
-                ])
-        
-        keyboard.append([InlineKeyboardButton("🔙 بازگشت به رشته‌ها", callback_data="back_to_sports")])
-        
-        if not keyboard:
-            await query.edit_message_text("❌ تایمی برای والیبال وجود ندارد")
-            return
-            
-        await query.edit_message_text(
-            f"{sport_name}\n⏰ تایم‌های موجود:",
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
-    
-    elif data == "view_shared":
-        sport = "shared"
-        sport_name = "🤝 اشتراکی"
-        keyboard = []
-        
-        for idx, t in enumerate(RAM_TIMES["shared"]):
-            if not is_time_expired(t):
-                j_date = jdatetime.date.fromgregorian(date=t["date_obj"])
-                label = f"{j_date.strftime('%Y/%m/%d')} {t['start']}-{t['end']} (ظرفیت: {t['cap']})"
-                keyboard.append([
-                    InlineKeyboardButton(label, callback_data=f"view_shared:{idx}")
-                ])
-        
-        keyboard.append([InlineKeyboardButton("🔙 بازگشت به رشته‌ها", callback_data="back_to_sports")])
-        
-        if not keyboard:
-            await query.edit_message_text("❌ تایمی برای اشتراکی وجود ندارد")
-            return
-            
-        await query.edit_message_text(
-            f"{sport_name}\n⏰ تایم‌های موجود:",
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
+    if data in ("view_futsal", "view_basketball", "view_volleyball", "view_shared"):
+        sport = data[len("view_"):]
+        text, reply_markup = cached_render((sport, None), today, lambda: render_sport_times(sport, today))
+        await query.edit_message_text(text, reply_markup=reply_markup)
     
     elif data == "back_to_sports":  # ✅ این بخش رو اضافه کنید
         keyboard = [
@@ -2104,119 +2543,21 @@ async def view_time_registrations(update: Update, context: ContextTypes.DEFAULT_
     data = query.data
     parts = data.split(":")
     
-    if parts[0] == "view_futsal":
+    sport = parts[0][len("view_"):]
+    if sport in GROUPED_SPORTS:
         group = parts[1]
-        idx = int(parts[2])
-        
-        time_info = RAM_TIMES["futsal"][group][idx]
-        j_date = jdatetime.date.fromgregorian(date=time_info["date_obj"])
-        
-        # پیدا کردن ثبت‌نام‌ها
-        time_key = f"time_{idx}"
-        registrations = RAM_REGISTRATIONS["futsal"][group].get(time_key, {})
-        
-        text = f"⚽ فوتسال گروه {group}\n"
-        text += f"📅 {j_date.strftime('%Y/%m/%d')}\n"
-        text += f"⏰ {time_info['start']} - {time_info['end']}\n"
-        text += f"👥 ظرفیت: {time_info['cap']}\n"
-        text += f"📊 ثبت‌نام‌ها: {len(registrations)}/{time_info['cap']}\n"
-        text += "─" * 30 + "\n\n"
-        
-        if registrations:
-            for i, (phone, name) in enumerate(registrations.items(), 1):
-                text += f"{i}. {name}\n"  # ✅ فقط اسم
-        else:
-            text += "❌ هیچ ثبت‌نامی وجود ندارد\n"
-        
-        keyboard = [[InlineKeyboardButton("🔙 بازگشت به تایم‌ها", callback_data="view_futsal")]] 
-        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
-    
-    elif parts[0] == "view_basketball":
-        idx = int(parts[1])
-        
-        time_info = RAM_TIMES["basketball"][idx]
-        j_date = jdatetime.date.fromgregorian(date=time_info["date_obj"])
-        
-        time_key = f"time_{idx}"
-        registrations = RAM_REGISTRATIONS["basketball"].get(time_key, {})
-        
-        text = f"🏀 بسکتبال\n"
-        text += f"📅 {j_date.strftime('%Y/%m/%d')}\n"
-        text += f"⏰ {time_info['start']} - {time_info['end']}\n"
-        text += f"👥 ظرفیت: {time_info['cap']}\n"
-        text += f"📊 ثبت‌نام‌ها: {len(registrations)}/{time_info['cap']}\n"
-        text += "─" * 30 + "\n\n"
-        
-        if registrations:
-            for i, (phone, name) in enumerate(registrations.items(), 1):
-                text += f"{i}. {name}\n"  # ✅ فقط اسم
-        else:
-            text += "❌ هیچ ثبت‌نامی وجود ندارد\n"
-        
-        keyboard = [[InlineKeyboardButton("🔙 بازگشت به تایم‌ها", callback_data="view_basketball")]]
-        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
+        time_id = int(parts[2])
+    else:
+        group = ""
+        time_id = int(parts[1])
     
-    elif parts[0] == "view_volleyball":
-        idx = int(parts[1])
-        
-        time_info = RAM_TIMES["volleyball"][idx]
-        j_date = jdatetime.date.fromgregorian(date=time_info["date_obj"])
-        
-        time_key = f"time_{idx}"
-        registrations = RAM_REGISTRATIONS["volleyball"].get(time_key, {})
-        
-        text = f"🏐 والیبال\n"
-        text += f"📅 {j_date.strftime('%Y/%m/%d')}\n"
-        text += f"⏰ {time_info['start']} - {time_info['end']}\n"
-        text += f"👥 ظرفیت: {time_info['cap']}\n"
-        text += f"📊 ثبت‌نام‌ها: {len(registrations)}/{time_info['cap']}\n"
-        text += "─" * 30 + "\n\n"
-        
-        if registrations:
-            for i, (phone, name) in enumerate(registrations.items(), 1):
-                text += f"{i}. {name}\n"  # ✅ فقط اسم
-        else:
-            text += "❌ هیچ ثبت‌نامی وجود ندارد\n"
-        
-        keyboard = [[InlineKeyboardButton("🔙 بازگشت به تایم‌ها", callback_data="view_volleyball")]]
-        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
+    rendered = cached_render((sport, time_id), None, lambda: render_time_registrations(sport, group, time_id))
+    if rendered is None:
+        await query.edit_message_text("❌ این تایم دیگر وجود ندارد")
+        return
     
-    elif parts[0] == "view_shared":
-        idx = int(parts[1])
-        
-        time_info = RAM_TIMES["shared"][idx]
-        j_date = jdatetime.date.fromgregorian(date=time_info["date_obj"])
-        
-        time_key = f"time_{idx}"
-        registrations = RAM_REGISTRATIONS["shared"].get(time_key, {})
-        
-        text = f"🤝 اشتراکی\n"
-        text += f"📅 {j_date.strftime('%Y/%m/%d')}\n"
-        text += f"⏰ {time_info['start']} - {time_info['end']}\n"
-        text += f"👥 ظرفیت: {time_info['cap']}\n"
-        text += f"📊 ثبت‌نام‌ها: {len(registrations)}/{time_info['cap']}\n"
-        text += "─" * 30 + "\n\n"
-        
-        if registrations:
-            for i, (phone, name) in enumerate(registrations.items(), 1):
-                # پیدا کردن رشته اصلی بازیکن برای نمایش اموجی
-                sport_emoji = "👤"
-                if phone in RAM_PLAYERS.get("basketball", {}):
-                    sport_emoji = "🏀"
-                elif phone in RAM_PLAYERS.get("volleyball", {}):
-                    sport_emoji = "🏐"
-                else:
-                    for g in "ABCDEFGHIJ":
-                        if phone in RAM_PLAYERS.get("futsal", {}).get(g, {}):
-                            sport_emoji = "⚽"
-                            break
-                
-                text += f"{i}. {sport_emoji} {name}\n"  # ✅ فقط اسم با اموجی رشته
-        else:
-            text += "❌ هیچ ثبت‌نامی وجود ندارد\n"
-        
-        keyboard = [[InlineKeyboardButton("🔙 بازگشت به تایم‌ها", callback_data="view_shared")]]
-        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
+    text, reply_markup = rendered
+    await query.edit_message_text(text, reply_markup=reply_markup)
 
 
 
@@ -2225,22 +2566,6 @@ async def view_time_registrations(update: Update, context: ContextTypes.DEFAULT_
 # PAGINATION UTILS
 # ======================================================
 
-def group_times_by_date(times_list):
-    """گروه‌بندی تایم‌ها بر اساس تاریخ"""
-    grouped = {}
-    for t in times_list:
-        date_str = t["date_obj"].isoformat()
-        if date_str not in grouped:
-            grouped[date_str] = []
-        grouped[date_str].append(t)
-    
-    # تبدیل به لیست و مرتب‌سازی بر اساس تاریخ
-    sorted_dates = sorted(grouped.keys())
-    return grouped, sorted_dates
-
-
-
-
 async def page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """هندلر دکمه‌های صفحه‌بندی و بستن"""
     query = update.callback_query
@@ -2612,58 +2937,52 @@ async def list_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ این دستور فقط برای سوپر ادمین‌ها است")
         return
     
+    await ensure_users_loaded()
     if not USERS:
         await update.message.reply_text("📭 هیچ کاربری تاکنون ربات را استارت نزده است")
         return
     
     # آمار کلی
     total_users = len(USERS)
-    text = f"📊 **آمار کل کاربران:** {total_users} نفر\n\n"
-    text += "📋 **لیست کاربران:**\n"
-    text += "─" * 30 + "\n\n"
-    
-    # تبدیل به لیست و مرتب‌سازی بر اساس تاریخ (جدیدترین اول)
-    sorted_users = sorted(USERS.items(), key=lambda x: x[1]["date"], reverse=True)
-    
-    for i, (user_id, user_info) in enumerate(sorted_users, 1):
-        text += f"**{i}.** "
-        
+    report = ReportWriter()
+    report.line(f"📊 **آمار کل کاربران:** {total_users} نفر")
+    report.line()
+    report.line("📋 **لیست کاربران:**")
+    report.line("─" * 30)
+    report.line()
+    
+    # مرتب‌سازی بر اساس تاریخ (جدیدترین اول) - مستقیم روی ستون تاریخ، دیکشنری‌ها موقع نیاز ساخته میشن
+    for i, (user_id, user_info) in enumerate(USERS.items_by_date(reverse=True), 1):
         # نام و نام کاربری
         if user_info.get("full_name"):
-            text += f"👤 {user_info['full_name']}\n"
+            report.line(f"**{i}.** 👤 {user_info['full_name']}")
         else:
             name_parts = []
             if user_info.get("first_name"):
                 name_parts.append(user_info['first_name'])
             if user_info.get("last_name"):
                 name_parts.append(user_info['last_name'])
-            text += f"👤 {' '.join(name_parts)}\n"
+            report.line(f"**{i}.** 👤 {' '.join(name_parts)}")
         
         # یوزرنیم
         if user_info.get("username"):
-            text += f"   📱 @{user_info['username']}\n"
+            report.line(f"   📱 @{user_info['username']}")
         
         # آیدی
-        text += f"   🆔 `{user_id}`\n"
+        report.line(f"   🆔 `{user_id}`")
         
         # تاریخ اولین استارت
         if user_info.get("date"):
-            text += f"   📅 {user_info['date']}\n"
+            report.line(f"   📅 {user_info['date']}")
         
         # زبان
         if user_info.get("language"):
-            text += f"   🌐 {user_info['language']}\n"
-        
-        text += "\n"
+            report.line(f"   🌐 {user_info['language']}")
         
-        # برای جلوگیری از پیام خیلی طولانی، هر 20 کاربر رو جدا می‌فرستیم
-        if i % 20 == 0:
-            await update.message.reply_text(text, parse_mode="Markdown")
-            text = ""
+        report.line()
     
-    # ارسال باقیمانده
-    if text:
-        await update.message.reply_text(text, parse_mode="Markdown")
+    # پیام‌ها روی مرز خط‌ها تا سقف طول پیام تلگرام تقسیم میشن
+    await reply_report(update.message, report, parse_mode="Markdown")
     
     # ارسال فایل متنی برای تعداد زیاد کاربران
     if total_users > 50:
@@ -2673,7 +2992,7 @@ async def list_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f.write(f"Total Users: {total_users}\n")
             f.write("=" * 50 + "\n\n")
             
-            for user_id, user_info in sorted_users:
+            for user_id, user_info in USERS.items_by_date(reverse=True):
                 f.write(f"ID: {user_id}\n")
                 if user_info.get("full_name"):
                     f.write(f"Name: {user_info['full_name']}\n")
@@ -2701,6 +3020,7 @@ async def user_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ این دستور فقط برای سوپر ادمین‌ها است")
         return
     
+    await ensure_users_loaded()
     if not USERS:
         await update.message.reply_text("📭 هیچ کاربری تاکنون ربات را استارت نزده است")
         return
@@ -2708,16 +3028,9 @@ async def user_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # آمار کلی
     total = len(USERS)
     
-    # آمار بر اساس زبان
-    languages = {}
-    for user_info in USERS.values():
-        lang = user_info.get("language", "unknown")
-        languages[lang] = languages.get(lang, 0) + 1
-    
-    # آمار بر اساس تاریخ
-    from collections import Counter
-    dates = [user_info["date"][:10] for user_info in USERS.values()]  # فقط تاریخ
-    daily_stats = Counter(dates)
+    # آمار بر اساس زبان و تاریخ (شمارش مستقیم روی ستون‌های USERS)
+    languages = USERS.language_counts()
+    daily_stats = USERS.day_counts()
     
     text = "📊 **آمار کاربران**\n\n"
     text += f"👥 **کل کاربران:** {total} نفر\n\n"
@@ -2735,6 +3048,173 @@ async def user_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(text, parse_mode="Markdown")
 
 
+async def cache_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """نمایش آمار کش صفحه‌های انتخاب تایم (فقط سوپر ادمین)"""
+    if not is_super(update.effective_user.id):
+        await update.message.reply_text("❌ این دستور فقط برای سوپر ادمین‌ها است")
+        return
+    
+    hits = KEYBOARD_CACHE_STATS["hits"]
+    misses = KEYBOARD_CACHE_STATS["misses"]
+    total = hits + misses
+    hit_rate = (hits / total) * 100 if total else 0
+    
+    text = "🗂️ **آمار کش کیبورد تایم‌ها**\n\n"
+    text += f"✅ hit: {hits}\n"
+    text += f"❌ miss: {misses}\n"
+    text += f"📈 نرخ hit: {hit_rate:.1f}%\n"
+    text += f"♻️ باطل شدن: {KEYBOARD_CACHE_STATS['invalidations']}\n\n"
+    text += "📄 **صفحه‌های آماده:**\n"
+    for sport, pages in KEYBOARD_CACHE.items():
+        text += f"   • {SPORT_TITLES[sport]}: {len(pages)} صفحه\n"
+    text += f"\n📋 متن‌های آماده‌ی لیست ثبت‌نام‌ها: {len(RENDER_CACHE)}"
+    
+    await update.message.reply_text(text, parse_mode="Markdown")
+
+
+
+
+# ======================================================
+# BROADCAST ENGINE (ارسال همگانی با محدودیت نرخ)
+# ======================================================
+class TokenBucket:
+    """
+    سطل توکن سراسری: حداکثر rate درخواست در ثانیه (با انفجار حداکثر capacity)
+    RetryAfter تلگرام کل سطل رو تا پایان مهلت متوقف میکنه، چون محدودیت برای کل رباته
+    """
+    __slots__ = ("rate", "capacity", "tokens", "updated", "paused_until", "_lock")
+    
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = asyncio.get_running_loop().time()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        """صبر تا یک توکن آزاد بشه (درخواست‌ها به ترتیب نوبت میگیرن)"""
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            while True:
+                now = loop.time()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+    
+    def pause(self, seconds):
+        """توقف همه‌ی ارسال‌ها به مدت seconds (بعد از RetryAfter)"""
+        loop = asyncio.get_running_loop()
+        self.paused_until = max(self.paused_until, loop.time() + seconds)
+        self.tokens = 0
+
+def retry_after_seconds(error):
+    """مهلت RetryAfter به ثانیه (بسته به نسخه‌ی کتابخونه int یا timedelta است)"""
+    retry_after = error.retry_after
+    return retry_after.total_seconds() if isinstance(retry_after, timedelta) else float(retry_after)
+
+def request_not_sent(error):
+    """
+    خطای شبکه‌ای که قبل از رسیدن درخواست به تلگرام رخ داده (اتصال برقرار نشد / صف اتصال پر بود)
+    بقیه (مثل TimedOut موقع خوندن جواب) ممکنه پیام رو رسونده باشن و تلاش دوباره پیام تکراری میفرسته
+    """
+    return isinstance(error.__cause__, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+
+def is_dead_chat_error(error):
+    """خطایی که یعنی این چت دیگه وجود نداره (اکانت حذف شده / چت پیدا نمیشه)، نه بلاک"""
+    message = str(error).lower()
+    return any(reason in message for reason in DEAD_CHAT_ERRORS)
+
+async def run_broadcast(bot, user_ids, progress=None, rate=BROADCAST_RATE,
+                        concurrency=BROADCAST_CONCURRENCY, **send_kwargs):
+    """
+    ارسال یک پیام به همه‌ی user_ids با چند ارسال همزمان و یک سطل توکن مشترک
+    - RetryAfter: کل ارسال‌ها متوقف و همون کاربر دوباره امتحان میشه (حداکثر BROADCAST_MAX_FLOOD_WAITS بار)
+    - خطای اتصال قبل از ارسال درخواست: تا BROADCAST_MAX_RETRIES بار با backoff نمایی
+    - بقیه‌ی خطاهای شبکه (از جمله TimedOut): ناموفق، چون شاید پیام رسیده باشه
+    - Forbidden (بلاک/حذف اکانت) و BadRequest: بدون تلاش دوباره
+    progress: تابع async که هر BROADCAST_PROGRESS_INTERVAL ثانیه و یک بار در پایان با آمار صدا زده میشه
+    برمیگردونه: آمار (sent/blocked/deactivated/failed لیست user_id ها، retries تعداد تلاش دوباره)
+    """
+    stats = {"total": len(user_ids), "sent": [], "blocked": [], "deactivated": [], "failed": [], "retries": 0}
+    bucket = TokenBucket(rate)
+    pending = iter(user_ids)
+    
+    async def deliver(user_id):
+        attempt = flood_waits = 0
+        while True:
+            await bucket.acquire()
+            try:
+                await bot.send_message(chat_id=user_id, **send_kwargs)
+                stats["sent"].append(user_id)
+                return
+            except RetryAfter as e:
+                bucket.pause(retry_after_seconds(e))
+                flood_waits += 1
+                if flood_waits > BROADCAST_MAX_FLOOD_WAITS:
+                    stats["failed"].append(user_id)
+                    print(f"❌ ارسال به {user_id} بعد از {BROADCAST_MAX_FLOOD_WAITS} بار RetryAfter متوقف شد")
+                    return
+                stats["retries"] += 1
+            except Forbidden as e:
+                if is_dead_chat_error(e):
+                    stats["deactivated"].append(user_id)
+                    print(f"👻 اکانت کاربر {user_id} حذف شده: {e}")
+                else:
+                    stats["blocked"].append(user_id)
+                    print(f"🚫 کاربر {user_id} ربات را بلاک کرده: {e}")
+                return
+            except BadRequest as e:
+                if is_dead_chat_error(e):
+                    stats["deactivated"].append(user_id)
+                    print(f"👻 چت کاربر {user_id} پیدا نشد: {e}")
+                    return
+                stats["failed"].append(user_id)
+                print(f"❌ خطا در ارسال به {user_id}: {e}")
+                return
+            except NetworkError as e:
+                attempt += 1
+                if not request_not_sent(e) or attempt > BROADCAST_MAX_RETRIES:
+                    stats["failed"].append(user_id)
+                    print(f"❌ خطا در ارسال به {user_id}: {e}")
+                    return
+                stats["retries"] += 1
+                await asyncio.sleep(BROADCAST_BACKOFF * 2 ** (attempt - 1))
+            except Exception as e:
+                stats["failed"].append(user_id)
+                print(f"❌ خطا در ارسال به {user_id}: {e}")
+                return
+    
+    async def worker():
+        for user_id in pending:
+            await deliver(user_id)
+    
+    async def show_progress():
+        try:
+            await progress(stats)
+        except Exception as e:
+            print(f"⚠️ خطا در به‌روزرسانی پیشرفت برادکست: {e}")
+    
+    async def report_progress():
+        while True:
+            await asyncio.sleep(BROADCAST_PROGRESS_INTERVAL)
+            await show_progress()
+    
+    reporter = asyncio.create_task(report_progress()) if progress else None
+    try:
+        await asyncio.gather(*(worker() for _ in range(min(concurrency, len(user_ids)) or 1)))
+    finally:
+        if reporter:
+            reporter.cancel()
+    if progress:
+        await show_progress()
+    return stats
 
 
 # ======================================================
@@ -2779,15 +3259,23 @@ async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # آمار
+    await ensure_users_loaded()
     total_users = len(USERS)
     if total_users == 0:
         await update.message.reply_text("📭 هیچ کاربری برای ارسال پیام وجود ندارد")
         return
     
+    # کاربرانی که ربات رو بلاک کردن یا اکانتشون حذف شده به طور پیش‌فرض رد میشن
+    unreachable = USERS.unreachable_count()
+    
     # ارسال پیام تأیید به ادمین
     confirm_text = (
         f"📊 **آمار ارسال:**\n"
-        f"👥 تعداد کاربران: {total_users} نفر\n"
+        f"👥 تعداد کاربران: {total_users - unreachable} نفر\n"
+    )
+    if unreachable:
+        confirm_text += f"🚫 رد میشن (بلاک کرده / حذف شده): {unreachable} نفر\n"
+    confirm_text += (
         f"📝 متن پیام:\n{message_text}\n\n"
         f"آیا مطمئن هستید؟"
     )
@@ -2798,6 +3286,10 @@ async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
             InlineKeyboardButton("❌ لغو", callback_data="broadcast_cancel")
         ]
     ]
+    if unreachable:
+        keyboard.append([
+            InlineKeyboardButton("🔁 ارسال به همه (حتی بلاک‌کرده‌ها)", callback_data="broadcast_confirm_all")
+        ])
     
     # ذخیره اطلاعات پیام در context.user_data برای استفاده در callback
     context.user_data["broadcast"] = {
@@ -2823,11 +3315,11 @@ async def broadcast_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await query.edit_message_text("❌ عملیات ارسال لغو شد")
         return
     
-    if query.data == "broadcast_confirm":
+    if query.data in ("broadcast_confirm", "broadcast_confirm_all"):
         await query.edit_message_text("🔄 در حال ارسال پیام به کاربران...")
         
-        # دریافت اطلاعات پیام
-        broadcast_info = context.user_data.get("broadcast", {})
+        # دریافت اطلاعات پیام (همین‌جا پاک میشه تا تأیید دوباره دوباره ارسال نکنه)
+        broadcast_info = context.user_data.pop("broadcast", {})
         if not broadcast_info:
             await query.edit_message_text("❌ خطا: اطلاعات پیام یافت نشد")
             return
@@ -2837,60 +3329,89 @@ async def broadcast_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
         button_text = broadcast_info["button_text"]
         button_url = broadcast_info["button_url"]
         
-        # آمار ارسال
-        success = 0
-        failed = 0
-        blocked = 0
-        
         # ساخت کیبورد اگر لازم باشه
         reply_markup = None
         if has_button and button_text and button_url:
             keyboard = [[InlineKeyboardButton(button_text, url=button_url)]]
             reply_markup = InlineKeyboardMarkup(keyboard)
         
-        # ارسال به همه کاربران
-        for user_id in USERS.keys():
-            try:
-                await context.bot.send_message(
-                    chat_id=user_id,
-                    text=message_text,
-                    reply_markup=reply_markup,
-                    parse_mode="Markdown"
-                )
-                success += 1
-                
-                # تأخیر کوچک برای جلوگیری از محدودیت تلگرام
-                if success % 20 == 0:
-                    await asyncio.sleep(1)
-                    
-            except Exception as e:
-                failed += 1
-                error_str = str(e)
-                if "bot was blocked by the user" in error_str:
-                    blocked += 1
-                print(f"❌ خطا در ارسال به {user_id}: {e}")
-        
-        # گزارش نهایی
-        report = (
-            f"✅ **گزارش ارسال برادکست**\n\n"
-            f"📊 **آمار:**\n"
-            f"👥 کل کاربران: {len(USERS)}\n"
-            f"✅ موفق: {success}\n"
-            f"❌ ناموفق: {failed}\n"
-            f"🚫 بلاک کرده: {blocked}\n\n"
+        # کپی user_id ها، تا کاربر جدید وسط ارسال پیمایش رو به هم نزنه
+        # پیش‌فرض: چت‌های مرده (بلاک / حذف شده در برادکست‌های قبلی) رد میشن
+        await ensure_users_loaded()
+        if query.data == "broadcast_confirm_all":
+            user_ids = array("q", USERS.keys())
+        else:
+            user_ids = USERS.reachable_ids()
+        skipped = len(USERS) - len(user_ids)
+        
+        # ارسال چند دقیقه طول میکشه: جدا از صف آپدیت‌های این ادمین اجرا میشه
+        # تا آپدیت‌های بعدی ادمین منتظر تموم شدنش نمونن (خطاها از طریق process_error)
+        context.application.create_task(
+            deliver_broadcast(
+                context.bot,
+                query,
+                user_ids,
+                skipped,
+                text=message_text,
+                reply_markup=reply_markup,
+                parse_mode="Markdown"
+            ),
+            update=update
         )
-        
-        if failed > 0:
-            report += "⚠️ برخی کاربران ربات را بلاک کرده یا خطا دارند."
-        
-        await context.bot.send_message(
-            chat_id=query.from_user.id,
-            text=report,
-            parse_mode="Markdown"
+
+
+async def deliver_broadcast(bot, query, user_ids, skipped, **send_kwargs):
+    """ارسال برادکست، ثبت وضعیت تحویل و فرستادن گزارش نهایی برای ادمین"""
+    
+    # پیشرفت ارسال در همون پیام ادمین
+    async def show_progress(stats):
+        dead = len(stats["blocked"]) + len(stats["deactivated"])
+        done = len(stats["sent"]) + dead + len(stats["failed"])
+        title = "✅ ارسال تمام شد" if done == stats["total"] else "🔄 در حال ارسال پیام به کاربران..."
+        await query.edit_message_text(
+            f"{title}\n"
+            f"📤 {done}/{stats['total']} (✅ {len(stats['sent'])} | 🚫 {dead} | ❌ {len(stats['failed'])})"
         )
-        
-        # پاک کردن اطلاعات موقت
-        context.user_data.pop("broadcast", None)
+    
+    stats = await run_broadcast(bot, user_ids, progress=show_progress, **send_kwargs)
+    
+    # ثبت وضعیت تحویل: دفعه‌ی بعد چت‌های مرده رد میشن، کسی که پیام گرفت دوباره فعال حساب میشه
+    # (اول دیتابیس، تا لود کامل USERS وسط این await وضعیت قدیمی رو برنگردونه)
+    await db.record_delivery(stats["sent"], stats["blocked"], stats["deactivated"], stats["failed"])
+    for user_id in stats["sent"]:
+        USERS.set_delivery_state(user_id)
+    for user_id in stats["blocked"]:
+        USERS.set_delivery_state(user_id, blocked=True)
+    for user_id in stats["deactivated"]:
+        USERS.set_delivery_state(user_id, deactivated=True)
+    
+    success = len(stats["sent"])
+    blocked = len(stats["blocked"])
+    deactivated = len(stats["deactivated"])
+    failed = len(stats["failed"]) + blocked + deactivated
+    
+    # گزارش نهایی
+    report = (
+        f"✅ **گزارش ارسال برادکست**\n\n"
+        f"📊 **آمار:**\n"
+        f"👥 کل کاربران: {stats['total']}\n"
+        f"✅ موفق: {success}\n"
+        f"❌ ناموفق: {failed}\n"
+        f"🚫 بلاک کرده: {blocked}\n"
+        f"👻 اکانت حذف شده: {deactivated}\n"
+    )
+    if skipped:
+        report += f"⏭ رد شده (بلاک / حذف در ارسال‌های قبلی): {skipped}\n"
+    report += "\n"
+    
+    if failed > 0:
+        report += "⚠️ برخی کاربران ربات را بلاک کرده یا خطا دارند."
+    
+    await bot.send_message(
+        chat_id=query.from_user.id,
+        text=report,
+        parse_mode="Markdown"
+    )
 
 
 async def broadcast_help(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -3014,6 +3535,10 @@ async def cancel_contact(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """لغو فرآیند تماس با ادمین"""
     user_id = update.effective_user.id
     
+    if context.user_data.pop("waiting_for_import", None):
+        await update.message.reply_text("❌ ورود گروهی بازیکنان لغو شد.")
+        return
+    
     if user_id in WAITING_FOR_MESSAGE:
         WAITING_FOR_MESSAGE.pop(user_id)
         await update.message.reply_text(
@@ -3077,33 +3602,13 @@ async def reply_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # TIME LOCK UTILS
 # ======================================================
 
-def is_time_locked(time_date, time_start):
+def is_time_locked(slot, now_ts):
     """
     بررسی اینکه تایم قفل شده یا نه
     اگر کمتر از 30 دقیقه به شروع مونده باشه، قفل است
+    (مهلت قفل یک بار موقع ساخت Slot حساب شده؛ now_ts از clock_snapshot همون آپدیت)
     """
-    if not time_date or not time_start:
-        return False
-    
-    # ترکیب تاریخ و زمان شروع
-    time_start_str = f"{time_date.isoformat()} {time_start}"
-    try:
-        # تبدیل به datetime
-        start_datetime = datetime.strptime(time_start_str, "%Y-%m-%d %H:%M")
-        
-        start_datetime = TEHRAN_TZ.localize(start_datetime)
-
-        now = get_iran_datetime()
-        
-        # محاسبه اختلاف زمان
-        time_diff = (start_datetime - now).total_seconds() / 60  # به دقیقه
-        
-        # اگر کمتر از 5 دقیقه مونده باشه، قفل است
-        return time_diff < 30
-        
-    except Exception as e:
-        print(f"❌ خطا در بررسی قفل تایم: {e}")
-        return False
+    return now_ts > slot.lock_deadline
 
 
 
@@ -3207,7 +3712,9 @@ async def show_admin_help(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "  مثال: `/remove_basketball 09123456789`\n\n"
         "🏐 **مدیریت بازیکنان والیبال:**\n\n"
         "• `/add_volleyball` - اضافه کردن بازیکن والیبال\n"
-        "• `/remove_volleyball` - حذف بازیکن والیبال",
+        "• `/remove_volleyball` - حذف بازیکن والیبال\n\n"
+        "📥 **ورود گروهی:**\n\n"
+        "• `/import_players` - ارسال فایل CSV/XLSX (رشته، گروه، نام، شماره)",
         
         # صفحه 4 - مدیریت تایم‌ها
         "👑 **راهنمای ادمین - صفحه 4/6**\n\n"
@@ -3232,6 +3739,7 @@ async def show_admin_help(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "• `/remove_shared_time 0`\n\n"
         "📊 **گزارش‌گیری:**\n\n"
         "• `/today` - ثبت‌نام‌های امروز\n"
+        "• `/cache_stats` - آمار کش کیبورد تایم‌ها\n"
         "• گزارش خودکار شبانه ساعت ۲۳:۵۹",
         
         # صفحه 6 - مدیریت و ارتباطات
@@ -3531,9 +4039,11 @@ async def help_acknowledge_callback(update: Update, context: ContextTypes.DEFAUL
     user_id = query.from_user.id
     
     # ثبت اینکه کاربر راهنما رو دیده
-    if user_id in USERS:
-        USERS[user_id]["help_seen"] = True
-        db.save_user(user_id, USERS[user_id]) 
+    user_data = USERS.get(user_id)
+    if user_data is not None:
+        user_data["help_seen"] = True
+        USERS[user_id] = user_data
+        await db.save_user(user_id, user_data)
     
     # حذف پیام قبلی
     await query.message.delete()
@@ -3590,30 +4100,144 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(help_text, parse_mode="Markdown")
 
 
+# ======================================================
+# RAM SNAPSHOT
+# ======================================================
+def ram_state():
+    """دیتای RAM که در snapshot ذخیره میشه (کاربران موقع boot مستقیم از دیتابیس لود میشن)"""
+    return {
+        "RAM_PLAYERS": RAM_PLAYERS,
+        "RAM_TIMES": RAM_TIMES,
+        "RAM_REGISTRATIONS": RAM_REGISTRATIONS
+    }
+
+async def save_snapshot_job(context: ContextTypes.DEFAULT_TYPE):
+    """ذخیره‌ی دوره‌ای snapshot از RAM
+    
+    ثبت‌نام‌ها اول در RAM اضافه میشن و بعد در صف write-behind میرن؛ پس قبل از نوشتن فایل
+    صف flush میشه تا snapshot هیچ ردیفی نداشته باشه که هنوز در دیتابیس commit نشده.
+    
+    seq دور قبل در snapshot ثبت میشه: تغییری که همین الان در دیتابیسه ممکنه هنوز به RAM
+    نرسیده باشه (هندلر بین await ذخیره و اضافه کردن به RAM)، ولی تغییرات دور قبل حتماً رسیدن.
+    چند تغییر اضافه موقع boot دوباره replay میشن که بی‌خطره.
+    """
+    seq = context.job.data["seq"]
+    payload = encode_snapshot(ram_state())
+    
+    # همه‌ی نوشتن‌های در صف (از جمله اونایی که در payload هستن) قبل از خوندن seq و نوشتن فایل commit میشن
+    await db.flush()
+    context.job.data["seq"] = await db.change_seq()
+    
+    schema_version = await db.schema_version()
+    size = await asyncio.to_thread(write_snapshot, SNAPSHOT_FILE, payload, seq, schema_version)
+    await db.prune_change_log(seq)
+    print(f"💾 snapshot ذخیره شد ({size // 1024} KB، seq={seq})")
+
+def save_snapshot_on_shutdown():
+    """snapshot نهایی بعد از توقف ربات؛ هیچ هندلری در حال اجرا نیست پس seq فعلی دقیقه"""
+    db.sync.flush()
+    seq = db.sync.change_seq()
+    size = write_snapshot(SNAPSHOT_FILE, encode_snapshot(ram_state()), seq, db.sync.schema_version())
+    db.sync.prune_change_log(seq)
+    print(f"💾 snapshot نهایی ذخیره شد ({size // 1024} KB)")
+
+
+# ======================================================
+# UPDATE PROCESSING (پردازش همزمان آپدیت‌ها با حفظ ترتیب هر کاربر)
+# ======================================================
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """
+    آپدیت‌های کاربرهای مختلف همزمان پردازش میشن (حداکثر max_concurrent_updates تا)،
+    ولی آپدیت‌های هر کاربر به ترتیب رسیدن و یکی‌یکی اجرا میشن
+    تا جریان time_select → register روی context.user_data به هم نریزه.
+    
+    ساختارهای مشترک RAM_* فقط در بخش‌های بدون await تغییر می‌کنن (روی event loop اتمیک)
+    و رزرو جا با reserve_seat زیر قفل هر تایم انجام میشه.
+    
+    کار طولانی (مثل برادکست) نباید صف کاربر رو نگه داره؛ با application.create_task جدا اجرا میشه.
+    """
+    __slots__ = ("_pending", "application")
+    
+    def __init__(self, max_concurrent_updates):
+        super().__init__(max_concurrent_updates)
+        self._pending = {}  # user_id -> deque آپدیت‌های این کاربر (اولی در حال اجرا)
+        self.application = None  # بعد از build در main تنظیم میشه (برای process_error)
+    
+    async def do_process_update(self, update, coroutine):
+        user = getattr(update, "effective_user", None)
+        if user is None:
+            # آپدیت بدون کاربر (مثل وضعیت کانال) ترتیب خاصی لازم نداره
+            await coroutine
+            return
+        
+        pending = self._pending.get(user.id)
+        if pending is not None:
+            # این کاربر آپدیت در حال اجرا داره: همون task بعدش اجراش میکنه
+            # و این یکی جای همزمانی رو برای کاربرهای دیگه آزاد میکنه
+            pending.append(coroutine)
+            return
+        
+        pending = self._pending[user.id] = deque([coroutine])
+        try:
+            while pending:
+                try:
+                    await pending[0]
+                except Exception as e:
+                    # خطای هندلرها رو خود process_update به process_error میده؛
+                    # اینجا فقط خطاهای بیرون از هندلر میرسن و نباید بقیه‌ی صف این کاربر رو متوقف کنن
+                    if self.application is not None:
+                        await self.application.process_error(update=update, error=e)
+                    else:
+                        print(f"❌ خطا در پردازش آپدیت کاربر {user.id}: {e}")
+                pending.popleft()
+        finally:
+            for leftover in pending:  # فقط موقع cancel (خاموش شدن) پیش میاد
+                leftover.close()
+            del self._pending[user.id]
+    
+    async def initialize(self):
+        pass
+    
+    async def shutdown(self):
+        pass
+
+
 # ======================================================
 # MAIN
 # ======================================================
 def main():
     global RAM_PLAYERS, RAM_TIMES, RAM_REGISTRATIONS, USERS, db
     
-    # ✅ لود دیتا از دیتابیس
+    # ✅ لود دیتا از snapshot یا دیتابیس (فقط تایم‌های منقضی نشده)
+    # کاربران در استارت لود نمیشن: هر کاربر موقع نیاز، همه با اولین آمار/برادکست (ensure_users_loaded)
     print("🔄 در حال لود دیتا از دیتابیس...")
-    data = db.load_all_to_ram()
-    USERS = data["USERS"]
+    load_started = perf_counter()
+    data, snapshot_seq, source = db.sync.load_ram(SNAPSHOT_FILE, active_from=get_iran_date())
+    USERS = db.sync.user_store()
     RAM_PLAYERS = data["RAM_PLAYERS"]
     RAM_TIMES = data["RAM_TIMES"]
     RAM_REGISTRATIONS = data["RAM_REGISTRATIONS"]
+    rebuild_player_index()
+    rebuild_active_slots()
+    rebuild_expiry_heap()
+    load_seconds = perf_counter() - load_started
     
-    print(f"✅ دیتابیس لود شد:")
-    print(f"   • {len(USERS)} کاربر")
+    print(f"✅ دیتا از {source} لود شد در {load_seconds * 1000:.0f} میلی‌ثانیه (حداکثر حافظه: {peak_rss_mb():.1f} MB):")
     print(f"   • {sum(len(g) for g in RAM_PLAYERS['futsal'].values())} بازیکن فوتسال")
     print(f"   • {len(RAM_PLAYERS['basketball'])} بازیکن بسکتبال")
     print(f"   • {len(RAM_PLAYERS['volleyball'])} بازیکن والیبال")
     
     # ساخت اپلیکیشن
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+    app = (
+        ApplicationBuilder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(PerUserUpdateProcessor(CONCURRENT_UPDATES))
+        .build()
+    )
+    app.update_processor.application = app
 
     # هندلرها
+    app.add_handler(TypeHandler(Update, preload_user), group=-1)
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("today", today_list))
     app.add_handler(CommandHandler("show_players", show_players))
@@ -3621,6 +4245,7 @@ def main():
     app.add_handler(CommandHandler("add_volleyball", add_volleyball))
     app.add_handler(CommandHandler("add_basketball_time", add_basketball_time))
     app.add_handler(CommandHandler("add_volleyball_time", add_volleyball_time))
+    app.add_handler(CommandHandler("import_players", import_players))
     app.add_handler(CommandHandler("remove_basketball", remove_basketball))
     app.add_handler(CommandHandler("remove_volleyball", remove_volleyball))
     app.add_handler(CommandHandler("remove_basketball_time", remove_basketball_time))
@@ -3638,6 +4263,7 @@ def main():
     app.add_handler(CommandHandler("get_my_id", get_my_id))
     app.add_handler(CommandHandler("list_users", list_users))
     app.add_handler(CommandHandler("user_stats", user_stats))
+    app.add_handler(CommandHandler("cache_stats", cache_stats))
     app.add_handler(CommandHandler("broadcast", broadcast))
     app.add_handler(CommandHandler("broadcast_help", broadcast_help))
     app.add_handler(CommandHandler("reply", reply_command))
@@ -3743,6 +4369,9 @@ def main():
     
     app.add_handler(CommandHandler("cancel", cancel_contact))
     
+    # ✅ فایل CSV/XLSX بعد از /import_players
+    app.add_handler(MessageHandler(filters.Document.ALL, import_players_document))
+    
     # ✅ هندلر دکمه‌های راهنما
     app.add_handler(CallbackQueryHandler(help_callback_handler, pattern="^(help_|admin_help_|user_help_|back_to_help_menu)"))
     
@@ -3753,10 +4382,29 @@ def main():
         REPORT_TIME
     )
 
+    # JobQueue برای حذف تایم‌های منقضی (همه‌ی رشته‌ها) به محض گذشتن روزشون
+    app.job_queue.run_repeating(
+        expire_slots_job,
+        interval=EXPIRY_CHECK_INTERVAL,
+        first=EXPIRY_CHECK_INTERVAL
+    )
+
+    # JobQueue برای snapshot دوره‌ای RAM
+    app.job_queue.run_repeating(
+        save_snapshot_job,
+        interval=SNAPSHOT_INTERVAL,
+        first=SNAPSHOT_INTERVAL,
+        data={"seq": snapshot_seq}
+    )
+
     print("Bot Started")
 
     # ❗ این خودش event loop رو مدیریت می‌کنه
     app.run_polling()
+    
+    # snapshot نهایی و بستن ترد نویسنده و اتصال دائمی دیتابیس بعد از توقف ربات
+    save_snapshot_on_shutdown()
+    db.close()
 
 
 if __name__ == "__main__":
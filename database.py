@@ -3,484 +3,982 @@
 # ======================================================
 import sqlite3
 import json
-from datetime import datetime, date
+import os
+import mmap
+import pickle
+import struct
+import zlib
+from datetime import date
 import threading
+import asyncio
+import functools
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from models import Slot, UserStore
+
+# ========== تنظیمات اتصال ==========
+CACHED_STATEMENTS = 128          # تعداد prepared statement های کش شده روی اتصال
+CACHE_SIZE_KB = 16000            # حدود 16 مگابایت page cache
+MMAP_SIZE = 128 * 1024 * 1024    # 128 مگابایت memory-mapped I/O
+
+# ========== تنظیمات صف write-behind ==========
+FLUSH_INTERVAL = 0.2             # حداکثر 200 میلی‌ثانیه تا ثبت روی دیسک (بازه‌ی از دست رفتن داده)
+FLUSH_BATCH_SIZE = 200           # یا به محض جمع شدن 200 عملیات
+
+# متدهایی که با write-behind در صف میرن و بلافاصله برمیگردن
+DEFERRED_METHODS = {"save_user", "save_registration", "delete_registration"}
+
+# رشته‌ها؛ رشته‌ی جدید فقط باید اینجا (و اگه گروه داره در GROUPED_SPORTS) اضافه بشه
+SPORTS = ("futsal", "basketball", "volleyball", "shared")
+GROUPED_SPORTS = {"futsal": "ABCDEFGHIJ"}  # رشته -> نام گروه‌ها
+
+# ========== تنظیمات snapshot ==========
+SNAPSHOT_MAGIC = b"SBOTSNAP"
+SNAPSHOT_FORMAT = 3              # با تغییر ساختار دیتای RAM یکی زیاد بشه
+# magic, نسخه فرمت, نسخه اسکیما, seq آخرین تغییر, طول payload, crc32
+SNAPSHOT_HEADER = struct.Struct("<8sHIqQI")
+
+def ram_bucket(tree, sport, group):
+    """دیکشنری/لیست یک رشته (و گروه، برای رشته‌های گروه‌دار) در ساختار RAM"""
+    return tree[sport][group] if sport in GROUPED_SPORTS else tree[sport]
+
+
+def ram_groups(tree, sport):
+    """(گروه، دیکشنری/لیست) برای همه‌ی گروه‌های یک رشته؛ رشته‌های بدون گروه یک گروه "" دارن"""
+    return tree[sport].items() if sport in GROUPED_SPORTS else (("", tree[sport]),)
+
+def empty_ram_tree(factory):
+    """ساختار خالی RAM برای همه رشته‌ها؛ رشته‌های گروه‌دار یک سطح گروه دارن"""
+    return {
+        sport: ({g: factory() for g in GROUPED_SPORTS[sport]} if sport in GROUPED_SPORTS else factory())
+        for sport in SPORTS
+    }
+
 
 class Database:
-    def __init__(self, db_file="sport_bot.db"):
+    def __init__(self, db_file="sport_bot.db", write_behind=False):
         self.db_file = db_file
         self.lock = threading.Lock()
+        self.conn = self._connect()
         self.init_db()
+        # اتصال جدا برای خوندن؛ در WAL خواننده منتظر نویسنده نمی‌مونه
+        self.read_lock = threading.Lock()
+        self.reader = self._connect()
+        self.reader.row_factory = sqlite3.Row
+        self.queue = WriteBehindQueue(self) if write_behind else None
+    
+    def _connect(self):
+        """ساخت یک اتصال دائمی با WAL و تنظیمات کش"""
+        conn = sqlite3.connect(
+            self.db_file,
+            check_same_thread=False,  # دسترسی از چند ترد با self.lock کنترل میشه
+            cached_statements=CACHED_STATEMENTS
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")  # در WAL فقط موقع checkpoint فلاش میشه
+        conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+    
+    def close(self):
+        """ثبت عملیات‌های در صف و بستن اتصال (موقع خاموش شدن ربات)"""
+        if self.queue:
+            self.queue.close()
+        with self.read_lock:
+            self.reader.close()
+        with self.lock:
+            self.conn.close()
+    
+    def flush(self):
+        """ثبت فوری همه عملیات‌های در صف write-behind"""
+        if self.queue:
+            self.queue.flush()
+    
+    def _execute(self, sql, params=()):
+        """اجرای یک دستور نوشتنی در یک تراکنش روی اتصال دائمی"""
+        # اول عملیات‌های قبلی صف ثبت میشن تا ترتیب نوشتن‌ها بهم نخوره
+        self.flush()
+        with self.lock:
+            with self.conn:
+                return self.conn.execute(sql, params)
+    
+    def _execute_many(self, sql, seq_of_params):
+        """اجرای یک دستور برای چند ردیف در یک تراکنش"""
+        self.flush()
+        with self.lock:
+            with self.conn:
+                return self.conn.executemany(sql, seq_of_params)
+    
+    def _defer(self, sql, params):
+        """نوشتن تاخیری: اگر صف فعال باشه فقط به صف اضافه میشه"""
+        if self.queue:
+            self.queue.put(sql, params)
+        else:
+            self._execute(sql, params)
+    
+    def _execute_batch(self, operations):
+        """اجرای یک دسته عملیات در یک تراکنش (دستورهای پشت‌سرهم یکسان با executemany)"""
+        with self.lock:
+            with self.conn:
+                for sql, group in itertools.groupby(operations, key=lambda op: op[0]):
+                    self.conn.executemany(sql, [params for _, params in group])
     
     def init_db(self):
-        """ایجاد تمام جداول مورد نیاز"""
+        """اجرای مایگریشن‌هایی که هنوز روی این دیتابیس اجرا نشدن (بر اساس PRAGMA user_version)"""
         with self.lock:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                
-                # ========== جدول کاربران ==========
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS users (
-                        user_id INTEGER PRIMARY KEY,
-                        first_name TEXT,
-                        last_name TEXT,
-                        username TEXT,
-                        full_name TEXT,
-                        date TEXT,
-                        language TEXT,
-                        help_seen INTEGER DEFAULT 0
-                    )
-                ''')
-                
-                # ========== جدول بازیکنان فوتسال ==========
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS futsal_players (
-                        phone TEXT,
-                        group_name TEXT,
-                        name TEXT,
-                        PRIMARY KEY (phone, group_name)
-                    )
-                ''')
-                
-                # ========== جدول بازیکنان بسکتبال ==========
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS basketball_players (
-                        phone TEXT PRIMARY KEY,
-                        name TEXT
-                    )
-                ''')
-                
-                # ========== جدول بازیکنان والیبال ==========
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS volleyball_players (
-                        phone TEXT PRIMARY KEY,
-                        name TEXT
-                    )
-                ''')
-                
-                # ========== جدول بازیکنان اشتراکی ==========
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS shared_players (
-                        phone TEXT PRIMARY KEY,
-                        name TEXT
-                    )
-                ''')
-                
-                # ========== جدول تایم‌های فوتسال ==========
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS futsal_times (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        group_name TEXT,
-                        date TEXT,
-                        start TEXT,
-                        end TEXT,
-                        cap INTEGER,
-                        date_obj TEXT
-                    )
-                ''')
-                
-                # ========== جدول تایم‌های بسکتبال ==========
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS basketball_times (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        date TEXT,
-                        start TEXT,
-                        end TEXT,
-                        cap INTEGER,
-                        date_obj TEXT
-                    )
-                ''')
-                
-                # ========== جدول تایم‌های والیبال ==========
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS volleyball_times (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        date TEXT,
-                        start TEXT,
-                        end TEXT,
-                        cap INTEGER,
-                        date_obj TEXT
-                    )
-                ''')
-                
-                # ========== جدول تایم‌های اشتراکی ==========
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS shared_times (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        date TEXT,
-                        start TEXT,
-                        end TEXT,
-                        cap INTEGER,
-                        date_obj TEXT
+            cursor = self.conn.cursor()
+            version = cursor.execute("PRAGMA user_version").fetchone()[0]
+            
+            for number, migration in enumerate(MIGRATIONS, 1):
+                if number <= version:
+                    continue
+                # هر مایگریشن + شماره نسخه‌اش در یک تراکنش (DDL هم در SQLite تراکنشی است)
+                cursor.execute("BEGIN")
+                try:
+                    migration(self, cursor)
+                    cursor.execute(f"PRAGMA user_version={number}")
+                    self.conn.commit()
+                except Exception:
+                    self.conn.rollback()
+                    raise
+                print(f"🔄 مایگریشن {number} ({migration.__name__}) اجرا شد")
+            
+            print("✅ دیتابیس راه‌اندازی شد")
+    
+    # ========== مایگریشن‌ها ==========
+    
+    def _migration_create_tables(self, cursor):
+        """ایجاد تمام جداول مورد نیاز"""
+        # ========== جدول کاربران ==========
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                user_id INTEGER PRIMARY KEY,
+                first_name TEXT,
+                last_name TEXT,
+                username TEXT,
+                full_name TEXT,
+                date TEXT,
+                language TEXT,
+                help_seen INTEGER DEFAULT 0
+            )
+        ''')
+        
+        # ========== جدول بازیکنان فوتسال ==========
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS futsal_players (
+                phone TEXT,
+                group_name TEXT,
+                name TEXT,
+                PRIMARY KEY (phone, group_name)
+            )
+        ''')
+        
+        # ========== جدول بازیکنان بسکتبال ==========
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS basketball_players (
+                phone TEXT PRIMARY KEY,
+                name TEXT
+            )
+        ''')
+        
+        # ========== جدول بازیکنان والیبال ==========
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS volleyball_players (
+                phone TEXT PRIMARY KEY,
+                name TEXT
+            )
+        ''')
+        
+        # ========== جدول بازیکنان اشتراکی ==========
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS shared_players (
+                phone TEXT PRIMARY KEY,
+                name TEXT
+            )
+        ''')
+        
+        # ========== جدول تایم‌های فوتسال ==========
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS futsal_times (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                group_name TEXT,
+                date TEXT,
+                start TEXT,
+                end TEXT,
+                cap INTEGER,
+                date_obj TEXT
+            )
+        ''')
+        
+        # ========== جدول تایم‌های بسکتبال ==========
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS basketball_times (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                date TEXT,
+                start TEXT,
+                end TEXT,
+                cap INTEGER,
+                date_obj TEXT
+            )
+        ''')
+        
+        # ========== جدول تایم‌های والیبال ==========
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS volleyball_times (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                date TEXT,
+                start TEXT,
+                end TEXT,
+                cap INTEGER,
+                date_obj TEXT
+            )
+        ''')
+        
+        # ========== جدول تایم‌های اشتراکی ==========
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS shared_times (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                date TEXT,
+                start TEXT,
+                end TEXT,
+                cap INTEGER,
+                date_obj TEXT
+            )
+        ''')
+        
+        # ========== جدول ثبت‌نام‌ها ==========
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS registrations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sport TEXT,
+                group_name TEXT,
+                time_key TEXT,
+                phone TEXT,
+                name TEXT,
+                UNIQUE(sport, group_name, time_key, phone)
+            )
+        ''')
+    
+    def _migration_create_indexes(self, cursor):
+        """
+        ایندکس‌های جستجو و حذف:
+        - registrations و futsal_players از قبل با UNIQUE/PRIMARY KEY ایندکس
+          (sport, group_name, time_key, phone) و (phone, group_name) دارن که
+          برای جستجو روی پیشوندشون کافیه، پس ایندکس تکراری نمی‌سازیم.
+        - date_obj جدول‌های تایم برای ORDER BY لود و delete_times_before
+        """
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_futsal_times_group_date ON futsal_times (group_name, date_obj)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_futsal_times_date ON futsal_times (date_obj)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_basketball_times_date ON basketball_times (date_obj)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_volleyball_times_date ON volleyball_times (date_obj)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_shared_times_date ON shared_times (date_obj)")
+    
+    def _migration_positional_time_keys(self, cursor):
+        """
+        تبدیل کلیدهای قدیمی time_{idx} (جایگاه تایم در لیست) به id تایم.
+        ترتیب لیست قدیمی همون ترتیب لود بود: ORDER BY date_obj
+        """
+        rows = cursor.execute(
+            "SELECT DISTINCT sport, group_name, time_key FROM registrations WHERE time_key LIKE 'time_%'"
+        ).fetchall()
+        if not rows:
+            return
+        
+        ids_cache = {}
+        migrated = 0
+        for sport, group, time_key in rows:
+            if (sport, group) not in ids_cache:
+                if sport == "futsal":
+                    cursor.execute(
+                        "SELECT id FROM futsal_times WHERE group_name=? ORDER BY date_obj, id", (group,)
                     )
-                ''')
-                
-                # ========== جدول ثبت‌نام‌ها ==========
+                elif sport in ("basketball", "volleyball", "shared"):
+                    cursor.execute(f"SELECT id FROM {sport}_times ORDER BY date_obj, id")
+                else:
+                    continue
+                ids_cache[(sport, group)] = [r[0] for r in cursor.fetchall()]
+            
+            ids = ids_cache[(sport, group)]
+            try:
+                idx = int(time_key.split("_")[1])
+            except ValueError:
+                idx = -1
+            
+            if 0 <= idx < len(ids):
+                cursor.execute(
+                    "UPDATE registrations SET time_key=? WHERE sport=? AND group_name=? AND time_key=?",
+                    (str(ids[idx]), sport, group, time_key)
+                )
+                migrated += 1
+            else:
+                # تایمش دیگه وجود نداره
+                cursor.execute(
+                    "DELETE FROM registrations WHERE sport=? AND group_name=? AND time_key=?",
+                    (sport, group, time_key)
+                )
+        
+        print(f"🔄 {migrated} کلید ثبت‌نام به id تایم تبدیل شد")
+    
+    def _migration_change_log(self, cursor):
+        """جدول change_log و تریگرهایی که هر تغییر بازیکن، تایم و ثبت‌نام رو ثبت میکنن (برای replay بعد از snapshot)"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS change_log (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT,
+                sport TEXT,
+                group_name TEXT,
+                key TEXT,
+                phone TEXT
+            )
+        ''')
+        
+        # (جدول، نوع، ستون‌های sport / group_name / key / phone) - جداول جدا برای هر رشته در این نسخه
+        sources = []
+        for sport in ("futsal", "basketball", "volleyball", "shared"):
+            group_column = "{row}.group_name" if sport == "futsal" else "''"
+            sources.append((f"{sport}_players", "player", f"'{sport}'", group_column, "NULL", "{row}.phone"))
+            sources.append((f"{sport}_times", "time", f"'{sport}'", "''", "{row}.id", "NULL"))
+        sources.append(("registrations", "registration",
+                        "{row}.sport", "{row}.group_name", "{row}.time_key", "{row}.phone"))
+        self._create_change_log_triggers(cursor, sources)
+    
+    def _migration_unified_tables(self, cursor):
+        """یکی کردن جداول *_players و *_times همه رشته‌ها در دو جدول players و slots
+        
+        id تایم‌ها در جدول slots عوض میشه و time_key ثبت‌نام‌ها هم به id جدید تبدیل میشه.
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS players (
+                sport TEXT,
+                group_name TEXT,
+                phone TEXT,
+                name TEXT,
+                PRIMARY KEY (sport, group_name, phone)
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS slots (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sport TEXT,
+                group_name TEXT,
+                date TEXT,
+                start TEXT,
+                end TEXT,
+                cap INTEGER,
+                date_obj TEXT
+            )
+        ''')
+        
+        moved = 0
+        for sport in ("futsal", "basketball", "volleyball", "shared"):
+            group_column = "group_name" if sport == "futsal" else "''"
+            cursor.execute(f'''
+                INSERT OR REPLACE INTO players (sport, group_name, phone, name)
+                SELECT '{sport}', {group_column}, phone, name FROM {sport}_players
+            ''')
+            
+            old_slots = cursor.execute(f'''
+                SELECT id, {group_column}, date, start, end, cap, date_obj FROM {sport}_times ORDER BY id
+            ''').fetchall()
+            for old_id, group, *fields in old_slots:
                 cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS registrations (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        sport TEXT,
-                        group_name TEXT,
-                        time_key TEXT,
-                        phone TEXT,
-                        name TEXT,
-                        UNIQUE(sport, group_name, time_key, phone)
-                    )
+                    INSERT INTO slots (sport, group_name, date, start, end, cap, date_obj)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (sport, group, *fields))
+                new_id = cursor.lastrowid
+                # پیشوند موقت تا کلید جدید با کلید قدیمی یک تایم دیگه قاطی نشه
+                cursor.execute(
+                    "UPDATE registrations SET time_key=? WHERE sport=? AND group_name=? AND time_key=?",
+                    (f"new:{new_id}", sport, group, str(old_id))
+                )
+            moved += len(old_slots)
+            
+            # تریگرها و ایندکس‌های جدول هم با خودش حذف میشن
+            cursor.execute(f"DROP TABLE {sport}_players")
+            cursor.execute(f"DROP TABLE {sport}_times")
+        
+        # ثبت‌نام‌هایی که تایمشون دیگه وجود نداشت
+        cursor.execute("DELETE FROM registrations WHERE time_key NOT LIKE 'new:%'")
+        cursor.execute("UPDATE registrations SET time_key = substr(time_key, 5)")
+        
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_slots_date ON slots(date_obj)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_slots_sport_group_date ON slots(sport, group_name, date_obj)")
+        
+        # کلیدهای change_log قدیمی به id های قبلی اشاره دارن (snapshot هم با نسخه جدید اسکیما نامعتبر میشه)
+        cursor.execute("DELETE FROM change_log")
+        self._create_change_log_triggers(cursor, [
+            ("players", "player", "{row}.sport", "{row}.group_name", "NULL", "{row}.phone"),
+            ("slots", "time", "{row}.sport", "{row}.group_name", "{row}.id", "NULL"),
+        ])
+        print(f"🔄 {moved} تایم به جدول slots منتقل شد")
+    
+    def _migration_delivery_state(self, cursor):
+        """وضعیت تحویل پیام هر کاربر تا برادکست چت‌های بلاک‌کرده یا حذف‌شده رو رد کنه"""
+        self._add_column(cursor, "users", "blocked", "INTEGER DEFAULT 0")
+        self._add_column(cursor, "users", "deactivated", "INTEGER DEFAULT 0")
+        self._add_column(cursor, "users", "last_failure", "TEXT")
+        self._add_column(cursor, "users", "last_success", "TEXT")
+    
+    @staticmethod
+    def _add_column(cursor, table, column, definition):
+        """اضافه کردن ستون فقط اگه وجود نداره - ALTER TABLE ... ADD COLUMN تکراری خطا میده"""
+        existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+        if column not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    
+    @staticmethod
+    def _create_change_log_triggers(cursor, sources):
+        """ساخت تریگرهای INSERT/UPDATE/DELETE که کلید ردیف تغییر کرده رو در change_log مینویسن"""
+        for table, kind, *columns in sources:
+            for event, rows in (("INSERT", ("NEW",)), ("UPDATE", ("OLD", "NEW")), ("DELETE", ("OLD",))):
+                inserts = "".join(
+                    f"INSERT INTO change_log (kind, sport, group_name, key, phone) "
+                    f"VALUES ('{kind}', {', '.join(c.format(row=row) for c in columns)}); "
+                    for row in rows
+                )
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS log_{table}_{event.lower()}
+                    AFTER {event} ON {table}
+                    BEGIN {inserts}END
                 ''')
-                
-                conn.commit()
-                print("✅ دیتابیس راه‌اندازی شد")
     
-    # ========== لود کامل دیتا به RAM ==========
+    # ========== لود دیتا به RAM ==========
     
-    def load_all_to_ram(self):
-        """همه دیتا رو از دیتابیس میخونه و به فرمت RAM برمیگردونه"""
+    def load_all_to_ram(self, active_from=None, load_users=True):
+        """دیتا رو از دیتابیس میخونه و به فرمت RAM برمیگردونه
+        
+        active_from: اگه تاریخ داده بشه فقط تایم‌های از اون روز به بعد و ثبت‌نام‌هاشون لود میشن
+        load_users: اگه False باشه کاربران لود نمیشن (جدا با load_users لود میشن)
+        """
+        self.flush()
         data = {
-            "USERS": {},
-            "RAM_PLAYERS": {
-                "futsal": {g: {} for g in "ABCDEFGHIJ"},
-                "basketball": {},
-                "volleyball": {},
-                "shared": {}
-            },
-            "RAM_TIMES": {
-                "futsal": {g: [] for g in "ABCDEFGHIJ"},
-                "basketball": [],
-                "volleyball": [],
-                "shared": []
-            },
-            "RAM_REGISTRATIONS": {
-                "futsal": {g: {} for g in "ABCDEFGHIJ"},
-                "basketball": {},
-                "volleyball": {},
-                "shared": {}
-            }
+            "USERS": self.load_users() if load_users else UserStore(),
+            "RAM_PLAYERS": empty_ram_tree(dict),
+            "RAM_TIMES": empty_ram_tree(list),
+            "RAM_REGISTRATIONS": empty_ram_tree(dict)
         }
+        # هر رشته‌ای >= رشته خالیه، پس بدون active_from همه تایم‌ها لود میشن
+        window_start = active_from.isoformat() if active_from else ""
         
         with self.lock:
-            with sqlite3.connect(self.db_file) as conn:
-                conn.row_factory = sqlite3.Row
+            with self.conn as conn:
                 cursor = conn.cursor()
+                cursor.row_factory = sqlite3.Row
                 
-                # ===== کاربران =====
-                cursor.execute("SELECT * FROM users")
-                for row in cursor.fetchall():
-                    data["USERS"][row["user_id"]] = {
-                        "first_name": row["first_name"],
-                        "last_name": row["last_name"],
-                        "username": row["username"],
-                        "full_name": row["full_name"],
-                        "date": row["date"],
-                        "language": row["language"],
-                        "help_seen": bool(row["help_seen"])
-                    }
-                
-                # ===== بازیکنان فوتسال =====
-                cursor.execute("SELECT * FROM futsal_players")
-                for row in cursor.fetchall():
-                    data["RAM_PLAYERS"]["futsal"][row["group_name"]][row["phone"]] = row["name"]
-                
-                # ===== بازیکنان بسکتبال =====
-                cursor.execute("SELECT * FROM basketball_players")
-                for row in cursor.fetchall():
-                    data["RAM_PLAYERS"]["basketball"][row["phone"]] = row["name"]
+                # ===== بازیکنان (ردیف به ردیف از cursor، بدون fetchall) =====
+                cursor.execute("SELECT sport, group_name, phone, name FROM players")
+                for row in cursor:
+                    if row["sport"] in SPORTS:
+                        ram_bucket(data["RAM_PLAYERS"], row["sport"], row["group_name"])[row["phone"]] = row["name"]
                 
-                # ===== بازیکنان والیبال =====
-                cursor.execute("SELECT * FROM volleyball_players")
-                for row in cursor.fetchall():
-                    data["RAM_PLAYERS"]["volleyball"][row["phone"]] = row["name"]
+                # ===== تایم‌ها =====
+                cursor.execute("SELECT * FROM slots WHERE date_obj >= ? ORDER BY date_obj", (window_start,))
+                for row in cursor:
+                    if row["sport"] in SPORTS:
+                        ram_bucket(data["RAM_TIMES"], row["sport"], row["group_name"]).append(self._time_from_row(row))
                 
-                # ===== بازیکنان اشتراکی =====
-                cursor.execute("SELECT * FROM shared_players")
-                for row in cursor.fetchall():
-                    data["RAM_PLAYERS"]["shared"][row["phone"]] = row["name"]
-                
-                # ===== تایم‌های فوتسال =====
-                cursor.execute("SELECT * FROM futsal_times ORDER BY date_obj")
-                for row in cursor.fetchall():
-                    time_dict = {
-                        "date": row["date"],
-                        "start": row["start"],
-                        "end": row["end"],
-                        "cap": row["cap"],
-                        "date_obj": datetime.fromisoformat(row["date_obj"]).date()
-                    }
-                    data["RAM_TIMES"]["futsal"][row["group_name"]].append(time_dict)
-                
-                # ===== تایم‌های بسکتبال =====
-                cursor.execute("SELECT * FROM basketball_times ORDER BY date_obj")
-                for row in cursor.fetchall():
-                    time_dict = {
-                        "date": row["date"],
-                        "start": row["start"],
-                        "end": row["end"],
-                        "cap": row["cap"],
-                        "date_obj": datetime.fromisoformat(row["date_obj"]).date()
-                    }
-                    data["RAM_TIMES"]["basketball"].append(time_dict)
-                
-                # ===== تایم‌های والیبال =====
-                cursor.execute("SELECT * FROM volleyball_times ORDER BY date_obj")
-                for row in cursor.fetchall():
-                    time_dict = {
-                        "date": row["date"],
-                        "start": row["start"],
-                        "end": row["end"],
-                        "cap": row["cap"],
-                        "date_obj": datetime.fromisoformat(row["date_obj"]).date()
-                    }
-                    data["RAM_TIMES"]["volleyball"].append(time_dict)
-                
-                # ===== تایم‌های اشتراکی =====
-                cursor.execute("SELECT * FROM shared_times ORDER BY date_obj")
-                for row in cursor.fetchall():
-                    time_dict = {
-                        "date": row["date"],
-                        "start": row["start"],
-                        "end": row["end"],
-                        "cap": row["cap"],
-                        "date_obj": datetime.fromisoformat(row["date_obj"]).date()
-                    }
-                    data["RAM_TIMES"]["shared"].append(time_dict)
-                
-                # ===== ثبت‌نام‌ها =====
-                cursor.execute("SELECT * FROM registrations")
-                for row in cursor.fetchall():
-                    sport = row["sport"]
-                    group = row["group_name"]
-                    time_key = row["time_key"]
-                    phone = row["phone"]
-                    name = row["name"]
-                    
-                    if sport == "futsal":
-                        if time_key not in data["RAM_REGISTRATIONS"]["futsal"][group]:
-                            data["RAM_REGISTRATIONS"]["futsal"][group][time_key] = {}
-                        data["RAM_REGISTRATIONS"]["futsal"][group][time_key][phone] = name
-                    elif sport == "basketball":
-                        if time_key not in data["RAM_REGISTRATIONS"]["basketball"]:
-                            data["RAM_REGISTRATIONS"]["basketball"][time_key] = {}
-                        data["RAM_REGISTRATIONS"]["basketball"][time_key][phone] = name
-                    elif sport == "volleyball":
-                        if time_key not in data["RAM_REGISTRATIONS"]["volleyball"]:
-                            data["RAM_REGISTRATIONS"]["volleyball"][time_key] = {}
-                        data["RAM_REGISTRATIONS"]["volleyball"][time_key][phone] = name
-                    elif sport == "shared":
-                        if time_key not in data["RAM_REGISTRATIONS"]["shared"]:
-                            data["RAM_REGISTRATIONS"]["shared"][time_key] = {}
-                        data["RAM_REGISTRATIONS"]["shared"][time_key][phone] = name
+                # ===== ثبت‌نام‌ها (فقط برای تایم‌های لود شده، از طریق ایندکس یکتای registrations) =====
+                # CROSS JOIN: ترتیب حلقه‌ها ثابت میمونه (اول تایم‌ها بعد ایندکس registrations)
+                cursor.execute('''
+                    SELECT r.sport, r.group_name, r.time_key, r.phone, r.name
+                    FROM slots t
+                    CROSS JOIN registrations r
+                      ON r.sport = t.sport AND r.group_name = t.group_name AND r.time_key = CAST(t.id AS TEXT)
+                    WHERE t.date_obj >= ?
+                ''', (window_start,))
+                for row in cursor:
+                    if row["sport"] not in SPORTS:
+                        continue
+                    slots = ram_bucket(data["RAM_REGISTRATIONS"], row["sport"], row["group_name"])
+                    time_key = int(row["time_key"])  # id تایم
+                    if time_key not in slots:
+                        slots[time_key] = {}
+                    slots[time_key][row["phone"]] = row["name"]
         
         return data
     
+    @staticmethod
+    def _time_from_row(row):
+        """تبدیل یک ردیف جدول slots به Slot داخل RAM"""
+        return Slot(row["id"], date.fromisoformat(row["date_obj"]), row["start"], row["end"], row["cap"])
+    
+    @staticmethod
+    def _user_from_row(row):
+        """تبدیل یک ردیف جدول users به دیکشنری کاربر"""
+        return {
+            "first_name": row["first_name"],
+            "last_name": row["last_name"],
+            "username": row["username"],
+            "full_name": row["full_name"],
+            "date": row["date"],
+            "language": row["language"],
+            "help_seen": bool(row["help_seen"]),
+            "blocked": bool(row["blocked"]),
+            "deactivated": bool(row["deactivated"])
+        }
+    
+    # ========== لود کاربران ==========
+    
+    def get_user(self, user_id):
+        """خواندن یک کاربر از دیتابیس (None اگه وجود نداشته باشه)"""
+        with self.read_lock:
+            row = self.reader.execute("SELECT * FROM users WHERE user_id=?", (user_id,)).fetchone()
+        return self._user_from_row(row) if row else None
+    
+    def user_store(self):
+        """UserStore تنبل برای استارت: هر کاربر با get_user موقع اولین آپدیتش، همه با load_users قبل از اولین پیمایش/آمار"""
+        return UserStore(lazy=True)
+    
+    def load_users(self):
+        """همه‌ی کاربران به صورت UserStore ستونی (به ترتیب user_id از کلید اصلی، بدون مرتب‌سازی)"""
+        # کاربرانی که هنوز در صف write-behind هستن هم دیده بشن
+        self.flush()
+        users = UserStore()
+        with self.read_lock:
+            cursor = self.reader.cursor()
+            cursor.row_factory = sqlite3.Row
+            cursor.execute("SELECT * FROM users ORDER BY user_id")
+            for row in cursor:
+                users.append_sorted(row["user_id"], self._user_from_row(row))
+        return users
+    
+    # ========== snapshot و replay تغییرات ==========
+    
+    def schema_version(self):
+        """شماره نسخه‌ی اسکیما (PRAGMA user_version)"""
+        with self.read_lock:
+            return self.reader.execute("PRAGMA user_version").fetchone()[0]
+    
+    def change_seq(self):
+        """آخرین شماره‌ی change_log"""
+        with self.read_lock:
+            return self.reader.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+    
+    def prune_change_log(self, seq):
+        """حذف تغییراتی که در snapshot ذخیره شده ثبت شدن"""
+        self._execute("DELETE FROM change_log WHERE seq <= ?", (seq,))
+    
+    def load_ram(self, snapshot_file, active_from):
+        """لود از snapshot + replay تغییرات بعد از آن؛ اگه snapshot نباشه یا خراب باشه لود پنجره‌ای
+        
+        برمیگردونه (data, seq, منبع)
+        """
+        self.flush()
+        seq = self.change_seq()
+        snapshot = read_snapshot(snapshot_file, self.schema_version())
+        if snapshot is None:
+            return self.load_all_to_ram(active_from=active_from, load_users=False), seq, "database"
+        
+        data, snapshot_seq = snapshot
+        drop_expired_slots(data, active_from)
+        replayed = self.replay_changes(data, snapshot_seq, active_from)
+        return data, seq, f"snapshot (+{replayed} changes)"
+    
+    def replay_changes(self, data, since_seq, active_from):
+        """اعمال تغییرات change_log بعد از since_seq روی دیتای RAM
+        
+        برای هر کلید تغییر کرده وضعیت فعلی از جدول خونده میشه، پس اعمال دوباره بی‌خطره.
+        """
+        window_start = active_from.isoformat()
+        with self.read_lock:
+            changes = self.reader.execute('''
+                SELECT DISTINCT kind, sport, group_name, key, phone FROM change_log WHERE seq > ?
+            ''', (since_seq,)).fetchall()
+            
+            # اول تایم‌ها (ثبت‌نام فقط برای تایم‌های موجود در RAM اعمال میشه)
+            order = {"time": 0, "player": 1, "registration": 2}
+            for change in sorted(changes, key=lambda c: order[c["kind"]]):
+                if change["sport"] not in SPORTS:
+                    continue
+                if change["kind"] == "time":
+                    self._replay_time(data, change["sport"], int(change["key"]), window_start)
+                elif change["kind"] == "player":
+                    self._replay_player(data, change["sport"], change["group_name"], change["phone"])
+                else:
+                    self._replay_registration(data, change["sport"], change["group_name"],
+                                              int(change["key"]), change["phone"])
+        return len(changes)
+    
+    def _replay_time(self, data, sport, time_id, window_start):
+        times_by_group = data["RAM_TIMES"][sport] if sport in GROUPED_SPORTS else {"": data["RAM_TIMES"][sport]}
+        regs_by_group = (data["RAM_REGISTRATIONS"][sport] if sport in GROUPED_SPORTS
+                         else {"": data["RAM_REGISTRATIONS"][sport]})
+        for times in times_by_group.values():
+            times[:] = [t for t in times if t.id != time_id]
+        
+        row = self.reader.execute("SELECT * FROM slots WHERE id=?", (time_id,)).fetchone()
+        if row is None or row["date_obj"] < window_start:
+            for regs in regs_by_group.values():
+                regs.pop(time_id, None)
+            return
+        
+        times = ram_bucket(data["RAM_TIMES"], sport, row["group_name"])
+        times.append(self._time_from_row(row))
+        times.sort(key=lambda x: x.date_obj)
+    
+    def _replay_player(self, data, sport, group, phone):
+        players = ram_bucket(data["RAM_PLAYERS"], sport, group)
+        row = self.reader.execute(
+            "SELECT name FROM players WHERE sport=? AND group_name=? AND phone=?", (sport, group, phone)).fetchone()
+        
+        if row is None:
+            players.pop(phone, None)
+        else:
+            players[phone] = row["name"]
+    
+    def _replay_registration(self, data, sport, group, time_id, phone):
+        times = ram_bucket(data["RAM_TIMES"], sport, group)
+        if not any(t.id == time_id for t in times):
+            return  # تایم منقضی یا حذف شده
+        
+        regs = ram_bucket(data["RAM_REGISTRATIONS"], sport, group)
+        row = self.reader.execute('''
+            SELECT name FROM registrations WHERE sport=? AND group_name=? AND time_key=? AND phone=?
+        ''', (sport, group, str(time_id), phone)).fetchone()
+        if row is None:
+            if time_id in regs:
+                regs[time_id].pop(phone, None)
+                if not regs[time_id]:
+                    del regs[time_id]
+        else:
+            if time_id not in regs:
+                regs[time_id] = {}
+            regs[time_id][phone] = row["name"]
+    
     # ========== توابع همگام‌سازی کاربران ==========
     
     def save_user(self, user_id, user_data):
         """ذخیره یا به‌روزرسانی کاربر"""
-        with self.lock:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT OR REPLACE INTO users 
-                    (user_id, first_name, last_name, username, full_name, date, language, help_seen)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    user_id,
-                    user_data.get("first_name", ""),
-                    user_data.get("last_name", ""),
-                    user_data.get("username", ""),
-                    user_data.get("full_name", ""),
-                    user_data.get("date", ""),
-                    user_data.get("language", ""),
-                    1 if user_data.get("help_seen") else 0
-                ))
-                conn.commit()
+        # upsert به جای INSERT OR REPLACE تا ستون‌های وضعیت تحویل (record_delivery) پاک نشن
+        self._defer('''
+            INSERT INTO users 
+            (user_id, first_name, last_name, username, full_name, date, language, help_seen)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                first_name=excluded.first_name, last_name=excluded.last_name,
+                username=excluded.username, full_name=excluded.full_name,
+                date=excluded.date, language=excluded.language, help_seen=excluded.help_seen
+        ''', (
+            user_id,
+            user_data.get("first_name", ""),
+            user_data.get("last_name", ""),
+            user_data.get("username", ""),
+            user_data.get("full_name", ""),
+            user_data.get("date", ""),
+            user_data.get("language", ""),
+            1 if user_data.get("help_seen") else 0
+        ))
+    
+    def record_delivery(self, sent=(), blocked=(), deactivated=(), failed=()):
+        """
+        ثبت نتیجه‌ی ارسال پیام به کاربران در یک تراکنش
+        sent: تحویل شد (وضعیت بلاک/حذف پاک میشه) - blocked / deactivated: چت مرده - failed: خطای موقت
+        """
+        now = time.strftime("%Y-%m-%d %H:%M:%S")
+        operations = [(
+            "UPDATE users SET blocked=0, deactivated=0, last_success=? WHERE user_id=?", (now, user_id)
+        ) for user_id in sent]
+        operations += [(
+            "UPDATE users SET blocked=1, last_failure=? WHERE user_id=?", (now, user_id)
+        ) for user_id in blocked]
+        operations += [(
+            "UPDATE users SET deactivated=1, last_failure=? WHERE user_id=?", (now, user_id)
+        ) for user_id in deactivated]
+        operations += [(
+            "UPDATE users SET last_failure=? WHERE user_id=?", (now, user_id)
+        ) for user_id in failed]
+        if operations:
+            # کاربرهای تازه‌ای که هنوز در صف نوشتن هستن اول ذخیره بشن تا UPDATE بهشون برسه
+            self.flush()
+            self._execute_batch(operations)
     
     # ========== توابع همگام‌سازی بازیکنان ==========
     
-    def save_futsal_player(self, group, phone, name):
-        """ذخیره بازیکن فوتسال"""
-        with self.lock:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT OR REPLACE INTO futsal_players (phone, group_name, name)
-                    VALUES (?, ?, ?)
-                ''', (phone, group, name))
-                conn.commit()
+    def save_player(self, sport, group, phone, name):
+        """ذخیره بازیکن (group برای رشته‌های بدون گروه رشته خالیه)"""
+        self._execute('''
+            INSERT OR REPLACE INTO players (sport, group_name, phone, name)
+            VALUES (?, ?, ?, ?)
+        ''', (sport, group, phone, name))
     
-    def delete_futsal_player(self, group, phone):
-        """حذف بازیکن فوتسال"""
-        with self.lock:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                cursor.execute('DELETE FROM futsal_players WHERE phone=? AND group_name=?', 
-                             (phone, group))
-                conn.commit()
+    def delete_player(self, sport, group, phone):
+        """حذف بازیکن"""
+        self._execute('DELETE FROM players WHERE sport=? AND group_name=? AND phone=?',
+                      (sport, group, phone))
     
-    def save_basketball_player(self, phone, name):
-        """ذخیره بازیکن بسکتبال"""
-        with self.lock:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT OR REPLACE INTO basketball_players (phone, name)
-                    VALUES (?, ?)
-                ''', (phone, name))
-                conn.commit()
+    def save_players(self, players):
+        """ذخیره چند بازیکن در یک تراکنش - players: لیست (sport, group, phone, name)"""
+        self._execute_many('''
+            INSERT OR REPLACE INTO players (sport, group_name, phone, name)
+            VALUES (?, ?, ?, ?)
+        ''', players)
     
-    def delete_basketball_player(self, phone):
-        """حذف بازیکن بسکتبال"""
-        with self.lock:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                cursor.execute('DELETE FROM basketball_players WHERE phone=?', (phone,))
-                conn.commit()
+    # ========== توابع همگام‌سازی تایم‌ها ==========
     
-    def save_volleyball_player(self, phone, name):
-        """ذخیره بازیکن والیبال"""
-        with self.lock:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT OR REPLACE INTO volleyball_players (phone, name)
-                    VALUES (?, ?)
-                ''', (phone, name))
-                conn.commit()
+    def save_slot(self, sport, group, time_data):
+        """ذخیره تایم و برگردوندن id آن"""
+        cursor = self._execute('''
+            INSERT INTO slots (sport, group_name, date, start, end, cap, date_obj)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            sport,
+            group,
+            time_data.date,
+            time_data.start,
+            time_data.end,
+            time_data.cap,
+            time_data.date
+        ))
+        return cursor.lastrowid
     
-    def delete_volleyball_player(self, phone):
-        """حذف بازیکن والیبال"""
-        with self.lock:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                cursor.execute('DELETE FROM volleyball_players WHERE phone=?', (phone,))
-                conn.commit()
+    def delete_slot(self, time_id):
+        """حذف تایم با id"""
+        self._execute('DELETE FROM slots WHERE id=?', (time_id,))
     
-    # ========== توابع همگام‌سازی تایم‌ها ==========
+    # ========== توابع همگام‌سازی ثبت‌نام‌ها ==========
     
-    def save_futsal_time(self, group, time_data):
-        """ذخیره تایم فوتسال"""
-        with self.lock:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO futsal_times (group_name, date, start, end, cap, date_obj)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (
-                    group,
-                    time_data["date"],
-                    time_data["start"],
-                    time_data["end"],
-                    time_data["cap"],
-                    time_data["date_obj"].isoformat()
-                ))
-                conn.commit()
-                return cursor.lastrowid
-    
-    def delete_futsal_time(self, time_id):
-        """حذف تایم فوتسال با id"""
-        with self.lock:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                cursor.execute('DELETE FROM futsal_times WHERE id=?', (time_id,))
-                conn.commit()
-        
-    def delete_basketball_time(self, time_id):
-        """حذف تایم بسکتبال با id"""
-        with self.lock:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                cursor.execute('DELETE FROM basketball_times WHERE id=?', (time_id,))
-                conn.commit()
+    def save_registration(self, sport, group, time_id, phone, name):
+        """ذخیره ثبت‌نام (ستون time_key همون id تایم است)"""
+        self._defer('''
+            INSERT OR REPLACE INTO registrations (sport, group_name, time_key, phone, name)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (sport, group, str(time_id), phone, name))
     
-    def delete_volleyball_time(self, time_id):
-        """حذف تایم والیبال با id"""
-        with self.lock:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                cursor.execute('DELETE FROM volleyball_times WHERE id=?', (time_id,))
-                conn.commit()
+    def delete_registration(self, sport, group, time_id, phone):
+        """حذف ثبت‌نام"""
+        self._defer('''
+            DELETE FROM registrations 
+            WHERE sport=? AND group_name=? AND time_key=? AND phone=?
+        ''', (sport, group, str(time_id), phone))
     
-    def delete_shared_time(self, time_id):
-        """حذف تایم اشتراکی با id"""
-        with self.lock:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                cursor.execute('DELETE FROM shared_times WHERE id=?', (time_id,))
-                conn.commit()
+    # ========== حذف دسته‌ای ==========
+    
+    def delete_registrations_for_slots(self, slots):
+        """حذف همه ثبت‌نام‌های چند تایم در یک تراکنش - slots: لیست (sport, group, time_id)"""
+        self._execute_many('''
+            DELETE FROM registrations 
+            WHERE sport=? AND group_name=? AND time_key=?
+        ''', [(sport, group, str(time_id)) for sport, group, time_id in slots])
+    
+    def delete_times_before(self, before_date, sports=SPORTS):
+        """
+        حذف همه تایم‌های قبل از یک تاریخ (برای رشته‌های داده شده) و ثبت‌نام‌هاشون در یک تراکنش
+        تایم‌هایی که فقط در دیتابیس هستن (بیرون پنجره‌ی RAM) هم ثبت‌نام یتیم جا نمیذارن
+        """
+        placeholders = ", ".join("?" for _ in sports)
+        expired = f"date_obj < ? AND sport IN ({placeholders})"
+        params = (before_date.isoformat(), *sports)
+        self.flush()
+        self._execute_batch([
+            (f'''
+                DELETE FROM registrations WHERE (sport, group_name, time_key) IN
+                (SELECT sport, group_name, CAST(id AS TEXT) FROM slots WHERE {expired})
+            ''', params),
+            (f"DELETE FROM slots WHERE {expired}", params),
+        ])
 
-    def save_basketball_time(self, time_data):
-        """ذخیره تایم بسکتبال"""
-        with self.lock:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO basketball_times (date, start, end, cap, date_obj)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (
-                    time_data["date"],
-                    time_data["start"],
-                    time_data["end"],
-                    time_data["cap"],
-                    time_data["date_obj"].isoformat()
-                ))
-                conn.commit()
-                return cursor.lastrowid 
 
-    def save_volleyball_time(self, time_data):
-        """ذخیره تایم والیبال"""
-        with self.lock:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO volleyball_times (date, start, end, cap, date_obj)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (
-                    time_data["date"],
-                    time_data["start"],
-                    time_data["end"],
-                    time_data["cap"],
-                    time_data["date_obj"].isoformat()
-                ))
-                conn.commit()
-                return cursor.lastrowid  # ✅ برگردوندن id
-    
-    def save_shared_time(self, time_data):
-        """ذخیره تایم اشتراکی"""
-        with self.lock:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO shared_times (date, start, end, cap, date_obj)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (
-                    time_data["date"],
-                    time_data["start"],
-                    time_data["end"],
-                    time_data["cap"],
-                    time_data["date_obj"].isoformat()
-                ))
-                conn.commit()
-                return cursor.lastrowid  # ✅ برگردوندن id
+# ترتیب مایگریشن‌ها مهمه: شماره هر کدوم = نسخه دیتابیس بعد از اجراش
+# مایگریشن جدید فقط به انتهای لیست اضافه میشه
+MIGRATIONS = [
+    Database._migration_create_tables,           # 1
+    Database._migration_positional_time_keys,    # 2
+    Database._migration_create_indexes,          # 3
+    Database._migration_change_log,              # 4
+    Database._migration_unified_tables,          # 5
+    Database._migration_delivery_state,          # 6
+]
+
+
+# ======================================================
+# WRITE-BEHIND QUEUE
+# ======================================================
+class WriteBehindQueue:
+    """
+    صف نوشتن تاخیری (group commit):
+    عملیات‌ها در حافظه جمع میشن و هر FLUSH_INTERVAL ثانیه
+    یا هر FLUSH_BATCH_SIZE عملیات، همه با هم در یک تراکنش ثبت میشن.
+    منبع اصلی داده RAM است؛ در بدترین حالت (کرش) فقط عملیات‌های
+    FLUSH_INTERVAL ثانیه‌ی آخر از دست میرن.
+    """
     
-    # ========== توابع همگام‌سازی ثبت‌نام‌ها ==========
+    def __init__(self, database, flush_interval=FLUSH_INTERVAL, batch_size=FLUSH_BATCH_SIZE):
+        self.database = database
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.pending = []
+        self.cond = threading.Condition()
+        self.flush_lock = threading.Lock()  # فقط یک flush در هر لحظه، به ترتیب
+        self.closed = False
+        self.flushes = 0      # تعداد تراکنش‌های ثبت شده (برای آمار)
+        self.operations = 0   # تعداد کل عملیات‌های ثبت شده
+        self.thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+        self.thread.start()
     
-    def save_registration(self, sport, group, time_key, phone, name):
-        """ذخیره ثبت‌نام"""
-        with self.lock:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT OR REPLACE INTO registrations (sport, group_name, time_key, phone, name)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (sport, group, time_key, phone, name))
-                conn.commit()
+    def put(self, sql, params):
+        """افزودن یک عملیات به صف (بدون بلاک شدن روی دیسک)"""
+        with self.cond:
+            if self.closed:
+                raise RuntimeError("صف write-behind بسته شده است")
+            self.pending.append((sql, params))
+            if len(self.pending) == 1 or len(self.pending) >= self.batch_size:
+                self.cond.notify()
     
-    def delete_registration(self, sport, group, time_key, phone):
-        """حذف ثبت‌نام"""
-        with self.lock:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    DELETE FROM registrations 
-                    WHERE sport=? AND group_name=? AND time_key=? AND phone=?
-                ''', (sport, group, time_key, phone))
-                conn.commit()
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.pending and not self.closed:
+                    self.cond.wait()
+                if self.closed:
+                    return  # باقیمانده در close() ثبت میشه
+                
+                # تا پر شدن دسته یا تموم شدن مهلت صبر کن
+                deadline = time.monotonic() + self.flush_interval
+                while len(self.pending) < self.batch_size and not self.closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.cond.wait(remaining)
+            
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ خطا در ثبت صف write-behind: {e}")
+    
+    def flush(self):
+        """ثبت همه عملیات‌های در صف در یک تراکنش"""
+        with self.flush_lock:
+            with self.cond:
+                batch, self.pending = self.pending, []
+            if not batch:
+                return
+            try:
+                self.database._execute_batch(batch)
+            except Exception:
+                # برگردوندن به ابتدای صف تا در flush بعدی دوباره تلاش بشه
+                with self.cond:
+                    self.pending[:0] = batch
+                raise
+            self.flushes += 1
+            self.operations += len(batch)
+    
+    def close(self):
+        """توقف ترد پس‌زمینه و ثبت همه عملیات‌های باقیمانده"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self.thread.join()
+        self.flush()
+
+
+# ======================================================
+# ASYNC DATABASE FACADE
+# ======================================================
+class AsyncDatabase:
+    """
+    نسخه async دیتابیس برای هندلرهای ربات:
+    هر متد Database روی یک ترد نویسنده‌ی اختصاصی اجرا میشه
+    و یک awaitable برمیگردونه، پس event loop هیچوقت منتظر دیسک نمی‌مونه.
+    ترتیب نوشتن‌ها حفظ میشه چون فقط یک ترد نویسنده داریم.
+    """
+    
+    def __init__(self, database):
+        self.sync = database  # برای کارهای قبل از شروع event loop (مثل لود اولیه)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+    
+    def __getattr__(self, name):
+        method = getattr(self.sync, name)
+        if not callable(method):
+            return method
+        
+        if self.sync.queue and name in DEFERRED_METHODS:
+            # فقط به صف write-behind اضافه میشه، نیازی به ترد نویسنده نیست
+            async def call(*args, **kwargs):
+                return method(*args, **kwargs)
+            
+            call.__name__ = name
+            return call
+        
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.executor, functools.partial(method, *args, **kwargs)
+            )
+        
+        call.__name__ = name
+        return call
+    
+    def close(self):
+        """صبر برای تمام شدن نوشتن‌های در صف و بستن اتصال"""
+        self.executor.shutdown(wait=True)
+        self.sync.close()
+
+
+# ======================================================
+# RAM SNAPSHOT
+# ======================================================
+def encode_snapshot(state):
+    """سریال کردن دیتای RAM (باید بدون await وسطش صدا زده بشه تا وضعیت یکدست بمونه)"""
+    return pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def write_snapshot(path, payload, seq, schema_version):
+    """نوشتن snapshot دیتای RAM در یک فایل باینری نسخه‌دار
+    
+    اول در فایل موقت نوشته و بعد جایگزین میشه تا فایل نیمه‌کاره هیچوقت خونده نشه.
+    """
+    header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT, schema_version, seq,
+                                  len(payload), zlib.crc32(payload))
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(header)
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    return len(header) + len(payload)
+
+
+def read_snapshot(path, schema_version):
+    """خوندن snapshot با mmap؛ برمیگردونه (state, seq) یا None اگه نباشه یا معتبر نباشه"""
+    if not os.path.exists(path):
+        return None
+    
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < SNAPSHOT_HEADER.size:
+            print("⚠️ فایل snapshot ناقص است، لود کامل از دیتابیس")
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, fmt, version, seq, length, checksum = SNAPSHOT_HEADER.unpack_from(mm)
+            if magic != SNAPSHOT_MAGIC or fmt != SNAPSHOT_FORMAT or version != schema_version:
+                print("⚠️ نسخه snapshot با ربات/دیتابیس فعلی نمیخونه، لود کامل از دیتابیس")
+                return None
+            
+            payload = memoryview(mm)[SNAPSHOT_HEADER.size:SNAPSHOT_HEADER.size + length]
+            try:
+                if len(payload) != length or zlib.crc32(payload) != checksum:
+                    print("⚠️ checksum فایل snapshot درست نیست، لود کامل از دیتابیس")
+                    return None
+                state = pickle.loads(payload)
+            finally:
+                payload.release()
+    
+    return state, seq
+
+
+def drop_expired_slots(data, active_from):
+    """حذف تایم‌های قبل از active_from (و ثبت‌نام‌هاشون) از دیتای RAM"""
+    for sport in SPORTS:
+        if sport in GROUPED_SPORTS:
+            groups = [(data["RAM_TIMES"][sport][g], data["RAM_REGISTRATIONS"][sport][g])
+                      for g in GROUPED_SPORTS[sport]]
+        else:
+            groups = [(data["RAM_TIMES"][sport], data["RAM_REGISTRATIONS"][sport])]
+        
+        for times, regs in groups:
+            for t in times:
+                if t.date_obj < active_from:
+                    regs.pop(t.id, None)
+            times[:] = [t for t in times if t.date_obj >= active_from]
@@ -0,0 +1,381 @@
+# ======================================================
+# MODELS MODULE (رکوردهای فشرده‌ی RAM)
+# ======================================================
+import sys
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+import jdatetime
+import pytz
+
+TEHRAN_TZ = pytz.timezone('Asia/Tehran')
+LOCK_BEFORE_START = timedelta(minutes=30)   # ثبت‌نام 30 دقیقه قبل از شروع تایم بسته میشه
+NEVER_LOCKS = 2 ** 62                       # مهلت قفل تایم‌هایی که ساعت شروعشون نامعتبره
+
+
+JALALI_FORMAT = '%Y/%m/%d'
+JALALI_SHORT_FORMAT = '%m/%d'
+
+
+@lru_cache(maxsize=4096)
+def jalali(date_obj, fmt=JALALI_FORMAT):
+    """
+    نمایش شمسی یک تاریخ میلادی؛ همه‌ی نمایش‌های تاریخ شمسی از اینجا رد میشن
+    (کش LRU بر اساس تاریخ و فرمت، چون تعداد تاریخ‌های نمایش داده شده خیلی کمه)
+    """
+    return sys.intern(jdatetime.date.fromgregorian(date=date_obj).strftime(fmt))
+
+
+@lru_cache(maxsize=1024)
+def date_labels(date_obj):
+    """(تاریخ میلادی ISO، تاریخ شمسی کامل، تاریخ شمسی کوتاه) - برای همه‌ی تایم‌های یک روز یک بار حساب میشه"""
+    return (sys.intern(date_obj.isoformat()),
+            jalali(date_obj),
+            jalali(date_obj, JALALI_SHORT_FORMAT))
+
+
+@lru_cache(maxsize=1024)
+def day_tzinfo(date_obj):
+    """tzinfo تهران برای یک روز (localize کنده است و برای همه‌ی تایم‌های اون روز یکسانه)"""
+    return TEHRAN_TZ.localize(datetime(date_obj.year, date_obj.month, date_obj.day, 12)).tzinfo
+
+
+class Slot:
+    """
+    یک تایم در RAM_TIMES
+    با __slots__ دیکشنری جدا برای هر تایم ساخته نمیشه؛
+    تاریخ شمسی، زمان شروع (وقت تهران) و مهلت قفل فقط یک بار موقع ساخت/لود حساب میشن؛
+    مهلت قفل (lock_deadline) ثانیه‌ی epoch است تا بررسی قفل فقط مقایسه‌ی دو عدد صحیح باشه
+    """
+    __slots__ = ("id", "date", "date_obj", "start", "end", "cap",
+                 "jdate", "jdate_short", "start_at", "lock_deadline")
+
+    def __init__(self, id, date_obj, start, end, cap):
+        # رشته‌های تکراری (تاریخ، ساعت) بین تایم‌های یک روز/ساعت share میشن
+        self.id = id
+        self.date, self.jdate, self.jdate_short = date_labels(date_obj)
+        self.date_obj = date_obj
+        self.start = sys.intern(start)
+        self.end = sys.intern(end)
+        self.cap = cap
+
+        # ===== زمان شروع و مهلت قفل =====
+        try:
+            hour, minute = start.split(":")
+            self.start_at = datetime(date_obj.year, date_obj.month, date_obj.day, int(hour), int(minute),
+                                     tzinfo=day_tzinfo(date_obj))
+            self.lock_deadline = int((self.start_at - LOCK_BEFORE_START).timestamp())
+        except ValueError:
+            # ساعت نامعتبر: تایم هیچ‌وقت قفل نمیشه (مثل رفتار قبلی is_time_locked)
+            self.start_at = None
+            self.lock_deadline = NEVER_LOCKS
+
+    def __eq__(self, other):
+        if not isinstance(other, Slot):
+            return NotImplemented
+        return (self.id, self.date_obj, self.start, self.end, self.cap) == \
+               (other.id, other.date_obj, other.start, other.end, other.cap)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Slot(id={self.id}, date={self.date}, {self.start}-{self.end}, cap={self.cap})"
+
+
+# ======================================================
+# USER STORE (کاربران به صورت ستونی)
+# ======================================================
+USER_TEXT_FIELDS = ("first_name", "last_name", "username", "full_name")
+USER_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"   # فرمت ستون date جدول users
+NO_DATE = -1                              # تاریخ خالی یا با فرمت ناشناخته (در raw_dates نگه داشته میشه)
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+EPOCH = datetime(1970, 1, 1)
+
+# بیت‌های flags هر کاربر
+FLAG_NONE = (1, 2, 4, 8)   # فیلد متنی i برابر None است
+FLAG_FULL_NAME = 16        # full_name همون first_name + last_name است و جدا ذخیره نشده
+FLAG_HELP_SEEN = 32
+FLAG_BLOCKED = 64          # ربات رو بلاک کرده (آخرین برادکست Forbidden گرفت)
+FLAG_DEACTIVATED = 128     # اکانت حذف شده یا چت پیدا نمیشه
+FLAG_UNREACHABLE = FLAG_BLOCKED | FLAG_DEACTIVATED
+TEXT_SEPARATOR = "\x1f"
+
+
+def encode_user_date(text):
+    """"YYYY-MM-DD HH:MM:SS" -> ثانیه از 1970 (ساعت سرور، بدون منطقه زمانی)؛ فرمت ناشناخته NO_DATE"""
+    if not text or len(text) != 19 or text[4] != "-" or text[10] != " " or text[13] != ":":
+        return NO_DATE
+    try:
+        days = date(int(text[:4]), int(text[5:7]), int(text[8:10])).toordinal() - EPOCH_ORDINAL
+        seconds = int(text[11:13]) * 3600 + int(text[14:16]) * 60 + int(text[17:19])
+    except ValueError:
+        return NO_DATE
+    return days * 86400 + seconds
+
+
+def decode_user_date(ts):
+    return (EPOCH + timedelta(seconds=ts)).isoformat(" ")
+
+
+def derived_full_name(first_name, last_name):
+    """full_name تلگرام: نام + (فاصله + نام خانوادگی اگه باشه)"""
+    if first_name is None:
+        return None
+    return f"{first_name} {last_name}" if last_name else first_name
+
+
+class UserStore:
+    """
+    همه‌ی کاربران به صورت ستونی با رابط شبیه دیکشنری (user_id -> دیکشنری کاربر)
+    
+    به جای یک دیکشنری 7 فیلدی برای هر کاربر:
+    - فیلدهای متنی همه‌ی کاربران در یک bytearray (utf-8) و آفست/طول هر کاربر در array
+    - تاریخ به صورت ثانیه‌ی epoch در array('q')، زبان به صورت اندیس در لیست کدهای زبان
+    - help_seen، وضعیت تحویل (blocked / deactivated) و None بودن فیلدها بیت‌های یک بایت flags
+    - user_id ها مرتب در array و جستجو با bisect
+    get / [] هر بار یک دیکشنری تازه میسازن؛ تغییر اون دیکشنری باید با USERS[user_id] = ... برگرده.
+    
+    حالت تنبل (lazy=True): در استارت هیچ کاربری لود نمیشه. store خودش هیچ‌وقت از دیتابیس
+    نمیخونه: ربات کاربر هر آپدیت رو قبل از هندلرها با get_user روی executor دیتابیس اضافه میکنه
+    و پیمایش/آمار (len، items، برادکست و ...) فقط بعد از لود کامل (load_users + adopt) مجازه.
+    سقفی برای تعداد کاربران لود شده نیست: مقصد نهایی همه‌ی کاربران در RAM (ستونی) است
+    و حالت تنبل فقط لود رو از استارت به اولین استفاده منتقل میکنه.
+    """
+    
+    def __init__(self, lazy=False):
+        self._ids = array("q")          # user_id ها مرتب
+        self._rows = array("l")         # ردیف هر user_id در ستون‌ها (هم‌ترتیب با _ids)
+        self._text = bytearray()
+        self._text_at = array("q")
+        self._text_len = array("l")
+        self._dates = array("q")
+        self._langs = array("H")
+        self._flags = bytearray()
+        self._languages = [None]        # اندیس -> کد زبان
+        self._language_index = {None: 0}
+        self._raw_dates = {}            # ردیف -> تاریخ با فرمت ناشناخته
+        self.complete = not lazy        # همه‌ی کاربران در RAM هستن
+        self._written = None            # user_id های تغییر کرده از شروع لود کامل (track_writes)
+    
+    # ===== نوشتن =====
+    
+    def _encode_text(self, user_data):
+        fields = [user_data.get(field) for field in USER_TEXT_FIELDS]
+        flags = 0
+        for i, value in enumerate(fields):
+            if value is None:
+                flags |= FLAG_NONE[i]
+                fields[i] = ""
+        if user_data.get("full_name") is not None and \
+                user_data.get("full_name") == derived_full_name(user_data.get("first_name"), user_data.get("last_name")):
+            flags |= FLAG_FULL_NAME
+            fields[3] = ""
+        if user_data.get("help_seen"):
+            flags |= FLAG_HELP_SEEN
+        if user_data.get("blocked"):
+            flags |= FLAG_BLOCKED
+        if user_data.get("deactivated"):
+            flags |= FLAG_DEACTIVATED
+        return TEXT_SEPARATOR.join(fields).encode(), flags
+    
+    def _language_id(self, language):
+        index = self._language_index.get(language)
+        if index is None:
+            index = self._language_index[language] = len(self._languages)
+            self._languages.append(sys.intern(language))
+        return index
+    
+    def _write_row(self, row, user_data):
+        """نوشتن فیلدهای یک کاربر در ردیف row (اگه row == تعداد ردیف‌ها، ردیف جدید اضافه میشه)"""
+        encoded, flags = self._encode_text(user_data)
+        date_text = user_data.get("date") or ""
+        ts = encode_user_date(date_text)
+        language = self._language_id(user_data.get("language"))
+        
+        if row == len(self._flags):
+            self._text_at.append(len(self._text))
+            self._text_len.append(len(encoded))
+            self._text += encoded
+            self._dates.append(ts)
+            self._langs.append(language)
+            self._flags.append(flags)
+        else:
+            at, length = self._text_at[row], self._text_len[row]
+            if self._text[at:at + length] != encoded:
+                # متن عوض شده (نادره): رکورد جدید ته bytearray، قبلی بلااستفاده میمونه
+                self._text_at[row] = len(self._text)
+                self._text_len[row] = len(encoded)
+                self._text += encoded
+            self._dates[row] = ts
+            self._langs[row] = language
+            self._flags[row] = flags
+        
+        if ts == NO_DATE and date_text:
+            self._raw_dates[row] = date_text
+        else:
+            self._raw_dates.pop(row, None)
+    
+    def __setitem__(self, user_id, user_data):
+        # ذخیره در دیتابیس با db.save_user انجام میشه، اینجا فقط RAM به‌روز میشه
+        pos = bisect_left(self._ids, user_id)
+        if self._written is not None:
+            self._written.add(user_id)
+        if pos < len(self._ids) and self._ids[pos] == user_id:
+            self._write_row(self._rows[pos], user_data)
+            return
+        row = len(self._flags)
+        self._write_row(row, user_data)
+        self._ids.insert(pos, user_id)
+        self._rows.insert(pos, row)
+    
+    def append_sorted(self, user_id, user_data):
+        """اضافه کردن موقع لود (user_id ها به ترتیب صعودی میان، بدون bisect)"""
+        row = len(self._flags)
+        self._write_row(row, user_data)
+        self._ids.append(user_id)
+        self._rows.append(row)
+    
+    def set_delivery_state(self, user_id, blocked=False, deactivated=False):
+        """به‌روزرسانی فقط بیت‌های وضعیت تحویل (بدون بازنویسی بقیه‌ی فیلدها)؛ False اگه کاربر نباشه"""
+        row = self._row(user_id)
+        if row is None:
+            return False
+        if self._written is not None:
+            self._written.add(user_id)
+        flags = self._flags[row] & ~FLAG_UNREACHABLE
+        if blocked:
+            flags |= FLAG_BLOCKED
+        if deactivated:
+            flags |= FLAG_DEACTIVATED
+        self._flags[row] = flags
+        return True
+    
+    # ===== لود تنبل =====
+    
+    def track_writes(self):
+        """قبل از شروع لود کامل: کاربرانی که از این به بعد در RAM تغییر میکنن ثبت میشن"""
+        self._written = set()
+    
+    def adopt(self, loaded):
+        """
+        جایگزینی با store کامل (خروجی load_users که بعد از track_writes خونده شده)
+        تغییرات RAM در حین لود ممکنه هنوز در صف write-behind باشن؛ روی store جدید نوشته میشن.
+        """
+        for user_id in self._written or ():
+            row = self._row(user_id)
+            if row is not None:
+                loaded[user_id] = self._user(row)
+        self.__dict__.update(vars(loaded))
+    
+    def _require_complete(self):
+        """پیمایش و آمار روی store ناقص نتیجه‌ی غلط میده؛ لود کامل نباید روی event loop انجام بشه"""
+        if not self.complete:
+            raise RuntimeError("UserStore هنوز کامل لود نشده (اول ensure_users_loaded)")
+    
+    # ===== خواندن =====
+    
+    def _row(self, user_id):
+        pos = bisect_left(self._ids, user_id)
+        if pos < len(self._ids) and self._ids[pos] == user_id:
+            return self._rows[pos]
+        return None
+    
+    def _user(self, row):
+        at = self._text_at[row]
+        fields = self._text[at:at + self._text_len[row]].decode().split(TEXT_SEPARATOR)
+        flags = self._flags[row]
+        for i in range(4):
+            if flags & FLAG_NONE[i]:
+                fields[i] = None
+        first_name, last_name, username, full_name = fields
+        if flags & FLAG_FULL_NAME:
+            full_name = derived_full_name(first_name, last_name)
+        ts = self._dates[row]
+        return {
+            "first_name": first_name,
+            "last_name": last_name,
+            "username": username,
+            "full_name": full_name,
+            "date": decode_user_date(ts) if ts != NO_DATE else self._raw_dates.get(row, ""),
+            "language": self._languages[self._langs[row]],
+            "help_seen": bool(flags & FLAG_HELP_SEEN),
+            "blocked": bool(flags & FLAG_BLOCKED),
+            "deactivated": bool(flags & FLAG_DEACTIVATED)
+        }
+    
+    def get(self, user_id, default=None):
+        row = self._row(user_id)
+        return default if row is None else self._user(row)
+    
+    def __getitem__(self, user_id):
+        row = self._row(user_id)
+        if row is None:
+            raise KeyError(user_id)
+        return self._user(row)
+    
+    def __contains__(self, user_id):
+        return self._row(user_id) is not None
+    
+    def __len__(self):
+        self._require_complete()
+        return len(self._ids)
+    
+    def __iter__(self):
+        self._require_complete()
+        return iter(self._ids)
+    
+    def keys(self):
+        self._require_complete()
+        return iter(self._ids)
+    
+    def values(self):
+        self._require_complete()
+        return (self._user(row) for row in self._rows)
+    
+    def items(self):
+        self._require_complete()
+        return ((user_id, self._user(row)) for user_id, row in zip(self._ids, self._rows))
+    
+    # ===== آمار مستقیم از ستون‌ها (بدون ساختن دیکشنری) =====
+    
+    def items_by_date(self, reverse=False):
+        """(user_id, کاربر) به ترتیب تاریخ اولین استارت (مثل مرتب‌سازی روی رشته‌ی date)"""
+        self._require_complete()
+        order = sorted(range(len(self._ids)), reverse=reverse,
+                       key=lambda pos: self._date_key(self._rows[pos]))
+        return ((self._ids[pos], self._user(self._rows[pos])) for pos in order)
+    
+    def _date_key(self, row):
+        ts = self._dates[row]
+        # تاریخ‌های ناشناخته مثل قبل به ترتیب رشته‌ای (خالی اول از همه)
+        return (1, ts, "") if ts != NO_DATE else (0, 0, self._raw_dates.get(row, ""))
+    
+    def reachable_ids(self):
+        """user_id کاربرانی که بلاک نکردن و اکانتشون حذف نشده (array مرتب)"""
+        self._require_complete()
+        flags = self._flags
+        return array("q", (user_id for user_id, row in zip(self._ids, self._rows)
+                           if not flags[row] & FLAG_UNREACHABLE))
+    
+    def unreachable_count(self):
+        """تعداد کاربرانی که برادکست پیش‌فرض بهشون ارسال نمیشه"""
+        self._require_complete()
+        return sum(1 for flags in self._flags if flags & FLAG_UNREACHABLE)
+    
+    def language_counts(self):
+        """کد زبان -> تعداد کاربران"""
+        self._require_complete()
+        return {self._languages[index]: count for index, count in Counter(self._langs).items()}
+    
+    def day_counts(self):
+        """روز ("YYYY-MM-DD") -> تعداد کاربرانی که اون روز استارت زدن"""
+        self._require_complete()
+        days = Counter(ts // 86400 for ts in self._dates if ts != NO_DATE)
+        counts = Counter({date.fromordinal(EPOCH_ORDINAL + day).isoformat(): count for day, count in days.items()})
+        rows_without_date = len(self._dates) - sum(days.values())
+        if rows_without_date:
+            counts.update(self._raw_dates.get(row, "")[:10]
+                          for row, ts in enumerate(self._dates) if ts == NO_DATE)
+        return counts
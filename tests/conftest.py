@@ -0,0 +1,10 @@
+# ======================================================
+# تنظیمات مشترک تست‌ها
+# ======================================================
+import os
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp())  # import bot فایل دیتابیس رو در پوشه‌ی جاری میسازه
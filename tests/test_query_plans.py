@@ -0,0 +1,73 @@
+# ======================================================
+# TEST: کوئری‌های پرتکرار باید از ایندکس استفاده کنن (EXPLAIN QUERY PLAN)
+# ======================================================
+# اگه تغییری در اسکیما یا مایگریشن‌ها ایندکسی رو حذف کنه، این تست‌ها به جای کندی
+# آهسته در production همین‌جا خطا میدن.
+from datetime import date, timedelta
+
+import pytest
+
+from database import Database
+
+HISTORY_SLOTS = 2000  # تاریخچه‌ی کافی تا planner بعد از ANALYZE اسکن کامل رو انتخاب نکنه
+
+# (کوئری، پارامترها، عبارتی که باید در پلن باشه)
+QUERIES = [
+    ("DELETE FROM registrations WHERE sport=? AND group_name=? AND time_key=?",
+     ("futsal", "A", "10"), "INDEX sqlite_autoindex_registrations_1"),
+    ("DELETE FROM registrations WHERE sport=? AND group_name=? AND time_key=? AND phone=?",
+     ("futsal", "A", "10", "09120000000"), "INDEX sqlite_autoindex_registrations_1"),
+    ("SELECT name FROM players WHERE sport=? AND group_name=? AND phone=?",
+     ("futsal", "A", "09120000000"), "USING INDEX sqlite_autoindex_players_1"),
+    ("DELETE FROM registrations WHERE (sport, group_name, time_key) IN "
+     "(SELECT sport, group_name, CAST(id AS TEXT) FROM slots WHERE date_obj < ? AND sport IN (?, ?))",
+     ("2020-01-01", "futsal", "basketball"), "INDEX sqlite_autoindex_registrations_1"),
+    ("DELETE FROM slots WHERE date_obj < ? AND sport IN (?, ?)",
+     ("2020-01-01", "futsal", "basketball"), "USING INDEX idx_slots_date"),
+    ("SELECT * FROM slots WHERE date_obj >= ? ORDER BY date_obj",
+     ("2020-01-01",), "USING INDEX idx_slots_date"),
+    ("SELECT id FROM slots WHERE sport=? AND group_name=? ORDER BY date_obj, id",
+     ("futsal", "A"), "INDEX idx_slots_sport_group_date"),
+    ("DELETE FROM slots WHERE id=?",
+     (10,), "USING INTEGER PRIMARY KEY"),
+]
+
+
+def populate(db, slots):
+    """تاریخچه‌ی تایم‌ها (10 تایم در روز)، 10 ثبت‌نام برای هر تایم و بازیکن‌ها، بعد ANALYZE"""
+    first_day = date.today() - timedelta(days=slots // 10)
+    times = []
+    for i in range(slots):
+        day = first_day + timedelta(days=i // 10)
+        times.append(("ABCDEFGHIJ"[i % 10], day.isoformat(), "18:00", "19:00", 15, day.isoformat()))
+    with db.conn:
+        db.conn.executemany(
+            "INSERT INTO slots (sport, group_name, date, start, end, cap, date_obj) VALUES ('futsal', ?, ?, ?, ?, ?, ?)",
+            times)
+        db.conn.executemany(
+            "INSERT INTO registrations (sport, group_name, time_key, phone, name) VALUES (?, ?, ?, ?, ?)",
+            (("futsal", "ABCDEFGHIJ"[i % 10], str(i + 1), f"09{p:09d}", "player")
+             for i in range(slots) for p in range(10)))
+        db.conn.executemany(
+            "INSERT INTO players (sport, group_name, phone, name) VALUES ('futsal', ?, ?, ?)",
+            (("ABCDEFGHIJ"[p % 10], f"09{p:09d}", "player") for p in range(slots)))
+    db.conn.execute("ANALYZE")
+
+
+def query_plan(db, sql, params):
+    return " | ".join(row[3] for row in db.conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+
+
+@pytest.fixture(scope="module")
+def db(tmp_path_factory):
+    """دیتابیس با همه‌ی مایگریشن‌ها و تاریخچه‌ی بزرگ"""
+    database = Database(str(tmp_path_factory.mktemp("plans") / "plans.db"))
+    populate(database, HISTORY_SLOTS)
+    yield database
+    database.close()
+
+
+@pytest.mark.parametrize("sql, params, expected", QUERIES, ids=[sql[:60] for sql, _, _ in QUERIES])
+def test_query_uses_index(db, sql, params, expected):
+    plan = query_plan(db, sql, params)
+    assert expected in plan, f"{sql}\n  plan: {plan}"
@@ -0,0 +1,95 @@
+# ======================================================
+# TEST: رزرو اتمیک جا (reserve_seat) زیر درخواست‌های همزمان
+# ======================================================
+# هر درخواست یک coroutine جداست (مثل پردازش همزمان آپدیت‌ها)؛
+# هیچ تایمی نباید بیشتر از ظرفیتش پر بشه و درخواست رد شده نباید چیزی در RAM بذاره.
+import asyncio
+import random
+
+import pytest
+
+import bot
+
+SPORT, GROUP = "futsal", "A"
+
+
+@pytest.fixture(autouse=True)
+def clean_group():
+    """هر تست با گروه خالی شروع میشه و بعدش هم خالی میمونه"""
+    def clear():
+        bot.RAM_TIMES[SPORT][GROUP].clear()
+        bot.RAM_REGISTRATIONS[SPORT][GROUP].clear()
+        bot.SLOT_LOCKS.clear()  # هر asyncio.run یک event loop جدیده
+        bot.rebuild_active_slots()
+    clear()
+    yield
+    clear()
+
+
+async def add_slot(cap):
+    """مثل add_group_time: ذخیره در دیتابیس و اضافه به RAM و ایندکس تایم‌های فعال"""
+    slot = bot.Slot(None, bot.get_iran_date(), "23:59", "23:59", cap)
+    slot.id = await bot.db.save_slot(SPORT, GROUP, slot)
+    bot.RAM_TIMES[SPORT][GROUP].append(slot)
+    bot.add_active_slot(SPORT, GROUP, slot)
+    return slot
+
+
+async def stored_registrations(time_id):
+    await bot.db.flush()
+    return bot.db.sync.reader.execute(
+        "SELECT COUNT(*) FROM registrations WHERE sport=? AND group_name=? AND time_key=?",
+        (SPORT, GROUP, str(time_id))).fetchone()[0]
+
+
+def test_concurrent_reservations_never_overbook():
+    requests, cap = 2000, 20
+    rng = random.Random(1)
+    phones = [f"09{rng.randrange(requests * 9 // 10):09d}" for _ in range(requests)]  # حدود 10٪ تکراری
+
+    async def storm():
+        slot = await add_slot(cap)
+        results = await asyncio.gather(
+            *(bot.reserve_seat(SPORT, GROUP, slot.id, phone, "player") for phone in phones))
+        return slot, results, await stored_registrations(slot.id)
+
+    slot, results, stored = asyncio.run(storm())
+    in_ram = bot.RAM_REGISTRATIONS[SPORT][GROUP][slot.id]
+    assert results.count(bot.RESERVED) == len(in_ram) == stored == cap
+    assert results.count(bot.SLOT_FULL) + results.count(bot.ALREADY_REGISTERED) == requests - cap
+    assert len(set(in_ram)) == cap
+
+
+def test_rejected_reservation_leaves_no_registrations_entry():
+    async def scenario():
+        full = await add_slot(0)
+        return full, [
+            await bot.reserve_seat(SPORT, GROUP, full.id, "09120000000", "player"),
+            await bot.reserve_seat(SPORT, GROUP, full.id + 1000, "09120000000", "player"),
+        ]
+
+    full, results = asyncio.run(scenario())
+    assert results == [bot.SLOT_FULL, bot.SLOT_GONE]
+    assert bot.RAM_REGISTRATIONS[SPORT][GROUP] == {}
+
+
+def test_slot_deleted_mid_storm():
+    requests = 500
+
+    async def storm():
+        slot = await add_slot(requests)
+
+        async def delete_slot():
+            """مثل remove_group_time"""
+            bot.RAM_REGISTRATIONS[SPORT][GROUP].pop(slot.id, None)
+            bot.RAM_TIMES[SPORT][GROUP].remove(slot)
+            bot.remove_active_slot(SPORT, slot.id)
+
+        half = requests // 2
+        reservations = [bot.reserve_seat(SPORT, GROUP, slot.id, f"09{i:09d}", "player") for i in range(requests)]
+        results = await asyncio.gather(*reservations[:half], delete_slot(), *reservations[half:])
+        return slot, half, results
+
+    slot, half, results = asyncio.run(storm())
+    assert slot.id not in bot.RAM_REGISTRATIONS[SPORT][GROUP]
+    assert results[half + 1:].count(bot.SLOT_GONE) == requests - half